@@ -62,19 +62,62 @@ _AM2320_DEFAULT_ADDR = const(0x5C)
 _AM2320_CMD_READREG = const(0x03)
 _AM2320_REG_TEMP_H = const(0x02)
 _AM2320_REG_HUM_H = const(0x00)
+_AM2320_REG_COUNT = const(4)  # humidity then temperature, 2 bytes each
+
+# CRC16/Modbus (0xA001 reflected) of every byte value, split in low and high
+# bytes so that each table is a 256-byte constant
+_CRC16_LO = (
+    b'\x00\xc1\x81\x40\x01\xc0\x80\x41\x01\xc0\x80\x41\x00\xc1\x81\x40'
+    b'\x01\xc0\x80\x41\x00\xc1\x81\x40\x00\xc1\x81\x40\x01\xc0\x80\x41'
+    b'\x01\xc0\x80\x41\x00\xc1\x81\x40\x00\xc1\x81\x40\x01\xc0\x80\x41'
+    b'\x00\xc1\x81\x40\x01\xc0\x80\x41\x01\xc0\x80\x41\x00\xc1\x81\x40'
+    b'\x01\xc0\x80\x41\x00\xc1\x81\x40\x00\xc1\x81\x40\x01\xc0\x80\x41'
+    b'\x00\xc1\x81\x40\x01\xc0\x80\x41\x01\xc0\x80\x41\x00\xc1\x81\x40'
+    b'\x00\xc1\x81\x40\x01\xc0\x80\x41\x01\xc0\x80\x41\x00\xc1\x81\x40'
+    b'\x01\xc0\x80\x41\x00\xc1\x81\x40\x00\xc1\x81\x40\x01\xc0\x80\x41'
+    b'\x01\xc0\x80\x41\x00\xc1\x81\x40\x00\xc1\x81\x40\x01\xc0\x80\x41'
+    b'\x00\xc1\x81\x40\x01\xc0\x80\x41\x01\xc0\x80\x41\x00\xc1\x81\x40'
+    b'\x00\xc1\x81\x40\x01\xc0\x80\x41\x01\xc0\x80\x41\x00\xc1\x81\x40'
+    b'\x01\xc0\x80\x41\x00\xc1\x81\x40\x00\xc1\x81\x40\x01\xc0\x80\x41'
+    b'\x00\xc1\x81\x40\x01\xc0\x80\x41\x01\xc0\x80\x41\x00\xc1\x81\x40'
+    b'\x01\xc0\x80\x41\x00\xc1\x81\x40\x00\xc1\x81\x40\x01\xc0\x80\x41'
+    b'\x01\xc0\x80\x41\x00\xc1\x81\x40\x00\xc1\x81\x40\x01\xc0\x80\x41'
+    b'\x00\xc1\x81\x40\x01\xc0\x80\x41\x01\xc0\x80\x41\x00\xc1\x81\x40'
+)
+_CRC16_HI = (
+    b'\x00\xc0\xc1\x01\xc3\x03\x02\xc2\xc6\x06\x07\xc7\x05\xc5\xc4\x04'
+    b'\xcc\x0c\x0d\xcd\x0f\xcf\xce\x0e\x0a\xca\xcb\x0b\xc9\x09\x08\xc8'
+    b'\xd8\x18\x19\xd9\x1b\xdb\xda\x1a\x1e\xde\xdf\x1f\xdd\x1d\x1c\xdc'
+    b'\x14\xd4\xd5\x15\xd7\x17\x16\xd6\xd2\x12\x13\xd3\x11\xd1\xd0\x10'
+    b'\xf0\x30\x31\xf1\x33\xf3\xf2\x32\x36\xf6\xf7\x37\xf5\x35\x34\xf4'
+    b'\x3c\xfc\xfd\x3d\xff\x3f\x3e\xfe\xfa\x3a\x3b\xfb\x39\xf9\xf8\x38'
+    b'\x28\xe8\xe9\x29\xeb\x2b\x2a\xea\xee\x2e\x2f\xef\x2d\xed\xec\x2c'
+    b'\xe4\x24\x25\xe5\x27\xe7\xe6\x26\x22\xe2\xe3\x23\xe1\x21\x20\xe0'
+    b'\xa0\x60\x61\xa1\x63\xa3\xa2\x62\x66\xa6\xa7\x67\xa5\x65\x64\xa4'
+    b'\x6c\xac\xad\x6d\xaf\x6f\x6e\xae\xaa\x6a\x6b\xab\x69\xa9\xa8\x68'
+    b'\x78\xb8\xb9\x79\xbb\x7b\x7a\xba\xbe\x7e\x7f\xbf\x7d\xbd\xbc\x7c'
+    b'\xb4\x74\x75\xb5\x77\xb7\xb6\x76\x72\xb2\xb3\x73\xb1\x71\x70\xb0'
+    b'\x50\x90\x91\x51\x93\x53\x52\x92\x96\x56\x57\x97\x55\x95\x94\x54'
+    b'\x9c\x5c\x5d\x9d\x5f\x9f\x9e\x5e\x5a\x9a\x9b\x5b\x99\x59\x58\x98'
+    b'\x88\x48\x49\x89\x4b\x8b\x8a\x4a\x4e\x8e\x8f\x4f\x8d\x4d\x4c\x8c'
+    b'\x44\x84\x85\x45\x87\x47\x46\x86\x82\x42\x43\x83\x41\x81\x80\x40'
+)
 
 
 def _crc16(data):
-    crc = 0xffff
+    crc_lo = 0xff
+    crc_hi = 0xff
     for byte in data:
-        crc ^= byte
-        for _ in range(8):
-            if crc & 0x0001:
-                crc >>= 1
-                crc ^= 0xA001
-            else:
-                crc >>= 1
-    return crc
+        i = crc_lo ^ byte
+        crc_lo = crc_hi ^ _CRC16_LO[i]
+        crc_hi = _CRC16_HI[i]
+    return crc_hi << 8 | crc_lo
+
+
+def _crc16_check(buf):
+    """Return the computed and the received CRC of a reply, which ends with
+    its CRC16 (low byte first), without copying the reply."""
+    return _crc16(memoryview(buf)[:-2]), buf[-2] | buf[-1] << 8
 
 
 class AM2320:
@@ -87,29 +130,51 @@ class AM2320:
     def __init__(self, i2c_bus, address=_AM2320_DEFAULT_ADDR):
         self._i2c_bus = i2c_bus
         self._addr = address
+        # reply of a read of all the measurement registers, and its decoding
+        self._buffer = bytearray(_AM2320_REG_COUNT+4)
+        self._read_all = bytes([_AM2320_CMD_READREG, _AM2320_REG_HUM_H, _AM2320_REG_COUNT])
+        self.measurements = [None, None]
 
     def _read_register(self, register, length):
+        # Send command to read register
+        cmd = [_AM2320_CMD_READREG, register & 0xFF, length]
+        result = bytearray(length+4) # 2 bytes pre, 2 bytes crc
+        self._request(bytes(cmd), result)
+        return result[2:-2]
+
+    def _request(self, cmd, result):
         # wake up sensor
         self._i2c_bus.writeto(self._addr, bytes([0x00]))
         time.sleep(0.01)  # wait 10 ms
 
-        # Send command to read register
-        cmd = [_AM2320_CMD_READREG, register & 0xFF, length]
         # print("cmd: %s" % [hex(i) for i in cmd])
-        self._i2c_bus.writeto(self._addr, bytes(cmd))
+        self._i2c_bus.writeto(self._addr, cmd)
         time.sleep(0.002)  # wait 2 ms for reply
-        result = bytearray(length+4) # 2 bytes pre, 2 bytes crc
         self._i2c_bus.readfrom_into(self._addr, result)
-        # print("$%02X => %s" % (register, [hex(i) for i in result]))
+        # print("$%02X => %s" % (cmd[1], [hex(i) for i in result]))
         # Check preamble indicates correct readings
-        if result[0] != 0x3 or result[1] != length:
+        if result[0] != 0x3 or result[1] != cmd[2]:
             raise RuntimeError('I2C modbus read failure')
         # Check CRC on all but last 2 bytes
-        crc1 = struct.unpack("<H", bytes(result[-2:]))[0]
-        crc2 = _crc16(result[0:-2])
+        crc2, crc1 = _crc16_check(result)
         if crc1 != crc2:
             raise RuntimeError('CRC failure 0x%04X vs 0x%04X' % (crc1, crc2))
-        return result[2:-2]
+
+    def read(self):
+        """Read the humidity and the temperature in a single modbus request.
+
+        :return: the `measurements` list, updated in place.
+        """
+        result = self._buffer
+        self._request(self._read_all, result)
+        humidity = result[2] << 8 | result[3]
+        temperature = result[4] << 8 | result[5]
+        if temperature >= 32768:
+            temperature = 32768 - temperature
+        measurements = self.measurements
+        measurements[0] = temperature/10.0
+        measurements[1] = humidity/10.0
+        return measurements
 
     @property
     def temperature(self):
@@ -46,6 +46,21 @@ Implementation Notes
 __version__ = "0.0.0-auto.0"
 __repo__ = "https://github.com/alexmrqt/Adafruit_CircuitPython_GPS.git"
 
+# Longest sentence kept for parsing, NMEA 0183 allows 82 characters
+_NMEA_MAX_LEN = 96
+
+# Sentence types as the small int of their 3 letters, compared without
+# slicing the receive buffer
+_TYPE_GGA = 0x474741  # b'GGA'
+_TYPE_GLL = 0x474c4c  # b'GLL'
+_TYPE_GSA = 0x475341  # b'GSA'
+_TYPE_GSV = 0x475356  # b'GSV'
+_TYPE_RMC = 0x524d43  # b'RMC'
+_TYPE_VTG = 0x565447  # b'VTG'
+
+# The first fields of the PMTK314 (set NMEA output) command, 13 more follow
+_PMTK314_TYPES = (_TYPE_GLL, _TYPE_RMC, _TYPE_VTG, _TYPE_GGA, _TYPE_GSA, _TYPE_GSV)
+
 # Internal helper parsing functions.
 # These handle input that might be none or null and return none instead of
 # throwing errors.
@@ -69,18 +84,215 @@ def _parse_float(nmea_data):
         return None
     return float(nmea_data.decode())
 
+def _parse_coordinate(nmea_data, hemisphere, negative):
+    # Parse a lat/long and its hemisphere, negative for b's' or b'w'.
+    degrees = _parse_degrees(nmea_data)
+    if degrees is not None and \
+       hemisphere is not None and hemisphere.lower() == negative:
+        degrees *= -1.0
+    return degrees
+
+def _checksum(data):
+    # XOR of all the bytes of data. The bytes are the lanes of one integer,
+    # folded in halves: log2(len) operations instead of one per byte.
+    folded = int.from_bytes(data, 'big')
+    lanes = 1
+    while lanes < len(data):
+        lanes <<= 1
+    while lanes > 1:
+        lanes >>= 1
+        folded ^= folded >> (lanes << 3)
+    return folded & 0xFF
+
+def _sentence_type(buf, start, end):
+    # Return the type of the sentence buf[start:end] as a _TYPE_* int, None if
+    # it is too short. The talker (GP, GN, GL...) is ignored.
+    if end - start < 7 or buf[start] != 36:  # b'$'
+        return None
+    return buf[start+3] << 16 | buf[start+4] << 8 | buf[start+5]
+
+def _parse_time(gps, nmea_data):
+    # Parse the 'hhmmss.sss' fix time into timestamp_utc, keeping its date.
+    if nmea_data is None or nmea_data == b'':
+        return
+    time_utc = int(_parse_float(nmea_data))
+    hours = time_utc // 10000
+    mins = (time_utc // 100) % 100
+    secs = time_utc % 100
+    # Set or update time to a friendly python time struct.
+    if gps.timestamp_utc is not None:
+        gps.timestamp_utc = (
+            gps.timestamp_utc[0], gps.timestamp_utc[1],
+            gps.timestamp_utc[2], hours, mins, secs, 0, 0)
+    else:
+        gps.timestamp_utc = (0, 0, 0, hours, mins, secs, 0, 0)
+
+def _parse_date(gps, nmea_data):
+    # Parse the 'ddmmyy' date into timestamp_utc, keeping its time.
+    if nmea_data is None or len(nmea_data) != 6:
+        return
+    day = int(nmea_data[0:2])
+    month = int(nmea_data[2:4])
+    year = 2000 + int(nmea_data[4:6])  # Y2k bug, 2 digit date assumption.
+                                       # This is a problem with the NMEA
+                                       # spec and not this code.
+    if gps.timestamp_utc is not None:
+        # Replace the timestamp with an updated one.
+        gps.timestamp_utc = (year, month, day, gps.timestamp_utc[3],
+                             gps.timestamp_utc[4], gps.timestamp_utc[5], 0, 0)
+    else:
+        # Time hasn't been set so create it.
+        gps.timestamp_utc = (year, month, day, 0, 0, 0, 0, 0)
+
+# Field decoders of the GGA sentence, 3d location fix: time, latitude, N/S,
+# longitude, E/W, fix quality, satellites, HDOP, altitude, M, geoid height, M
+def _gga_time(gps, data):
+    _parse_time(gps, data[0])
+
+def _gga_latitude(gps, data):
+    gps.latitude = _parse_coordinate(data[1], data[2], b's')
+
+def _gga_longitude(gps, data):
+    gps.longitude = _parse_coordinate(data[3], data[4], b'w')
+
+def _gga_fix_quality(gps, data):
+    gps.fix_quality = _parse_int(data[5])
+
+def _gga_satellites(gps, data):
+    gps.satellites = _parse_int(data[6])
+
+def _gga_horizontal_dilution(gps, data):
+    gps.horizontal_dilution = _parse_float(data[7])
+
+def _gga_altitude(gps, data):
+    gps.altitude_m = _parse_float(data[8])
+
+def _gga_height_geoid(gps, data):
+    gps.height_geoid = _parse_float(data[10])
+
+# Field decoders of the RMC sentence, minimum location info: time, status,
+# latitude, N/S, longitude, E/W, speed, track angle, date
+def _rmc_time(gps, data):
+    _parse_time(gps, data[0])
+
+def _rmc_fix_quality(gps, data):
+    # Parse status (active/fixed or void).
+    gps.fix_quality = 1 if data[1].lower() == b'a' else 0
+
+def _rmc_latitude(gps, data):
+    gps.latitude = _parse_coordinate(data[2], data[3], b's')
+
+def _rmc_longitude(gps, data):
+    gps.longitude = _parse_coordinate(data[4], data[5], b'w')
+
+def _rmc_speed(gps, data):
+    gps.speed_knots = _parse_float(data[6])
+
+def _rmc_track_angle(gps, data):
+    gps.track_angle_deg = _parse_float(data[7])
+
+def _rmc_date(gps, data):
+    _parse_date(gps, data[8])
+
+# Field decoders of the GSA sentence, DOP and active satellites: mode, fix
+# type, 12 satellite ids, PDOP, HDOP, VDOP
+def _gsa_fix_type(gps, data):
+    gps.fix_type = _parse_int(data[1])
+
+def _gsa_pdop(gps, data):
+    gps.pdop = _parse_float(data[14])
+
+def _gsa_horizontal_dilution(gps, data):
+    gps.horizontal_dilution = _parse_float(data[15])
+
+def _gsa_vdop(gps, data):
+    gps.vdop = _parse_float(data[16])
+
+# Field decoders of the VTG sentence, course and speed over ground: true
+# track, T, magnetic track, M, speed in knots, N, speed in km/h, K
+def _vtg_track_angle(gps, data):
+    gps.track_angle_deg = _parse_float(data[0])
+
+def _vtg_speed(gps, data):
+    gps.speed_knots = _parse_float(data[4])
+
+# Dispatch table: by sentence type, its field decoders in sentence order, each
+# with the attribute it sets and the index of the last field it reads. The
+# order breaks the ties when choosing the sentences to output.
+_SENTENCES = (
+    (_TYPE_RMC, (('timestamp_utc', 0, _rmc_time),
+                 ('fix_quality', 1, _rmc_fix_quality),
+                 ('latitude', 3, _rmc_latitude),
+                 ('longitude', 5, _rmc_longitude),
+                 ('speed_knots', 6, _rmc_speed),
+                 ('track_angle_deg', 7, _rmc_track_angle),
+                 ('timestamp_utc', 8, _rmc_date))),
+    (_TYPE_GGA, (('timestamp_utc', 0, _gga_time),
+                 ('latitude', 2, _gga_latitude),
+                 ('longitude', 4, _gga_longitude),
+                 ('fix_quality', 5, _gga_fix_quality),
+                 ('satellites', 6, _gga_satellites),
+                 ('horizontal_dilution', 7, _gga_horizontal_dilution),
+                 ('altitude_m', 8, _gga_altitude),
+                 ('height_geoid', 10, _gga_height_geoid))),
+    (_TYPE_GSA, (('fix_type', 1, _gsa_fix_type),
+                 ('pdop', 14, _gsa_pdop),
+                 ('horizontal_dilution', 15, _gsa_horizontal_dilution),
+                 ('vdop', 16, _gsa_vdop))),
+    (_TYPE_VTG, (('track_angle_deg', 0, _vtg_track_angle),
+                 ('speed_knots', 4, _vtg_speed))),
+)
+
 # lint warning about too many attributes disabled
 #pylint: disable-msg=R0902
 class GPS:
-    """GPS parsing module.  Can parse simple NMEA data sentences from serial GPS
-    modules to read latitude, longitude, and more.
+    """GPS parsing module.  Can parse simple NMEA data sentences (GGA, RMC, GSA
+    and VTG, from any talker) from serial GPS modules to read latitude,
+    longitude, and more.
 
     :param uart: The `UART` object to use.
     :param enable_pin: The `Pin` object of the pin connected to the `EN` line.
+    :param int buffer_size: (optional) The receive buffer of `update_all`.
+    :param fields: (optional) The names of the attributes to decode, the
+        other ones stay None, and the sentences giving none of them are
+        ignored. All of them by default. `pmtk314_command` turns off the
+        sentences that are not needed.
     """
-    def __init__(self, uart, enable_pin = None):
+    def __init__(self, uart, enable_pin = None, buffer_size = 512, fields = None):
         self._uart = uart
         self.en = enable_pin
+        # received characters not split into sentences yet
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._buffered = 0
+        # decoders of the requested fields, and the number of fields to
+        # split, by sentence type
+        self._decoders = {}
+        for sentence_type, decoders in _SENTENCES:
+            selected = tuple((last, decoder) for name, last, decoder in decoders
+                             if fields is None or name in fields)
+            if selected:
+                self._decoders[sentence_type] = (
+                    max(last for last, decoder in selected) + 1,
+                    tuple(decoder for last, decoder in selected))
+        # fewest sentence types giving all the requested fields, the output
+        # of the receiver, see pmtk314_command
+        wanted = set(name for sentence_type, decoders in _SENTENCES
+                     for name, last, decoder in decoders
+                     if fields is None or name in fields)
+        self._output = set()
+        while wanted:
+            best, covered = None, set()
+            for sentence_type, decoders in _SENTENCES:
+                names = set(name for name, last, decoder in decoders) & wanted
+                if len(names) > len(covered):
+                    best, covered = sentence_type, names
+            self._output.add(best)
+            wanted -= covered
+        # newest sentence of each parsed type: copy, length, arrival order
+        self._newest = {}
+        for sentence_type in self._decoders:
+            self._newest[sentence_type] = [bytearray(_NMEA_MAX_LEN), 0, 0]
         # Initialize null starting values for GPS attributes.
         self.timestamp_utc = None
         self.latitude = None
@@ -90,6 +302,9 @@ class GPS:
         self.horizontal_dilution = None
         self.altitude_m = None
         self.height_geoid = None
+        self.fix_type = None
+        self.pdop = None
+        self.vdop = None
         self.velocity_knots = None
         self.speed_knots = None
         self.track_angle_deg = None
@@ -111,17 +326,87 @@ class GPS:
         """
         # Grab a sentence and check its data type to call the appropriate
         # parsing function.
-        sentence = self._parse_sentence()
+        sentence = self._uart.readline()
+        if sentence is None or sentence == b'':
+            return False
+        self._parse(sentence)
+        return True
+
+    def update_all(self):
+        """Read all the characters received since the last call and parse
+        the newest sentence of each type only, the older ones are outdated.
+        Returns the number of complete sentences consumed, and how many of
+        them were dropped without being parsed.
+        """
+        newest = self._newest
+        for slot in newest.values():
+            slot[1] = 0
+        consumed = 0
+        while True:
+            received = self._fill()
+            buf = self._buffer
+            end = self._buffered
+            start = 0
+            for i in range(end):
+                if buf[i] == 10:  # b'\n', end of a sentence
+                    consumed += 1
+                    slot = newest.get(_sentence_type(buf, start, i))
+                    if slot is not None and i - start <= _NMEA_MAX_LEN:
+                        slot[0][:i-start] = self._view[start:i]
+                        slot[1] = i - start
+                        slot[2] = consumed
+                    start = i + 1
+            if start == 0 and end == len(buf):
+                start = end  # no sentence end in a full buffer, drop it
+            if start:
+                self._view[0:end-start] = self._view[start:end]
+                self._buffered = end - start
+            if not received:
+                break
+        parsed = 0
+        for slot in sorted(newest.values(), key=lambda slot: slot[2]):
+            if slot[1] and self._parse(bytes(slot[0][:slot[1]])):
+                parsed += 1
+        return consumed, consumed - parsed
+
+    drain = update_all
+
+    def _fill(self):
+        # Move the characters received by the UART into the buffer.
+        n = min(self._uart.any(), len(self._buffer) - self._buffered)
+        if n <= 0:
+            return 0
+        n = self._uart.readinto(self._view[self._buffered:], n) or 0
+        self._buffered += n
+        return n
+
+    def _parse(self, sentence):
+        # Decode the requested fields of a sentence, its type selects the
+        # decoders. The checksum of the other sentences is not even checked.
+        sentence = sentence.strip()
+        entry = self._decoders.get(_sentence_type(sentence, 0, len(sentence)))
+        if entry is None:
+            return False
+        sentence = self._split_sentence(sentence)
         if sentence is None:
             return False
-        data_type, args = sentence
-        data_type = data_type.upper()
-        if data_type == b'GPGGA':      # GGA, 3d location fix
-            self._parse_gpgga(args)
-        elif data_type == b'GPRMC':    # RMC, minimum location info
-            self._parse_gprmc(args)
+        n_fields, decoders = entry
+        # split the fields up to the last one decoded only
+        data = sentence[1].split(b',', n_fields)
+        if len(data) < n_fields:
+            return False  # Unexpected number of params.
+        for decoder in decoders:
+            decoder(self, data)
         return True
 
+    def pmtk314_command(self):
+        """The PMTK314 command setting the output of the receiver to the
+        fewest sentences giving the fields decoded, for `send_command`.
+        """
+        mask = ['1' if sentence_type in self._output else '0'
+                for sentence_type in _PMTK314_TYPES]
+        return 'PMTK314,' + ','.join(mask) + ',0' * 13
+
     def send_command(self, command, add_checksum=True):
         """Send a command string to the GPS.  If add_checksum is True (the
         default) a NMEA checksum will automatically be computed and added.
@@ -143,9 +428,8 @@ class GPS:
         """True if a current fix for location information is available."""
         return self.fix_quality is not None and self.fix_quality >= 1
 
-    def _parse_sentence(self):
-        # Parse any NMEA sentence that is available.
-        sentence = self._uart.readline()
+    def _split_sentence(self, sentence):
+        # Check a sentence and split it in data type and arguments.
         if sentence is None or sentence == b'' or len(sentence) < 1:
             return None
         sentence = sentence.strip()
@@ -153,10 +437,7 @@ class GPS:
         if len(sentence) > 7 and sentence[-3] == ord('*'):
             # Get included checksum, then calculate it and compare.
             expected = int(sentence[-2:], 16)
-            actual = 0
-            for i in range(1, len(sentence)-3):
-                actual ^= sentence[i]
-            if actual != expected:
+            if _checksum(sentence[1:-3]) != expected:
                 return None  # Failed to validate checksum.
             # Remove checksum once validated.
             sentence = sentence[:-3]
@@ -167,93 +448,3 @@ class GPS:
             return None  # Invalid sentence, no comma after data type.
         data_type = sentence[1:delineator]
         return (data_type, sentence[delineator+1:])
-
-    def _parse_gpgga(self, args):
-        # Parse the arguments (everything after data type) for NMEA GPGGA
-        # 3D location fix sentence.
-        data = args.split(b',')
-        if data is None or len(data) != 14:
-            return  # Unexpected number of params.
-        # Parse fix time.
-        time_utc = int(_parse_float(data[0]))
-        if time_utc is not None:
-            hours = time_utc // 10000
-            mins = (time_utc // 100) % 100
-            secs = time_utc % 100
-            # Set or update time to a friendly python time struct.
-            if self.timestamp_utc is not None:
-                self.timestamp_utc = (
-                    self.timestamp_utc[0], self.timestamp_utc[1],
-                    self.timestamp_utc[2], hours, mins, secs, 0, 0)
-            else:
-                self.timestamp_utc = (0, 0, 0, hours, mins, secs, 0, 0)
-        # Parse latitude and longitude.
-        self.latitude = _parse_degrees(data[1])
-        if self.latitude is not None and \
-           data[2] is not None and data[2].lower() == b's':
-            self.latitude *= -1.0
-        self.longitude = _parse_degrees(data[3])
-        if self.longitude is not None and \
-           data[4] is not None and data[4].lower() == b'w':
-            self.longitude *= -1.0
-        # Parse out fix quality and other simple numeric values.
-        self.fix_quality = _parse_int(data[5])
-        self.satellites = _parse_int(data[6])
-        self.horizontal_dilution = _parse_float(data[7])
-        self.altitude_m = _parse_float(data[8])
-        self.height_geoid = _parse_float(data[10])
-
-    def _parse_gprmc(self, args):
-        # Parse the arguments (everything after data type) for NMEA GPRMC
-        # minimum location fix sentence.
-        data = args.split(b',')
-        if data is None or len(data) < 11 or data[0] is None:
-            return  # Unexpected number of params.
-        # Parse fix time.
-        time_utc = int(_parse_float(data[0]))
-        if time_utc is not None:
-            hours = time_utc // 10000
-            mins = (time_utc // 100) % 100
-            secs = time_utc % 100
-            # Set or update time to a friendly python time struct.
-            if self.timestamp_utc is not None:
-                self.timestamp_utc = (
-                    self.timestamp_utc[0], self.timestamp_utc[1],
-                    self.timestamp_utc[2], hours, mins, secs, 0, 0)
-            else:
-                self.timestamp_utc = (0, 0, 0, hours, mins, secs, 0, 0)
-        # Parse status (active/fixed or void).
-        status = data[1]
-        self.fix_quality = 0
-        if status is not None and status.lower() == b'a':
-            self.fix_quality = 1
-        # Parse latitude and longitude.
-        self.latitude = _parse_degrees(data[2])
-        if self.latitude is not None and \
-           data[3] is not None and data[3].lower() == b's':
-            self.latitude *= -1.0
-        self.longitude = _parse_degrees(data[4])
-        if self.longitude is not None and \
-           data[5] is not None and data[5].lower() == b'w':
-            self.longitude *= -1.0
-        # Parse out speed and other simple numeric values.
-        self.speed_knots = _parse_float(data[6])
-        self.track_angle_deg = _parse_float(data[7])
-        # Parse date.
-        if data[8] is not None and len(data[8]) == 6:
-            day = int(data[8][0:2])
-            month = int(data[8][2:4])
-            year = 2000 + int(data[8][4:6])  # Y2k bug, 2 digit date assumption.
-                                             # This is a problem with the NMEA
-                                             # spec and not this code.
-            if self.timestamp_utc is not None:
-                # Replace the timestamp with an updated one.
-                self.timestamp_utc = (year, month, day,
-                                                       self.timestamp_utc[3],
-                                                       self.timestamp_utc[4],
-                                                       self.timestamp_utc[5],
-                                                       0,
-                                                       0)
-            else:
-                # Time hasn't been set so create it.
-                self.timestamp_utc = (year, month, day, 0, 0, 0, 0, 0)
@@ -58,18 +58,43 @@ _SGP30_CRC8_INIT         = const(0xFF)
 _SGP30_WORD_LEN          = const(2)
 # pylint: enable=bad-whitespace
 
+# CRC8 of every byte value for _SGP30_CRC8_POLYNOMIAL, indexed by crc ^ byte
+_SGP30_CRC8_TABLE = (
+    b'\x00\x31\x62\x53\xc4\xf5\xa6\x97\xb9\x88\xdb\xea\x7d\x4c\x1f\x2e'
+    b'\x43\x72\x21\x10\x87\xb6\xe5\xd4\xfa\xcb\x98\xa9\x3e\x0f\x5c\x6d'
+    b'\x86\xb7\xe4\xd5\x42\x73\x20\x11\x3f\x0e\x5d\x6c\xfb\xca\x99\xa8'
+    b'\xc5\xf4\xa7\x96\x01\x30\x63\x52\x7c\x4d\x1e\x2f\xb8\x89\xda\xeb'
+    b'\x3d\x0c\x5f\x6e\xf9\xc8\x9b\xaa\x84\xb5\xe6\xd7\x40\x71\x22\x13'
+    b'\x7e\x4f\x1c\x2d\xba\x8b\xd8\xe9\xc7\xf6\xa5\x94\x03\x32\x61\x50'
+    b'\xbb\x8a\xd9\xe8\x7f\x4e\x1d\x2c\x02\x33\x60\x51\xc6\xf7\xa4\x95'
+    b'\xf8\xc9\x9a\xab\x3c\x0d\x5e\x6f\x41\x70\x23\x12\x85\xb4\xe7\xd6'
+    b'\x7a\x4b\x18\x29\xbe\x8f\xdc\xed\xc3\xf2\xa1\x90\x07\x36\x65\x54'
+    b'\x39\x08\x5b\x6a\xfd\xcc\x9f\xae\x80\xb1\xe2\xd3\x44\x75\x26\x17'
+    b'\xfc\xcd\x9e\xaf\x38\x09\x5a\x6b\x45\x74\x27\x16\x81\xb0\xe3\xd2'
+    b'\xbf\x8e\xdd\xec\x7b\x4a\x19\x28\x06\x37\x64\x55\xc2\xf3\xa0\x91'
+    b'\x47\x76\x25\x14\x83\xb2\xe1\xd0\xfe\xcf\x9c\xad\x3a\x0b\x58\x69'
+    b'\x04\x35\x66\x57\xc0\xf1\xa2\x93\xbd\x8c\xdf\xee\x79\x48\x1b\x2a'
+    b'\xc1\xf0\xa3\x92\x05\x34\x67\x56\x78\x49\x1a\x2b\xbc\x8d\xde\xef'
+    b'\x82\xb3\xe0\xd1\x46\x77\x24\x15\x3b\x0a\x59\x68\xff\xce\x9d\xac'
+)
+
 class Adafruit_SGP30:
     """
     A driver for the SGP30 gas sensor.
 
     :param i2c: The `I2C` object to use. This is the only required parameter.
     :param int address: (optional) The I2C address of the device.
+    :param int max_age: (optional) How long, in ms, a measurement is reused by
+        `measure`, `co2eq` and `tvoc` before a new one is made.
     """
 
-    def __init__(self, i2c, address=_SGP30_DEFAULT_I2C_ADDR):
+    def __init__(self, i2c, address=_SGP30_DEFAULT_I2C_ADDR, max_age=500):
         """Initialize the sensor, get the serial # and verify that we found a proper SGP30"""
         self._i2c = i2c
         self._addr = address
+        self.max_age = max_age
+        self._measurement = None
+        self._measurement_time = 0
 
         # get unique serial, its 48 bits so we store in an array
         self.serial = self._i2c_read_words_from_cmd([0x36, 0x82], 0.01, 3)
@@ -83,7 +108,7 @@ class Adafruit_SGP30:
     @property
     def tvoc(self):
         """Total Volatile Organic Compound in parts per billion."""
-        return self.iaq_measure()[1]
+        return self.measure()[1]
 
 
     @property
@@ -95,7 +120,7 @@ class Adafruit_SGP30:
     @property
     def co2eq(self):
         """Carbon Dioxide Equivalent in parts per million"""
-        return self.iaq_measure()[0]
+        return self.measure()[0]
 
 
     @property
@@ -114,6 +139,22 @@ class Adafruit_SGP30:
         # name, command, signals, delay
         return self._run_profile(["iaq_measure", [0x20, 0x08], 2, 0.05])
 
+    def measure(self, max_age=None):
+        """Return the CO2eq and TVOC of the last iaq_measure, if it is recent
+        enough, or of a new one.
+
+        :param int max_age: (optional) The freshness window in ms, `max_age`
+            by default; 0 always measures.
+        """
+        if max_age is None:
+            max_age = self.max_age
+        now = time.ticks_ms()
+        if (self._measurement is None or
+                abs(time.ticks_diff(now, self._measurement_time)) > max_age):
+            self._measurement = self.iaq_measure()
+            self._measurement_time = now
+        return self._measurement
+
     def get_iaq_baseline(self):
         """Retreive the IAQ algorithm baseline for CO2eq and TVOC"""
         # name, command, signals, delay
@@ -154,26 +195,28 @@ class Adafruit_SGP30:
         crc_result = bytearray(reply_size * (_SGP30_WORD_LEN +1))
         self._i2c.readfrom_into(self._addr, crc_result)
         #print("\tRaw Read: ", crc_result)
+        if not self._check_words(crc_result):
+            raise RuntimeError('CRC Error')
         result = []
-        for i in range(reply_size):
-            word = [crc_result[3*i], crc_result[3*i+1]]
-            crc = crc_result[3*i+2]
-            if self._generate_crc(word) != crc:
-                raise RuntimeError('CRC Error')
-            result.append(word[0] << 8 | word[1])
+        for i in range(0, len(crc_result), 3):
+            result.append(crc_result[i] << 8 | crc_result[i+1])
         #print("\tOK Data: ", [hex(i) for i in result])
         return result
 
     # pylint: disable=no-self-use
+    def _check_words(self, buf):
+        """Check the CRC of every (MSB, LSB, CRC) word of a reply buffer"""
+        table = _SGP30_CRC8_TABLE
+        for i in range(0, len(buf), 3):
+            if table[table[_SGP30_CRC8_INIT ^ buf[i]] ^ buf[i+1]] != buf[i+2]:
+                return False
+        return True
+
     def _generate_crc(self, data):
         """8-bit CRC algorithm for checking data"""
         crc = _SGP30_CRC8_INIT
-        # calculates 8-Bit checksum with given polynomial
+        table = _SGP30_CRC8_TABLE
+        # one table lookup per byte instead of 8 shifts
         for byte in data:
-            crc ^= byte
-            for _ in range(8):
-                if crc & 0x80:
-                    crc = (crc << 1) ^ _SGP30_CRC8_POLYNOMIAL
-                else:
-                    crc <<= 1
-        return crc & 0xFF
+            crc = table[crc ^ byte]
+        return crc
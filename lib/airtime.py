@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+LoRaWAN (EU868) time on air and payload limits, per data rate.
+See https://blog.dbrgn.ch/2017/6/23/lorawan-data-rates/
+"""
+
+import math
+
+# data rate: (spreading factor, bandwidth in Hz)
+DATA_RATES = {0: (12, 125000),
+              1: (11, 125000),
+              2: (10, 125000),
+              3: (9, 125000),
+              4: (8, 125000),
+              5: (7, 125000),
+              6: (7, 250000)}
+
+# maximum application payload, in bytes (no MAC commands piggybacked)
+MAX_PAYLOAD = {0: 51, 1: 51, 2: 51, 3: 115, 4: 222, 5: 222, 6: 222}
+
+LORAWAN_OVERHEAD = 13  # MHDR (1) + FHDR (7) + FPort (1) + MIC (4)
+PREAMBLE_SYMBOLS = 8
+CODING_RATE = 1  # 4/5
+
+
+def max_payload(data_rate):
+    """Return the largest application payload, in bytes, at data_rate."""
+    return MAX_PAYLOAD[data_rate]
+
+
+def time_on_air(payload_len, data_rate=5):
+    """Return the time on air, in seconds, of an uplink carrying
+    payload_len bytes of application payload at data_rate.
+    """
+    sf, bw = DATA_RATES[data_rate]
+    t_sym = (1 << sf) / bw
+    # low data rate optimization is mandated for symbols longer than 16 ms
+    de = 1 if t_sym > 0.016 else 0
+    pl = payload_len + LORAWAN_OVERHEAD
+    n_payload = 8 + max(math.ceil((8 * pl - 4 * sf + 28 + 16) / (4 * (sf - 2 * de)))
+                        * (CODING_RATE + 4), 0)
+    return (PREAMBLE_SYMBOLS + 4.25 + n_payload) * t_sym
+
+
+def uplinks_per_hour(payload_len, data_rate=5, duty_cycle=0.01):
+    """Return how many uplinks of payload_len bytes fit in one hour of
+    the duty-cycle budget.
+    """
+    return int(3600 * duty_cycle / time_on_air(payload_len, data_rate))
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Time-series batching of several samples per sensor into one LoRa frame.
+
+A batch frame is a CBOR map holding the base timestamp under "ts" and, for
+every label, an array:
+
+    [first sample time - ts, sampling interval, base value, delta, delta, ...]
+
+Each delta is the difference with the previous sample, null when a sample
+is missing. The readings must be quantized (see quantize.py): the deltas are
+then small integers which CBOR encodes in one or two bytes, and add up to
+the exact values, where float deltas would take 9 bytes each and accumulate
+rounding errors.
+"""
+
+import airtime
+import cbor
+
+_TIMESTAMP = "ts"
+
+
+def _int_size(v):
+    """Return the size of the CBOR encoding of the integer v (also the size
+    of an array or map header holding v items)."""
+    if v < 0:
+        v = -1 - v
+    if v <= 23:
+        return 1
+    if v <= 0xff:
+        return 2
+    if v <= 0xffff:
+        return 3
+    if v <= 0xffffffff:
+        return 5
+    return 9
+
+
+class Batcher:
+    """Accumulate readings and pack them into frames bounded by the LoRa
+    payload size.
+
+    The encoded size of the pending frame is tracked as samples are added, so
+    that the frame is only encoded once, when it is complete.
+
+    :param max_samples: Number of samples per sensor that triggers a frame.
+    :param data_rate: The LoRa data rate, which bounds the frame size.
+    :param float_mode: How non quantized readings are encoded, see cbor.dumps().
+    """
+    def __init__(self, max_samples=6, data_rate=5, float_mode=None):
+        self.max_samples = max_samples
+        self.float_mode = float_mode
+        self.buf = bytearray(airtime.max_payload(data_rate))
+        self._ts_key_size = len(cbor.dumps(_TIMESTAMP))
+        self._reset()
+
+    def _reset(self):
+        self._frame = {}
+        self._size = 0
+        self._count = {}      # samples per label
+        self._last_t = {}     # time of the last sample per label
+        self._last_v = {}     # last value per label
+
+    def __len__(self):
+        """Return the number of samples in the pending frame."""
+        return sum(self._count.values())
+
+    def _value_size(self, v):
+        if v is None:
+            return 1
+        if isinstance(v, int) and not isinstance(v, bool):
+            return _int_size(v)
+        return len(cbor.dumps(v, float_mode=self.float_mode))
+
+    def add(self, t, d):
+        """Add the readings of d, sampled at time t (seconds).
+
+        Return a list of the frames (bytes) ready to be sent, usually empty.
+        """
+        out = []
+        for k in d:
+            v = d[k]
+            if v is not None and not self._append(t, k, v):
+                # irregular sampling or frame full, start a new frame
+                frame = self.flush()
+                if frame is None or not self._append(t, k, v):
+                    raise ValueError("sample too big for a LoRa frame")
+                out.append(frame)
+        for k in self._count:
+            if self._count[k] >= self.max_samples:
+                out.append(self.flush())
+                break
+        return out
+
+    def flush(self):
+        """Return the bytes of the pending frame and start a new one,
+        None if there is nothing to send.
+        """
+        if not self._count:
+            return None
+        n = cbor.dump_into(self._frame, self.buf, float_mode=self.float_mode)
+        out = bytes(memoryview(self.buf)[:n])
+        self._reset()
+        return out
+
+    def _append(self, t, k, v):
+        """Append the sample v of label k to the pending frame, return False
+        (and append nothing) if it does not fit or breaks the series interval.
+        """
+        frame = self._frame
+        if not frame:
+            # empty frame: map header and base timestamp
+            size = 1 + self._ts_key_size + _int_size(t)
+        else:
+            size = self._size
+        series = frame.get(k)
+        if series is None:
+            n_entries = len(frame) + 1 if frame else 2
+            offset = t - frame[_TIMESTAMP] if frame else 0
+            size += _int_size(n_entries) - _int_size(n_entries - 1)
+            size += len(cbor.dumps(k)) + 1 + _int_size(offset) + 1 + self._value_size(v)
+            if size > len(self.buf):
+                return False
+            if not frame:
+                frame[_TIMESTAMP] = t
+            frame[k] = [offset, 0, v]
+            self._count[k] = 1
+        else:
+            gap = t - self._last_t[k]
+            dt = series[1] or gap
+            if gap <= 0 or gap % dt:
+                return False
+            missing = gap // dt - 1
+            delta = v - self._last_v[k]
+            n_items = len(series) + missing + 1
+            size += _int_size(n_items) - _int_size(len(series))
+            size += _int_size(dt) - _int_size(series[1])
+            size += missing + self._value_size(delta)
+            if size > len(self.buf):
+                return False
+            series[1] = dt
+            for _ in range(missing):
+                series.append(None)
+            series.append(delta)
+            self._count[k] += 1
+        self._size = size
+        self._last_t[k] = t
+        self._last_v[k] = v
+        return True
+
+
+def expand(frame):
+    """Expand a decoded batch frame into a list of (time, label, value)
+    points, sorted by time.
+    """
+    t0 = frame[_TIMESTAMP]
+    points = []
+    for label in frame:
+        if label == _TIMESTAMP:
+            continue
+        series = frame[label]
+        t = t0 + series[0]
+        dt = series[1]
+        value = series[2]
+        points.append((t, label, value))
+        for i in range(3, len(series)):
+            t += dt
+            if series[i] is not None:
+                value += series[i]
+                points.append((t, label, value))
+    points.sort()
+    return points
@@ -21,17 +21,73 @@
 This module provides a method to check the status of the battery
 """
 
+import time
 from machine import ADC
 
+# Piece-wise linear approximation of a typical Li-Po battery discharge curve:
+# upper voltage of each segment, and SOC (%) = a*voltage + b on the segment,
+# then 100% above the last one.
+_SOC_VOLTAGES = (3.27, 3.6, 3.87, 4.2)
+_SOC_SEGMENTS = ((0.0, 0.0), (50.0, -175.0), (294.12, -1078.24), (121.21, -409.09),
+                 (0.0, 100.0))
+
+
+def _soc_segment(voltage):
+    # Index of the first segment whose upper voltage is >= voltage, by
+    # bisection of _SOC_VOLTAGES.
+    lo, hi = 0, len(_SOC_VOLTAGES)
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if _SOC_VOLTAGES[mid] < voltage:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _adc_to_pin_voltage(adc_val):
+    # ADC value to the voltage of bat_pin.
+    #LoPy ADC linearity window begins at 60 and ends at 4000
+    if(adc_val < 60):
+        return 0.0
+    #At ATTN_2_4_DB 4000 corresponds to approx. 1.32V
+    if(adc_val > 4000):
+        return 1.32
+
+    #These values were experimentally determined
+    a = 3273
+    b = -303
+
+    return (adc_val - b)/a
+
+
 class Battery:
     """A class to monitor a 3.7v Lithium-polymer battery.
     Caution: make sure that internal reference voltage have been calibrated!
 
+    The battery voltage is read by `sample`, which `voltage`, `soc` and
+    `energy` reuse while it is recent enough.
+
     :param bat_pin: The pin used to sense battery voltage.
     :param bat_capacity: The battery capacity, in mAh.
+    :param samples: The number of ADC measurements of a sample.
+    :param median: Take the median of the measurements instead of their mean,
+        to reject the spikes of the radio and the sensors.
+    :param alpha: The weight of a new sample in an exponential moving average
+        of the voltage, between 0 and 1. None to use the sample alone.
+    :param max_age: How long, in ms, a sample is reused before a new one is
+        taken.
     """
-    def __init__(self, bat_pin='P16', bat_capacity=1000):
+    def __init__(self, bat_pin='P16', bat_capacity=1000, samples=100, median=False,
+                 alpha=None, max_age=1000):
         self.bat_capacity = bat_capacity
+        self.samples = samples
+        self.median = median
+        self.alpha = alpha
+        self.max_age = max_age
+        self._voltage = None
+        self._sample_time = 0
+        self._values = [0] * samples if median else None
 
         #Configure ADC for battery voltage sensing
         adc = ADC()
@@ -53,64 +109,79 @@ class Battery:
         for i in range(0,100):
             sum+=self.bat_adc()
 
-        adc_val = int(round(sum/100.0))
-
-        #LoPy ADC linearity window begins at 60 and ends at 4000
-        if(adc_val < 60):
-            return 0.0
-        #At ATTN_2_4_DB 4000 corresponds to approx. 1.32V
-        if(adc_val > 4000):
-            return 1.32
-
-        #These values were experimentally determined
-        a = 3273
-        b = -303
-
-        return (adc_val - b)/a
-
-    def voltage(self):
-        """Return the battery voltage."""
+        return _adc_to_pin_voltage(int(round(sum/100.0)))
 
-        return self.a * self.bat_pin_voltage()
+    def sample(self):
+        """Measure the battery voltage, cache and return it.
 
-    def soc(self):
+        The samples ADC measurements are reduced to their median if `median`
+        is set, to their mean otherwise; with `alpha`, the result is then
+        folded into an exponential moving average of the previous samples.
+        A failed sensing returns 0.0 and leaves the cached voltage unchanged.
+        """
+        adc = self.bat_adc
+        if self.median:
+            values = self._values
+            for i in range(self.samples):
+                values[i] = adc()
+            values.sort()
+            n = self.samples >> 1
+            adc_val = values[n] if self.samples & 1 else (values[n-1] + values[n]) / 2
+        else:
+            sum = 0
+            for i in range(self.samples):
+                sum += adc()
+            adc_val = sum / self.samples
+        voltage = self.a * _adc_to_pin_voltage(int(round(adc_val)))
+        if not voltage:
+            # below the ADC window: a failed sensing, neither cached nor
+            # averaged
+            return 0.0
+        if self.alpha is not None and self._voltage is not None:
+            voltage = self._voltage + self.alpha * (voltage - self._voltage)
+        self._voltage = voltage
+        self._sample_time = time.ticks_ms()
+        return voltage
+
+    def voltage(self, max_age=None):
+        """Return the battery voltage, of the last sample if it is recent
+        enough, or of a new one.
+
+        :param max_age: (optional) The freshness window in ms, `max_age` by
+            default; 0 always samples.
+        """
+        if max_age is None:
+            max_age = self.max_age
+        if (self._voltage is None or
+                abs(time.ticks_diff(time.ticks_ms(), self._sample_time)) > max_age):
+            return self.sample()
+        return self._voltage
+
+    def soc(self, voltage=None):
         """Return the approximated state of charge, in percent.
         Caution: does not work when USB power is present (i.e.: while charging).
 
         This approximation is based on a piece-wise linear approximation of a
         typical Li-Po battery discharge curve.
-        """
-        a = 0.0
-        b= 0.0
-
-        if(self.voltage() <= 3.27):
-            a = 0.0
-            b= 0.0
-        elif(self.voltage() <= 3.6):
-            a = 50.0
-            b = -175.0
-        elif(self.voltage() <= 3.87):
-            a = 294.12
-            b = -1078.24
-        elif(self.voltage() <= 4.2):
-            a = 121.21
-            b = -409.09
-        else:
-            a = 0.0
-            b = 100.0
 
-        return a*self.voltage() + b
+        :param voltage: (optional) The battery voltage, `voltage()` by default.
+        """
+        if voltage is None:
+            voltage = self.voltage()
+        a, b = _SOC_SEGMENTS[_soc_segment(voltage)]
+        return a*voltage + b
 
     def energy(self):
         """Return an approximate of the energy available in the battery (in J).
         Caution: does not work when USB power is present (i.e.: while charging).
         """
+        voltage = self.voltage()
 
         #Multiplying the battery state of charge by its capacity at full charge
         #gives the battery capacity at the time of measrement (in mAh).
         #Multiplying this capacity by the measured voltage gives how much
         #energy is left in the battery (in mWh).
-        E_mWh = self.bat_capacity * self.soc() * self.voltage()
+        E_mWh = self.bat_capacity * self.soc(voltage) * voltage
 
         #1mWh = 10^(-3)J.s^(-1).h = 3600*10^(-3)J.s^(-1).s = 3.6J
         return 3.6*E_mWh
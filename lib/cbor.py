@@ -96,6 +96,10 @@ _CBOR_TAG_NEGBIGNUM_BYTES = ustruct.pack('B', _CBOR_TAG | _CBOR_TAG_NEGBIGNUM)
 
 _MAX_DEPTH = const(100)
 
+_FLOAT32_MAX = 3.4028234663852886e38
+_FLOAT_INF = float('inf')
+_FLOAT16_MIN_NORMAL = 6.103515625e-05
+
 
 def dumps_int(val):
     "return bytes representing int val in CBOR"
@@ -118,8 +122,73 @@ def _dumps_bignum_to_bytearray(val):
     return val.to_bytes(n_bytes, 'big')
 
 
-def dumps_float(val):
-    return ustruct.pack("!Bd", _CBOR_FLOAT64, val)
+def dumps_float(val, float_mode=None):
+    fmt, tb, payload, _ = _float_format(val, float_mode)
+    return ustruct.pack(fmt, tb, payload)
+
+
+def _float_format(val, float_mode=None):
+    """Choose how to encode the float val, return (format, initial byte, payload, size).
+
+    float_mode None always emits float64, the other modes emit float16 when
+    it is lossless, then:
+    'shortest': float32 when lossless, else float64;
+    'f32': float32 (relative error below 2**-24), float64 beyond its range;
+    'f16': float16 (relative error below 2**-11) within its normal range,
+    else as 'f32'.
+    """
+    if float_mode is None:
+        return "!Bd", _CBOR_FLOAT64, val, 9
+    if float_mode not in ('shortest', 'f32', 'f16'):
+        raise ValueError("unknown float mode: {0!r}".format(float_mode))
+    if val != val:  # NaN
+        return "!BH", _CBOR_FLOAT16, 0x7e00, 3
+    if val > _FLOAT32_MAX or val < -_FLOAT32_MAX:
+        if val == _FLOAT_INF or val == -_FLOAT_INF:
+            return "!BH", _CBOR_FLOAT16, 0x7c00 if val > 0 else 0xfc00, 3
+        return "!Bd", _CBOR_FLOAT64, val, 9
+    half = _half_bits(val)
+    if half is not None:
+        if _decode_half(half) == val:
+            return "!BH", _CBOR_FLOAT16, half, 3
+        if float_mode == 'f16' and abs(val) >= _FLOAT16_MIN_NORMAL:
+            return "!BH", _CBOR_FLOAT16, half, 3
+    if float_mode == 'shortest' and _decode_single(_single_bits(val)) != val:
+        return "!Bd", _CBOR_FLOAT64, val, 9
+    return "!Bf", _CBOR_FLOAT32, val, 5
+
+
+def _single_bits(val):
+    return ustruct.unpack("!I", ustruct.pack("!f", val))[0]
+
+
+def _half_bits(val):
+    """Return the float16 bits nearest to val (rounding to even),
+    or None if val overflows float16. val must be in the float32 range.
+    """
+    single = _single_bits(val)
+    sign = (single >> 16) & 0x8000
+    exp = ((single >> 23) & 0xff) - 112  # rebias from 127 to 15
+    mant = single & 0x7fffff
+    if exp >= 31:
+        return None
+    if exp <= 0:
+        # float16 subnormal (or zero)
+        if exp < -10:
+            return sign
+        mant |= 0x800000
+        shift = 14 - exp
+    else:
+        mant |= exp << 23
+        shift = 13
+    half = mant >> shift
+    rem = mant & ((1 << shift) - 1)
+    halfway = 1 << (shift - 1)
+    if rem > halfway or (rem == halfway and half & 1):
+        half += 1
+    if half >= 0x7c00:
+        return None
+    return sign | half
 
 
 def _encode_type_num(cbor_type, val):
@@ -138,6 +207,78 @@ def _encode_type_num(cbor_type, val):
     raise Exception("value too big for CBOR unsigned number: {0!r}".format(val))
 
 
+def _check_room(buf, off, n):
+    if off + n > len(buf):
+        raise ValueError("buffer too small for CBOR data")
+
+
+def _encode_type_num_into(buf, off, cbor_type, val):
+    """Same as _encode_type_num but writes into buf at off, return the new offset"""
+    assert val >= 0
+    if val <= 23:
+        _check_room(buf, off, 1)
+        buf[off] = cbor_type | val
+        return off + 1
+    if val <= 0x0ff: #UINT8
+        _check_room(buf, off, 2)
+        buf[off] = cbor_type | _CBOR_UINT8_FOLLOWS
+        buf[off + 1] = val
+        return off + 2
+    if val <= 0x0ffff: #UINT16
+        _check_room(buf, off, 3)
+        ustruct.pack_into('!BH', buf, off, cbor_type | _CBOR_UINT16_FOLLOWS, val)
+        return off + 3
+    if val <= 0x0ffffffff: #UINT32
+        _check_room(buf, off, 5)
+        ustruct.pack_into('!BI', buf, off, cbor_type | _CBOR_UINT32_FOLLOWS, val)
+        return off + 5
+    if val <= 0x0ffffffffffffffff: #UINT64
+        _check_room(buf, off, 9)
+        ustruct.pack_into('!BQ', buf, off, cbor_type | _CBOR_UINT64_FOLLOWS, val)
+        return off + 9
+    raise Exception("value too big for CBOR unsigned number: {0!r}".format(val))
+
+
+def _write_into(buf, off, data):
+    n = len(data)
+    _check_room(buf, off, n)
+    buf[off:off + n] = data
+    return off + n
+
+
+def _dump_scalar_into(buf, off, ob, float_mode=None):
+    """Encode a scalar (None, bool, int, float, str, bytes) into buf at off, return the new offset"""
+    if ob is None:
+        _check_room(buf, off, 1)
+        buf[off] = _CBOR_NULL
+        return off + 1
+    if isinstance(ob, bool):
+        _check_room(buf, off, 1)
+        buf[off] = _CBOR_TRUE if ob else _CBOR_FALSE
+        return off + 1
+    if isinstance(ob, float):
+        fmt, tb, payload, size = _float_format(ob, float_mode)
+        _check_room(buf, off, size)
+        ustruct.pack_into(fmt, buf, off, tb, payload)
+        return off + size
+    if isinstance(ob, int):
+        if ob < 0:
+            if ob < -0x10000000000000000: #BIGINT
+                return _write_into(buf, off, dumps_int(ob))
+            return _encode_type_num_into(buf, off, _CBOR_NEGINT, -1 - ob)
+        if ob > 0x0ffffffffffffffff: #BIGINT
+            return _write_into(buf, off, dumps_int(ob))
+        return _encode_type_num_into(buf, off, _CBOR_UINT, ob)
+    if isinstance(ob, str):
+        ob = ob.encode('utf8')
+        off = _encode_type_num_into(buf, off, _CBOR_TEXT, len(ob))
+        return _write_into(buf, off, ob)
+    if isinstance(ob, (bytes, bytearray)):
+        off = _encode_type_num_into(buf, off, _CBOR_BYTES, len(ob))
+        return _write_into(buf, off, ob)
+    raise Exception("don't know how to cbor serialize object of type %s", type(ob))
+
+
 def dumps_string(val):
     val = val.encode('utf8')
     return _encode_type_num(_CBOR_TEXT, len(val)) + val
@@ -151,24 +292,24 @@ def dumps_bytearray(val):
     return dumps_bytestring(bytes(val))
 
 
-def dumps_array(arr, sort_keys=False):
+def dumps_array(arr, sort_keys=False, float_mode=None):
     head = _encode_type_num(_CBOR_ARRAY, len(arr))
-    parts = [dumps(x, sort_keys=sort_keys) for x in arr]
+    parts = [dumps(x, sort_keys=sort_keys, float_mode=float_mode) for x in arr]
     return head + b''.join(parts)
 
 
-def dumps_dict(d, sort_keys=False):
+def dumps_dict(d, sort_keys=False, float_mode=None):
     head = _encode_type_num(_CBOR_MAP, len(d))
     parts = [head]
     if sort_keys:
         for k in sorted(d.keys()):
             v = d[k]
-            parts.append(dumps(k, sort_keys=sort_keys))
-            parts.append(dumps(v, sort_keys=sort_keys))
+            parts.append(dumps(k, sort_keys=sort_keys, float_mode=float_mode))
+            parts.append(dumps(v, sort_keys=sort_keys, float_mode=float_mode))
     else:
         for k,v in d.items():
-            parts.append(dumps(k, sort_keys=sort_keys))
-            parts.append(dumps(v, sort_keys=sort_keys))
+            parts.append(dumps(k, sort_keys=sort_keys, float_mode=float_mode))
+            parts.append(dumps(v, sort_keys=sort_keys, float_mode=float_mode))
     return b''.join(parts)
 
 
@@ -176,11 +317,18 @@ def dumps_bool(b):
     return ustruct.pack('B', _CBOR_TRUE) if b else ustruct.pack('B', _CBOR_FALSE)
 
 
-def dumps_tag(t, sort_keys=False):
-    return _encode_type_num(_CBOR_TAG, t.tag) + dumps(t.value, sort_keys=sort_keys)
+def dumps_tag(t, sort_keys=False, float_mode=None):
+    return _encode_type_num(_CBOR_TAG, t.tag) + dumps(t.value, sort_keys=sort_keys,
+                                                      float_mode=float_mode)
 
 
-def dumps(ob, sort_keys=False):
+def dumps(ob, sort_keys=False, float_mode=None):
+    """
+    Return the bytes representing ob in CBOR.
+
+    float_mode: None to encode floats as float64, or 'shortest', 'f32',
+    'f16' to use narrower representations (see _float_format).
+    """
     if ob is None:
         return ustruct.pack('B', _CBOR_NULL)
     if isinstance(ob, bool):
@@ -192,29 +340,172 @@ def dumps(ob, sort_keys=False):
     if isinstance(ob, bytearray):
         return dumps_bytearray(ob)
     if isinstance(ob, (list, tuple)):
-        return dumps_array(ob, sort_keys=sort_keys)
+        return dumps_array(ob, sort_keys=sort_keys, float_mode=float_mode)
     # TODO: accept other enumerables and emit a variable length array
     if isinstance(ob, dict):
-        return dumps_dict(ob, sort_keys=sort_keys)
+        return dumps_dict(ob, sort_keys=sort_keys, float_mode=float_mode)
     if isinstance(ob, float):
-        return dumps_float(ob)
+        return dumps_float(ob, float_mode)
     if isinstance(ob, int):
         return dumps_int(ob)
     if isinstance(ob, Tag):
-        return dumps_tag(ob, sort_keys=sort_keys)
+        return dumps_tag(ob, sort_keys=sort_keys, float_mode=float_mode)
     raise Exception("don't know how to cbor serialize object of type %s", type(ob))
 
 
 # same basic signature as json.dump, but with no options (yet)
-def dump(obj, fp, sort_keys=False):
+def dump(obj, fp, sort_keys=False, float_mode=None):
     """
     obj: Python object to serialize
     fp: file-like object capable of .write(bytes)
+
+    Each item is written to fp as soon as it is serialized, no intermediate
+    bytes object is built for the containers.
+    Return the number of bytes written.
+    """
+    return _StreamEncoder(fp, sort_keys, float_mode).encode(obj)
+
+
+def dump_into(obj, buf, offset=0, sort_keys=False, float_mode=None):
+    """
+    obj: Python object to serialize
+    buf: writable buffer (bytearray, memoryview) to serialize into, at offset
+
+    Raise ValueError if buf is too small.
+    Return the number of bytes written.
+    """
+    return _dump_into(buf, offset, obj, sort_keys, float_mode) - offset
+
+
+def _dump_into(buf, off, ob, sort_keys=False, float_mode=None):
+    if isinstance(ob, (list, tuple)):
+        off = _encode_type_num_into(buf, off, _CBOR_ARRAY, len(ob))
+        for x in ob:
+            off = _dump_into(buf, off, x, sort_keys, float_mode)
+        return off
+    if isinstance(ob, dict):
+        off = _encode_type_num_into(buf, off, _CBOR_MAP, len(ob))
+        for k in (sorted(ob.keys()) if sort_keys else ob):
+            off = _dump_into(buf, off, k, sort_keys, float_mode)
+            off = _dump_into(buf, off, ob[k], sort_keys, float_mode)
+        return off
+    if isinstance(ob, Tag):
+        off = _encode_type_num_into(buf, off, _CBOR_TAG, ob.tag)
+        return _dump_into(buf, off, ob.value, sort_keys, float_mode)
+    return _dump_scalar_into(buf, off, ob, float_mode)
+
+
+class _StreamEncoder(object):
+    """Serialize objects item by item to a file-like object.
+
+    Headers and scalars are encoded into a small scratch buffer, which is
+    written through a memoryview, so no bytes object is built for them.
+    """
+    def __init__(self, fp, sort_keys=False, float_mode=None):
+        self._fp = fp
+        self._sort_keys = sort_keys
+        self._float_mode = float_mode
+        self._scratch = bytearray(9)
+        self._mv = memoryview(self._scratch)
+
+    def _write(self, data):
+        self._fp.write(data)
+        return len(data)
+
+    def _head(self, cbor_type, val):
+        return self._write(self._mv[:_encode_type_num_into(self._scratch, 0, cbor_type, val)])
+
+    def encode(self, ob):
+        if isinstance(ob, (list, tuple)):
+            n = self._head(_CBOR_ARRAY, len(ob))
+            for x in ob:
+                n += self.encode(x)
+            return n
+        if isinstance(ob, dict):
+            n = self._head(_CBOR_MAP, len(ob))
+            for k in (sorted(ob.keys()) if self._sort_keys else ob):
+                n += self.encode(k)
+                n += self.encode(ob[k])
+            return n
+        if isinstance(ob, Tag):
+            return self._head(_CBOR_TAG, ob.tag) + self.encode(ob.value)
+        if isinstance(ob, str):
+            ob = ob.encode('utf8')
+            return self._head(_CBOR_TEXT, len(ob)) + self._write(ob)
+        if isinstance(ob, (bytes, bytearray)):
+            return self._head(_CBOR_BYTES, len(ob)) + self._write(ob)
+        if isinstance(ob, int) and (ob > 0x0ffffffffffffffff or ob < -0x10000000000000000):
+            return self._write(dumps_int(ob))
+        return self._write(self._mv[:_dump_scalar_into(self._scratch, 0, ob, self._float_mode)])
+
+
+class Schema(object):
+    """
+    Precompiled encoder for maps whose keys are known in advance.
+
+    The key headers are encoded once at construction; each call only encodes
+    the values, in schema order, into a reusable preallocated buffer. Keys
+    missing from the dictionary are skipped, keys unknown to the schema are
+    an error.
+
+    :param keys: The map keys, in the order they are emitted.
+    :param size: Size of the internal buffer, in bytes.
+    :param float_mode: How floats are encoded, see dumps().
     """
-    # this is kinda lame, but probably not inefficient for non-huge objects
-    # TODO: .write() to fp as we go as each inner object is serialized
-    blob = dumps(obj, sort_keys=sort_keys)
-    fp.write(blob)
+    def __init__(self, keys, size=222, float_mode=None):
+        if len(keys) > 23:
+            raise ValueError("a CBOR schema holds at most 23 keys")
+        self.keys = tuple(keys)
+        self._heads = tuple(dumps(k) for k in self.keys)
+        self.buf = bytearray(size)
+        self.float_mode = float_mode
+
+    def dump_into(self, d, buf=None, offset=0):
+        """Encode d into buf (the internal buffer by default) at offset.
+        Return the number of bytes written.
+        """
+        if buf is None:
+            buf = self.buf
+        _check_room(buf, offset, 1)
+        end = len(buf)
+        off = offset + 1  # map header, written once the item count is known
+        count = 0
+        keys = self.keys
+        heads = self._heads
+        float_mode = self.float_mode
+        for i in range(len(keys)):
+            k = keys[i]
+            if k in d:
+                head = heads[i]
+                n = off + len(head)
+                v = d[k]
+                # Fast path for the usual float and small int readings
+                if n + 9 <= end and type(v) is float and float_mode is None:
+                    buf[off:n] = head
+                    ustruct.pack_into("!Bd", buf, n, _CBOR_FLOAT64, v)
+                    off = n + 9
+                elif n + 1 <= end and type(v) is int and 0 <= v <= 23:
+                    buf[off:n] = head
+                    buf[n] = v
+                    off = n + 1
+                else:
+                    off = _write_into(buf, off, head)
+                    off = _dump_into(buf, off, v, False, float_mode)
+                count += 1
+        if count != len(d):
+            raise KeyError("dictionary has keys outside of the CBOR schema")
+        buf[offset] = _CBOR_MAP | count
+        return off - offset
+
+    def dumps(self, d):
+        """Return the bytes representing d in CBOR."""
+        n = self.dump_into(d)
+        return bytes(memoryview(self.buf)[:n])
+
+
+def compile_map(keys, size=222, float_mode=None):
+    """Return a Schema encoding maps with the given keys."""
+    return Schema(keys, size, float_mode)
 
 
 class Tag(object):
@@ -332,16 +623,18 @@ def _decode_single(single):
     return ustruct.unpack("!f", ustruct.pack("!I", single))[0]
 
 
+def _decode_half(half):
+    # Adapted from cbor2 unpack_float16()
+    value = (half & 0x7fff) << 13 | (half & 0x8000) << 16
+    if half & 0x7c00 != 0x7c00:
+        return math.ldexp(_decode_single(value), 112)
+    return _decode_single(value | 0x7f800000)
+
+
 def _loads_tb(fp, tb, limit=None, depth=0, returntags=False):
     if tb == _CBOR_FLOAT16:
-        # Adapted from cbor2 unpack_float16()
         data = fp.read(2)
-        data = ustruct.unpack('>H', data)[0]
-
-        value = (data & 0x7fff) << 13 | (data & 0x8000) << 16
-        if data & 0x7c00 != 0x7c00:
-            return math.ldexp(_decode_single(value), 112)
-        return _decode_single(value | 0x7f800000)
+        return _decode_half(ustruct.unpack('>H', data)[0])
     elif tb == _CBOR_FLOAT32:
         data = fp.read(4)
         return ustruct.unpack_from("!f", data, 0)[0]
@@ -403,6 +696,152 @@ def loads_bytes(fp, aux, btag=_CBOR_BYTES):
     return b''.join(chunklist)
 
 
+def loads_buffer(data, offset=0, returntags=False):
+    """
+    Parse one CBOR item from a bytes-like object (bytes, bytearray,
+    memoryview), starting at offset, without wrapping it in a stream.
+    Return (object, offset of the next item), so that a concatenation of
+    items can be decoded by feeding the returned offset back.
+    """
+    if data is None:
+        raise ValueError("got None for buffer to decode in loads_buffer")
+    try:
+        return _loads_buf(data, offset, 0, returntags)
+    except IndexError:
+        raise EOFError()
+
+
+def iter_loads(data, offset=0):
+    """Yield every CBOR item of a concatenated stream held in data."""
+    end = len(data)
+    while offset < end:
+        ob, offset = loads_buffer(data, offset)
+        yield ob
+
+
+def _buf_read(data, off, n):
+    end = off + n
+    if end > len(data):
+        raise EOFError()
+    return end
+
+
+def _buf_aux(data, off, tb):
+    "return (aux, offset after it) for the initial byte tb"
+    tag_aux = tb & _CBOR_INFO_BITS
+    if tag_aux <= 23:
+        return tag_aux, off
+    if tag_aux == _CBOR_UINT8_FOLLOWS:
+        return data[off], off + 1
+    if tag_aux == _CBOR_UINT16_FOLLOWS:
+        end = _buf_read(data, off, 2)
+        return ustruct.unpack_from("!H", data, off)[0], end
+    if tag_aux == _CBOR_UINT32_FOLLOWS:
+        end = _buf_read(data, off, 4)
+        return ustruct.unpack_from("!I", data, off)[0], end
+    if tag_aux == _CBOR_UINT64_FOLLOWS:
+        end = _buf_read(data, off, 8)
+        return ustruct.unpack_from("!Q", data, off)[0], end
+    assert tag_aux == _CBOR_VAR_FOLLOWS, "bogus tag {0:02x}".format(tb)
+    return None, off
+
+
+def _loads_buf_bytes(data, off, aux, btag):
+    if aux is not None:
+        end = _buf_read(data, off, aux)
+        return bytes(data[off:end]), end
+    # read chunks of bytes
+    chunklist = []
+    while True:
+        tb = data[off]
+        off += 1
+        if tb == _CBOR_BREAK:
+            break
+        assert tb & _CBOR_TYPE_MASK == btag, 'variable length value contains unexpected component'
+        aux, off = _buf_aux(data, off, tb)
+        end = _buf_read(data, off, aux)
+        chunklist.append(bytes(data[off:end]))
+        off = end
+    return b''.join(chunklist), off
+
+
+def _loads_buf(data, off, depth, returntags):
+    "return (object, offset of the next item)"
+    if depth > _MAX_DEPTH:
+        raise Exception("Hit CBOR loads recursion depth limit.")
+
+    tb = data[off]
+    off += 1
+    tag = tb & _CBOR_TYPE_MASK
+    aux = tb & _CBOR_INFO_BITS
+
+    if aux > 23:
+        if tb == _CBOR_FLOAT64:
+            end = _buf_read(data, off, 8)
+            return ustruct.unpack_from("!d", data, off)[0], end
+        elif tb == _CBOR_FLOAT32:
+            end = _buf_read(data, off, 4)
+            return ustruct.unpack_from("!f", data, off)[0], end
+        elif tb == _CBOR_FLOAT16:
+            end = _buf_read(data, off, 2)
+            return _decode_half(ustruct.unpack_from('>H', data, off)[0]), end
+        aux, off = _buf_aux(data, off, tb)
+
+    if tag == _CBOR_UINT:
+        return aux, off
+    elif tag == _CBOR_NEGINT:
+        return -1 - aux, off
+    elif tag == _CBOR_BYTES:
+        return _loads_buf_bytes(data, off, aux, _CBOR_BYTES)
+    elif tag == _CBOR_TEXT:
+        if aux is None:
+            raw, off = _loads_buf_bytes(data, off, aux, _CBOR_TEXT)
+            return raw.decode('utf8'), off
+        end = off + aux
+        if end > len(data):
+            raise EOFError()
+        return str(data[off:end], 'utf8'), end
+    elif tag == _CBOR_ARRAY:
+        ob = []
+        if aux is None:
+            while data[off] != _CBOR_BREAK:
+                item, off = _loads_buf(data, off, depth + 1, returntags)
+                ob.append(item)
+            return ob, off + 1
+        for _ in range(aux):
+            item, off = _loads_buf(data, off, depth + 1, returntags)
+            ob.append(item)
+        return ob, off
+    elif tag == _CBOR_MAP:
+        ob = {}
+        if aux is None:
+            while data[off] != _CBOR_BREAK:
+                subk, off = _loads_buf(data, off, depth + 1, returntags)
+                ob[subk], off = _loads_buf(data, off, depth + 1, returntags)
+            return ob, off + 1
+        for _ in range(aux):
+            subk, off = _loads_buf(data, off, depth + 1, returntags)
+            ob[subk], off = _loads_buf(data, off, depth + 1, returntags)
+        return ob, off
+    elif tag == _CBOR_TAG:
+        sub, off = _loads_buf(data, off, depth + 1, returntags)
+        if returntags:
+            # Don't interpret the tag, return it and the tagged object.
+            return Tag(aux, sub), off
+        # attempt to interpet the tag and the value into a Python object.
+        return tagify(sub, aux), off
+    elif tag == _CBOR_7:
+        if tb == _CBOR_TRUE:
+            return True, off
+        if tb == _CBOR_FALSE:
+            return False, off
+        if tb == _CBOR_NULL:
+            return None, off
+        if tb == _CBOR_UNDEFINED:
+            return None, off
+        raise ValueError("unknown cbor tag 7 byte: {:02x}".format(tb))
+
+
 def _bytes_to_biguint(bs):
     #Taken form cbor2 decode_positive_bignum()
     return int(hexlify(bs), 16)
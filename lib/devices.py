@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Registry of the buses and sensor drivers of the board.
+
+Every device is described by a factory, called the first time the device is
+needed; the instance is then cached, so that buses are opened and drivers
+initialized once. A device failing max_errors times in a row is dropped, along
+with the devices built on top of it, and created again on next use.
+"""
+
+
+class DeviceRegistry:
+    """Lazily created and cached device instances, with their health.
+
+    :param max_errors: Number of consecutive errors before a device is re-initialized.
+    """
+    def __init__(self, max_errors=3):
+        self.max_errors = max_errors
+        self._factories = {}
+        self._deps = {}
+        self._instances = {}
+        self._inits = {}
+        self._errors = {}
+        self._consecutive = {}
+        self._last_error = {}
+
+    def register(self, name, factory, deps=()):
+        """Declare the device name.
+
+        :param factory: The function creating the device, called with the
+                        instances of deps as arguments.
+        :param deps: The names of the devices it is built on (e.g. its bus).
+
+        Registering a name again drops its instance (and the devices using
+        it), the next get() creates it with the new factory.
+        """
+        if name in self._factories:
+            self.reset(name)
+        self._factories[name] = factory
+        self._deps[name] = tuple(deps)
+        self._inits[name] = 0
+        self._errors[name] = 0
+        self._consecutive[name] = 0
+        self._last_error[name] = None
+
+    def __contains__(self, name):
+        return name in self._factories
+
+    def get(self, name):
+        """Return the instance of the device name, creating it if needed."""
+        dev = self._instances.get(name)
+        if dev is None:
+            args = [self.get(dep) for dep in self._deps[name]]
+            try:
+                dev = self._factories[name](*args)
+            except Exception as e:
+                self._record_error(name, e)
+                raise
+            self._instances[name] = dev
+            self._inits[name] += 1
+        return dev
+
+    def call(self, name, func):
+        """Return func(device), recording the success or the failure of the call."""
+        dev = self.get(name)
+        try:
+            result = func(dev)
+        except Exception as e:
+            self.fail(name, e)
+            raise
+        self.ok(name)
+        return result
+
+    def ok(self, name):
+        """Record a successful use of the device name."""
+        self._consecutive[name] = 0
+
+    def fail(self, name, error=None):
+        """Record a failed use of the device name, drop it (and the devices
+        using it) after max_errors consecutive failures."""
+        self._record_error(name, error)
+        if self._consecutive[name] >= self.max_errors:
+            self.reset(name)
+
+    def _record_error(self, name, error):
+        self._errors[name] += 1
+        self._consecutive[name] += 1
+        self._last_error[name] = error
+
+    def reset(self, name):
+        """Drop the instance of the device name and of the devices using it,
+        they are created again on next use."""
+        self._instances.pop(name, None)
+        self._consecutive[name] = 0
+        for other in self._deps:
+            if name in self._deps[other] and other in self._instances:
+                self.reset(other)
+
+    def health(self):
+        """Return a dictionary of the state of every device, by name."""
+        return {name: {'up': name in self._instances,
+                       'inits': self._inits[name],
+                       'errors': self._errors[name],
+                       'consecutive_errors': self._consecutive[name],
+                       'last_error': None if self._last_error[name] is None
+                       else repr(self._last_error[name])}
+                for name in self._factories}
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Power policy of the status screen display.
+
+Update requests only mark the screen as pending; poll() flushes it at most
+once per frame interval, so the requests made in between cost one refresh.
+The panel is turned off (its RAM kept) when no wake request came for the idle
+timeout; updates made while it is off are drawn at once when it is woken up.
+Waking it is a single command, the reset and init_display of the driver only
+happen when the display is created.
+"""
+
+import scheduler
+
+
+class DisplayManager:
+    """Coalesced refreshes and idle poweroff of a status screen.
+
+    :param screen: A function returning the `StatusScreen`, called at each
+        flush only (the screen and its display can be created again).
+    :param frame_ms: Minimum time between two flushes, in milliseconds.
+    :param idle_ms: Time after the last wake request before the panel is
+        turned off, in milliseconds. None to keep it on.
+    :param clock: The clock, a `scheduler.MonotonicClock` by default.
+    """
+    def __init__(self, screen, frame_ms=1000, idle_ms=30000, clock=None):
+        self._screen = screen
+        self.frame_ms = frame_ms
+        self.idle_ms = idle_ms
+        self.clock = clock if clock is not None else scheduler.MonotonicClock()
+        self._display = None
+        self.on = False
+        self.pending = False
+        self._wake = False
+        now = self.clock.now()
+        self._flushed = now - frame_ms
+        self._woken = now
+        self._on_since = now
+        self.requests = 0
+        self.flushes = 0
+        self.wakes = 0
+        self.sleeps = 0
+        self._on_ms = 0
+
+    def request(self, wake=False):
+        """Ask for a refresh of the screen, after its values were set.
+
+        :param wake: Turn the panel on if it is off, and keep it on for the
+            idle timeout. Otherwise the update waits for the next wake up.
+        """
+        self.requests += 1
+        self.pending = True
+        if wake:
+            self._wake = True
+            self._woken = self.clock.now()
+
+    def poll(self):
+        """Flush the pending update when the frame interval has elapsed, or
+        turn the panel off when it is idle.
+
+        :return: True if the display was written to.
+        """
+        now = self.clock.now()
+        # the screen is only fetched (and a failed display created again) by
+        # the flushes, when the panel is on or woken up, and the first one
+        if self.pending and now - self._flushed >= self.frame_ms and \
+           (self.on or self._wake or self._display is None):
+            self._flush(now)
+            return True
+        if self.on and self.idle_ms is not None and now - self._woken >= self.idle_ms:
+            self._display.poweroff()
+            self.on = False
+            self.sleeps += 1
+            self._on_ms += now - self._on_since
+            return True
+        return False
+
+    def _flush(self, now):
+        screen = self._screen()
+        if screen.display is not self._display:
+            # created, so initialized and turned on
+            self._display = screen.display
+            if not self.on:
+                self._on_since = now
+            self.on = True
+        elif not self.on:
+            screen.display.wake()
+            self.on = True
+            self.wakes += 1
+            self._on_since = now
+        self.pending = False
+        self._wake = False
+        self._flushed = now
+        self.flushes += 1
+        screen.refresh()
+
+    def stats(self):
+        """Return a dictionary of the display statistics."""
+        on_ms = self._on_ms
+        if self.on:
+            on_ms += self.clock.now() - self._on_since
+        return {'on': self.on, 'requests': self.requests, 'flushes': self.flushes,
+                'coalesced': self.requests - self.flushes, 'wakes': self.wakes,
+                'sleeps': self.sleeps, 'on_ms': on_ms}
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Hardware abstraction layer.
+
+The code of the station imports the Pycom modules (`machine`, `network`,
+`pycom`, `micropython`, `framebuf`, `socket`, `time`) directly. Two backends
+provide them:
+
+- `hal.device`, on the board: the firmware modules themselves;
+- `hal.sim`, on a computer (CPython): a simulated board, with the AM2320,
+  SGP30 and SSD1306 on the I2C bus, the GPS and the SDS011 on the UARTs,
+  a LoRa radio and a virtual clock.
+
+Call install() before importing any module of the station, which then runs
+unmodified on either backend.
+"""
+
+import sys
+
+
+def backend_name():
+    """Return 'device' when running on MicroPython, 'sim' otherwise."""
+    if sys.implementation.name == 'micropython':
+        return 'device'
+    return 'sim'
+
+
+def install(backend=None, **kwargs):
+    """Install the modules of backend (backend_name() by default).
+
+    The keyword arguments are passed to the install() of the backend.
+    Return the backend board object.
+    """
+    if backend is None:
+        backend = backend_name()
+    if backend == 'device':
+        from hal import device
+        return device.install(**kwargs)
+    if backend == 'sim':
+        from hal import sim
+        return sim.install(**kwargs)
+    raise ValueError('Unknown HAL backend: ' + str(backend))
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+MicroPython backend of the HAL: the Pycom firmware modules.
+"""
+
+import machine
+import network
+import time
+
+I2C = machine.I2C
+UART = machine.UART
+Pin = machine.Pin
+ADC = machine.ADC
+LoRa = network.LoRa
+
+
+class Board:
+    """The board the code runs on, for symmetry with `hal.sim.Board`."""
+    name = 'device'
+
+    def ticks_ms(self):
+        """Return the board time, in milliseconds."""
+        return time.ticks_ms()
+
+
+def install(**kwargs):
+    """Nothing to install on the board, the firmware provides the modules.
+
+    Return a `Board`.
+    """
+    return Board()
@@ -0,0 +1,903 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+CPython simulation backend of the HAL.
+
+install() registers simulated `machine`, `network`, `pycom`, `micropython`,
+`framebuf`, `socket`, `time` and `_thread` modules (and the u* aliases of the
+standard modules), all driven by the virtual clock of a `Board`.
+
+Time only advances when the code waits (sleep, bus transfers, UART timeouts,
+LoRa airtime), so a day of operation runs in seconds. The threads started with
+`_thread` run one at a time, in virtual time order, which keeps runs
+deterministic. The simulation ends with `SimulationEnd` once the board
+duration has elapsed. The files the station writes (SGP30 baselines,
+telemetry log) go to the directory of the board flash, the working directory
+once installed, a temporary one by default.
+"""
+
+import atexit
+import binascii
+import builtins
+import errno
+import heapq
+import io
+import os
+import re
+import shutil
+import socket as _socket
+import struct
+import sys
+import tempfile
+import threading
+import time as _time
+import traceback
+import types
+
+import airtime
+from hal import sim_devices, sim_framebuf
+
+_TICKS_PERIOD = 1 << 30
+
+
+class SimulationEnd(SystemExit):
+    """Raised in every simulated thread when the board duration is over."""
+
+
+class _SimThread:
+    def __init__(self, seq):
+        self.seq = seq
+
+
+class Clock:
+    """Virtual time, in microseconds, shared by the simulated threads.
+
+    :param duration: The simulated duration in seconds, None to run forever.
+    """
+    def __init__(self, duration=None):
+        self.us = 0
+        self.limit_us = None if duration is None else int(duration * 1000000)
+        self.stopped = False
+        self._cv = threading.Condition()
+        self._local = threading.local()
+        self._seq = 0
+        self._waiting = []  # heap of (wake time, sequence, thread)
+        self._local.thread = self._running = self._new_thread()
+
+    def _new_thread(self):
+        self._seq += 1
+        return _SimThread(self._seq)
+
+    def wait_until(self, us):
+        """Block the calling thread until the virtual time us; the other
+        threads due before run meanwhile."""
+        me = getattr(self._local, 'thread', None)
+        if me is None:
+            raise RuntimeError('thread not started by the simulation')
+        with self._cv:
+            if self.stopped:
+                raise SimulationEnd()
+            heapq.heappush(self._waiting, (us, me.seq, me))
+            self._dispatch()
+            while self._running is not me and not self.stopped:
+                self._cv.wait()
+            if self.stopped:
+                raise SimulationEnd()
+
+    def sleep_us(self, us):
+        self.wait_until(self.us + max(0, int(us)))
+
+    def _dispatch(self):
+        us, _, thread = heapq.heappop(self._waiting)
+        if us > self.us:
+            if self.limit_us is not None and us > self.limit_us:
+                self.us = self.limit_us
+                self.stop()
+                return
+            self.us = us
+        self._running = thread
+        self._cv.notify_all()
+
+    def stop(self):
+        """End the simulation, every thread raises `SimulationEnd`."""
+        with self._cv:
+            self.stopped = True
+            self._cv.notify_all()
+
+    def start_thread(self, func, args=(), kwargs=None):
+        """Start func(*args) in a simulated thread, runnable now."""
+        thread = self._new_thread()
+        with self._cv:
+            heapq.heappush(self._waiting, (self.us, thread.seq, thread))
+
+        def run():
+            self._local.thread = thread
+            try:
+                with self._cv:
+                    while self._running is not thread and not self.stopped:
+                        self._cv.wait()
+                if not self.stopped:
+                    func(*args, **(kwargs or {}))
+            except SystemExit:
+                pass
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self._cv:
+                    if self._running is thread and self._waiting and not self.stopped:
+                        self._dispatch()
+
+        threading.Thread(target=run, daemon=True).start()
+        return thread.seq
+
+
+class I2CBus:
+    """The physical I2C bus: its devices and traffic counters."""
+    def __init__(self, board):
+        self.board = board
+        self.devices = {}
+        self.inits = 0
+        self.transactions = 0
+        self.errors = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.busy_us = 0
+        self.per_address = {}
+
+    def attach(self, device):
+        device.attach(self.board)
+        self.devices[device.address] = device
+
+    def _count(self, addr, written, read, baudrate):
+        self.transactions += 1
+        self.bytes_written += written
+        self.bytes_read += read
+        stats = self.per_address.setdefault(addr, [0, 0])
+        stats[0] += 1
+        stats[1] += written + read
+        # address byte and data bytes, 9 clocks each
+        us = (1 + written + read) * 9 * 1000000 // baudrate
+        self.busy_us += us
+        self.board.clock.sleep_us(us)
+
+    def write(self, addr, data, baudrate):
+        self._count(addr, len(data), 0, baudrate)
+        device = self.devices.get(addr)
+        try:
+            if device is None:
+                raise OSError(errno.ENODEV, 'I2C NACK')
+            device.write(bytes(data))
+        except OSError:
+            self.errors += 1
+            raise
+
+    def read(self, addr, n, baudrate):
+        self._count(addr, 0, n, baudrate)
+        device = self.devices.get(addr)
+        try:
+            if device is None:
+                raise OSError(errno.ENODEV, 'I2C NACK')
+            return device.read(n)
+        except OSError:
+            self.errors += 1
+            raise
+
+
+class UARTPort:
+    """The receive buffer of a UART and its counters."""
+    def __init__(self, board, device):
+        self.board = board
+        self.device = device
+        self.rx = bytearray()
+        self.rx_buffer_size = 512
+        self.inits = 0
+        self.read_calls = 0
+        self.write_calls = 0
+        self.rx_bytes = 0
+        self.tx_bytes = 0
+        self.overruns = 0
+        if device is not None:
+            device.attach(board)
+
+    def fill(self):
+        if self.device is None:
+            return
+        data = self.device.poll(self.board.clock.us)
+        room = self.rx_buffer_size - len(self.rx)
+        if len(data) > room:
+            self.overruns += len(data) - room
+            data = data[:max(room, 0)]
+        self.rx += data
+
+    def wait(self, satisfied, timeout_us):
+        """Wait for satisfied() while characters keep arriving within timeout_us."""
+        clock = self.board.clock
+        self.fill()
+        deadline = clock.us + timeout_us
+        while not satisfied():
+            nxt = None if self.device is None else self.device.next_byte_us()
+            if nxt is None or nxt > deadline:
+                if deadline > clock.us:
+                    clock.wait_until(deadline)
+                self.fill()
+                return
+            clock.wait_until(nxt)
+            n = len(self.rx)
+            self.fill()
+            if len(self.rx) > n:
+                deadline = clock.us + timeout_us
+
+    def take(self, n):
+        out = bytes(self.rx[:n])
+        del self.rx[:n]
+        self.rx_bytes += len(out)
+        return out
+
+
+def _make_machine(board):
+    m = types.ModuleType('machine')
+
+    class Pin:
+        IN = 1
+        OUT = 2
+        OPEN_DRAIN = 7
+        PULL_UP = 1
+        PULL_DOWN = 2
+        IRQ_FALLING = 1
+        IRQ_RISING = 2
+
+        def __init__(self, id, mode=IN, pull=None, value=None, **kwargs):
+            self._id = id
+            self.mode = mode
+            if value is not None:
+                board.pins[id] = int(bool(value))
+            else:
+                board.pins.setdefault(id, 0)
+
+        def init(self, mode=IN, pull=None, value=None, **kwargs):
+            self.mode = mode
+            if value is not None:
+                self.value(value)
+
+        def value(self, v=None):
+            if v is None:
+                return board.pins.get(self._id, 0)
+            board.pins[self._id] = int(bool(v))
+
+        __call__ = value
+
+        def id(self):
+            return self._id
+
+        def toggle(self):
+            self.value(not self.value())
+
+        def hold(self, hold=None):
+            return False
+
+        def high(self):
+            self.value(1)
+
+        def low(self):
+            self.value(0)
+
+    class I2C:
+        MASTER = 0
+        SLAVE = 1
+
+        def __init__(self, bus=0, mode=MASTER, baudrate=100000, pins=None):
+            self.baudrate = baudrate
+            board.i2c.inits += 1
+
+        def init(self, mode=MASTER, baudrate=100000, pins=None):
+            self.baudrate = baudrate
+            board.i2c.inits += 1
+
+        def deinit(self):
+            pass
+
+        def scan(self):
+            return sorted(board.i2c.devices)
+
+        def writeto(self, addr, buf, stop=True):
+            board.i2c.write(addr, buf, self.baudrate)
+            return len(buf)
+
+        def readfrom(self, addr, nbytes, stop=True):
+            return board.i2c.read(addr, nbytes, self.baudrate)
+
+        def readfrom_into(self, addr, buf, stop=True):
+            data = board.i2c.read(addr, len(buf), self.baudrate)
+            buf[:len(data)] = data
+
+        def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+            self.writeto(addr, bytes((memaddr,)) + bytes(buf))
+
+        def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+            self.writeto(addr, bytes((memaddr,)))
+            return self.readfrom(addr, nbytes)
+
+    class UART:
+        EVEN = 0
+        ODD = 1
+        RX_ANY = 1
+
+        def __init__(self, bus, baudrate=9600, bits=8, parity=None, stop=1,
+                     timeout_chars=2, pins=None, rx_buffer_size=512):
+            self._port = board.uart_port(bus)
+            self.init(baudrate, bits, parity, stop, timeout_chars=timeout_chars,
+                      pins=pins, rx_buffer_size=rx_buffer_size)
+
+        def init(self, baudrate=9600, bits=8, parity=None, stop=1,
+                 timeout_chars=2, pins=None, rx_buffer_size=512):
+            port = self._port
+            port.inits += 1
+            # the driver is re-installed: the receive buffer is lost
+            port.fill()
+            port.rx = bytearray()
+            port.rx_buffer_size = rx_buffer_size
+            self.baudrate = baudrate
+            self._timeout_us = max(timeout_chars, 1) * 10000000 // baudrate
+
+        def deinit(self):
+            pass
+
+        def any(self):
+            self._port.fill()
+            return len(self._port.rx)
+
+        def write(self, buf):
+            if isinstance(buf, str):
+                buf = buf.encode()
+            port = self._port
+            port.fill()
+            port.write_calls += 1
+            port.tx_bytes += len(buf)
+            if port.device is not None:
+                port.device.receive(bytes(buf))
+            return len(buf)
+
+        def read(self, nbytes=None):
+            port = self._port
+            port.read_calls += 1
+            if nbytes is None:
+                port.wait(lambda: len(port.rx) > 0, self._timeout_us)
+                nbytes = len(port.rx)
+            else:
+                port.wait(lambda: len(port.rx) >= nbytes, self._timeout_us)
+            if not port.rx:
+                return None
+            return port.take(nbytes)
+
+        def readinto(self, buf, nbytes=None):
+            if nbytes is None:
+                nbytes = len(buf)
+            port = self._port
+            port.read_calls += 1
+            port.wait(lambda: len(port.rx) >= nbytes, self._timeout_us)
+            if not port.rx:
+                return None
+            data = port.take(nbytes)
+            buf[:len(data)] = data
+            return len(data)
+
+        def readline(self):
+            port = self._port
+            port.read_calls += 1
+            port.wait(lambda: b'\n' in port.rx, self._timeout_us)
+            if not port.rx:
+                return None
+            end = port.rx.find(b'\n')
+            return port.take(len(port.rx) if end < 0 else end + 1)
+
+        def wait_tx_done(self, timeout_ms):
+            return True
+
+        def sendbreak(self):
+            pass
+
+    class ADC:
+        ATTN_0DB = 0
+        ATTN_2_5DB = 1
+        ATTN_6DB = 2
+        ATTN_11DB = 3
+
+        def __init__(self, id=0, bits=12):
+            pass
+
+        def init(self, bits=12):
+            pass
+
+        def deinit(self):
+            pass
+
+        def vref(self, vref=None):
+            return 1100
+
+        def channel(self, pin=None, attn=ATTN_0DB, **kwargs):
+            return _ADCChannel(pin)
+
+    class _ADCChannel:
+        def __init__(self, pin):
+            self.pin = pin
+
+        def value(self):
+            return board.battery.adc_value(board.clock.us / 1000000)
+
+        __call__ = value
+
+        def voltage(self):
+            return self.value() * 1100 // 4095
+
+        def init(self):
+            pass
+
+        def deinit(self):
+            pass
+
+    def deepsleep(time_ms=None):
+        raise SimulationEnd()
+
+    m.Pin = Pin
+    m.I2C = I2C
+    m.UART = UART
+    m.ADC = ADC
+    m.unique_id = lambda: b'\x24\x0a\xc4\x00\x01\x10'
+    m.freq = lambda *args: 160000000
+    m.idle = lambda: None
+    m.reset = deepsleep
+    m.deepsleep = deepsleep
+    m.disable_irq = lambda: 0
+    m.enable_irq = lambda state=0: None
+    return m
+
+
+class LoRaRadio:
+    """The LoRa radio and the network behind it.
+
+    :param board: The `Board`.
+    :param join_delay: Time to join the network, in seconds.
+    :param airtime: Fixed time on air of an uplink in seconds, None to compute
+                    it from the payload size and the data rate.
+    :param duty_cycle: The duty cycle limit of the band.
+    :param downlink: Function returning the downlink (bytes or None) answering
+                     an uplink frame.
+    :param ack_loss: Probability that a confirmed uplink is not acknowledged.
+    """
+    # LoRa.events() flags
+    RX_PACKET_EVENT = 1
+    TX_PACKET_EVENT = 2
+    TX_FAILED_EVENT = 4
+
+    def __init__(self, board, join_delay=6.0, airtime=None, duty_cycle=0.01,
+                 downlink=None, ack_loss=0.0):
+        self.board = board
+        self.join_delay = join_delay
+        self.airtime = airtime
+        self.duty_cycle = duty_cycle
+        self.downlink = downlink
+        self.ack_loss = ack_loss
+        self.joined_at = None
+        self.events = 0
+        self.acks = 0
+        self.uplinks = []   # (time in s, data rate, frame)
+        self.airtime_us = 0
+        self.rejected = 0
+        self._next_tx_us = 0
+        self._rx = []       # (delivery time in us, payload)
+
+    def time_on_air_us(self, n, dr):
+        if self.airtime is not None:
+            return int(self.airtime * 1000000)
+        return int(airtime.time_on_air(n, dr) * 1000000)
+
+    def has_joined(self):
+        clock = self.board.clock
+        if self.joined_at is None or clock.us < self.joined_at:
+            # polling the join status costs a little time
+            clock.sleep_us(1000)
+            return False
+        return True
+
+    def send(self, data, dr, blocking, timeout, confirmed=False):
+        clock = self.board.clock
+        if self.joined_at is None or clock.us < self.joined_at:
+            raise OSError(errno.ENOTCONN, 'not joined')
+        if len(data) > airtime.max_payload(dr):
+            self.rejected += 1
+            raise OSError(errno.EMSGSIZE, 'payload too long for the data rate')
+        start = max(clock.us, self._next_tx_us)
+        if start > clock.us:
+            if not blocking:
+                raise OSError(errno.EAGAIN, 'duty cycle')
+            if timeout is not None and start - clock.us > timeout * 1000000:
+                clock.sleep_us(timeout * 1000000)
+                raise TimeoutError('duty cycle')
+            clock.wait_until(start)
+        toa = self.time_on_air_us(len(data), dr)
+        clock.wait_until(start + toa)
+        self.airtime_us += toa
+        self._next_tx_us = start + int(toa / self.duty_cycle)
+        self.uplinks.append((start / 1000000, dr, bytes(data)))
+        if confirmed and self.ack_loss and self.board.env.random.random() < self.ack_loss:
+            self.events |= self.TX_FAILED_EVENT
+        else:
+            self.acks += confirmed
+            self.events |= self.TX_PACKET_EVENT
+        if self.downlink is not None:
+            payload = self.downlink(bytes(data))
+            if payload is not None:
+                # received in the first receive window, 1 s after the uplink
+                self._rx.append((clock.us + 1000000, bytes(payload)))
+
+    def recv(self, n, blocking, timeout):
+        clock = self.board.clock
+        if blocking and self._rx and self._rx[0][0] > clock.us:
+            clock.wait_until(self._rx[0][0])
+        if self._rx and self._rx[0][0] <= clock.us:
+            return self._rx.pop(0)[1][:n]
+        return b''
+
+    def read_events(self):
+        events, self.events = self.events, 0
+        return events
+
+
+def _make_network(board):
+    m = types.ModuleType('network')
+
+    class LoRa:
+        LORA = 0
+        LORAWAN = 1
+        OTAA = 0
+        ABP = 1
+        ALWAYS_ON = 0
+        TX_ONLY = 1
+        SLEEP = 2
+        CLASS_A = 0
+        CLASS_C = 2
+        AS923, AU915, EU868, US915 = 0, 1, 5, 8
+        BW_125KHZ = 0
+        CODING_4_5 = 1
+        RX_PACKET_EVENT = LoRaRadio.RX_PACKET_EVENT
+        TX_PACKET_EVENT = LoRaRadio.TX_PACKET_EVENT
+        TX_FAILED_EVENT = LoRaRadio.TX_FAILED_EVENT
+
+        def __init__(self, mode=LORAWAN, region=EU868, **kwargs):
+            self.mode = mode
+            self._power_mode = LoRa.ALWAYS_ON
+
+        def init(self, mode=LORAWAN, **kwargs):
+            self.mode = mode
+
+        def join(self, activation=OTAA, auth=None, timeout=None, dr=None):
+            radio = board.lora
+            radio.joined_at = board.clock.us + int(radio.join_delay * 1000000)
+
+        def has_joined(self):
+            return board.lora.has_joined()
+
+        def events(self):
+            return board.lora.read_events()
+
+        def power_mode(self, mode=None):
+            if mode is None:
+                return self._power_mode
+            self._power_mode = mode
+
+        def mac(self):
+            return b'\x70\xb3\xd5\x49\x90\x00\x01\x10'
+
+        def stats(self):
+            return (board.clock.us // 1000, -80, 7.0, 0, 0, 0, 0, 0, 0)
+
+        def nvram_save(self):
+            pass
+
+        def nvram_restore(self):
+            pass
+
+        def nvram_erase(self):
+            pass
+
+        def set_battery_level(self, level):
+            pass
+
+    class Bluetooth:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def deinit(self):
+            pass
+
+    class WLAN:
+        STA = 1
+        AP = 2
+
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def deinit(self):
+            pass
+
+    m.LoRa = LoRa
+    m.Bluetooth = Bluetooth
+    m.WLAN = WLAN
+    return m
+
+
+def _make_socket(board):
+    m = types.ModuleType('socket')
+    for name in dir(_socket):
+        if not name.startswith('__'):
+            setattr(m, name, getattr(_socket, name))
+    m.AF_LORA = 160
+    m.SOCK_RAW = 3
+    m.SOL_LORA = 0x12345
+    m.SO_CONFIRMED = 1
+    m.SO_DR = 2
+    m.SO_PORT = 3
+
+    class LoRaSocket:
+        def __init__(self):
+            self.dr = 5
+            self.confirmed = False
+            self.port = 2
+            self.blocking = True
+            self.timeout = None
+
+        def setsockopt(self, level, option, value):
+            if option == m.SO_DR:
+                self.dr = value
+            elif option == m.SO_CONFIRMED:
+                self.confirmed = bool(value)
+            elif option == m.SO_PORT:
+                self.port = value
+
+        def setblocking(self, flag):
+            self.blocking = bool(flag)
+            self.timeout = None
+
+        def settimeout(self, value):
+            self.timeout = value
+            self.blocking = value != 0
+
+        def bind(self, port):
+            self.port = port
+
+        def send(self, data):
+            board.lora.send(bytes(data), self.dr, self.blocking, self.timeout,
+                            self.confirmed)
+            return len(data)
+
+        def recv(self, bufsize):
+            return board.lora.recv(bufsize, self.blocking, self.timeout)
+
+        def close(self):
+            pass
+
+    def socket(family=_socket.AF_INET, type=_socket.SOCK_STREAM, proto=0):
+        if family == m.AF_LORA:
+            return LoRaSocket()
+        return _socket.socket(family, type, proto)
+
+    m.socket = socket
+    return m
+
+
+def _make_time(board):
+    clock = board.clock
+    m = types.ModuleType('time')
+    for name in dir(_time):
+        if not name.startswith('__'):
+            setattr(m, name, getattr(_time, name))
+
+    def ticks_diff(new, old):
+        half = _TICKS_PERIOD >> 1
+        return ((new - old + half) & (_TICKS_PERIOD - 1)) - half
+
+    # without a synchronized RTC, the Pycom time() counts from the boot
+    m.time = lambda: clock.us / 1000000
+    m.time_ns = lambda: clock.us * 1000
+    m.monotonic = m.perf_counter = m.time
+    m.sleep = lambda seconds: clock.sleep_us(seconds * 1000000)
+    m.sleep_ms = lambda ms: clock.sleep_us(ms * 1000)
+    m.sleep_us = clock.sleep_us
+    m.ticks_ms = lambda: (clock.us // 1000) & (_TICKS_PERIOD - 1)
+    m.ticks_us = lambda: clock.us & (_TICKS_PERIOD - 1)
+    m.ticks_cpu = m.ticks_us
+    m.ticks_diff = ticks_diff
+    m.ticks_add = lambda ticks, delta: (ticks + delta) & (_TICKS_PERIOD - 1)
+    m.localtime = lambda secs=None: _time.gmtime(
+        sim_devices._EPOCH + (clock.us // 1000000 if secs is None else secs))
+    m.gmtime = m.localtime
+    return m
+
+
+def _make_thread(board):
+    m = types.ModuleType('_thread')
+    m.start_new_thread = lambda func, args, kwargs=None: \
+        board.clock.start_thread(func, args, kwargs)
+    m.allocate_lock = threading.Lock
+    m.LockType = type(threading.Lock())
+    m.get_ident = threading.get_ident
+    m.stack_size = lambda size=0: 0
+
+    def exit():
+        raise SystemExit()
+
+    m.exit = exit
+    return m
+
+
+def _make_pycom(board):
+    m = types.ModuleType('pycom')
+
+    def heartbeat(on=None):
+        if on is None:
+            return board.heartbeat
+        board.heartbeat = bool(on)
+
+    def rgbled(color):
+        board.led = color
+
+    def nvs_get(key, default=None):
+        return board.nvs.get(key, default)
+
+    def nvs_set(key, value):
+        board.nvs[key] = value
+
+    m.heartbeat = heartbeat
+    m.rgbled = rgbled
+    m.nvs_get = nvs_get
+    m.nvs_set = nvs_set
+    m.nvs_erase = lambda key: board.nvs.pop(key, None)
+    m.nvs_erase_all = board.nvs.clear
+    m.heartbeat_on_boot = lambda on=None: False
+    m.wifi_on_boot = lambda on=None: False
+    return m
+
+
+def _make_micropython():
+    m = types.ModuleType('micropython')
+    m.const = lambda x: x
+    m.opt_level = lambda level=None: 0
+    m.alloc_emergency_exception_buf = lambda size: None
+    m.mem_info = lambda verbose=None: None
+    m.qstr_info = lambda verbose=None: None
+    m.schedule = lambda func, arg: func(arg)
+    m.heap_lock = m.heap_unlock = lambda: 0
+    m.native = m.viper = lambda func: func
+    return m
+
+
+def _print_exception(exc, file=None):
+    traceback.print_exception(type(exc), exc, exc.__traceback__, file=file)
+
+
+class Board:
+    """The simulated LoPy4 and its peripherals.
+
+    :param duration: The simulated duration in seconds, None to run forever.
+    :param seed: The seed of the environment noise.
+    :param env: The `sim_devices.Environment` the sensors measure.
+    :param nmea: Recorded NMEA sentences replayed by the GPS.
+    :param am2320_error_rate: Probability of a corrupted AM2320 reply.
+    :param join_delay: Time to join the LoRaWAN network, in seconds.
+    :param airtime: Fixed LoRa time on air, in seconds (None: computed).
+    :param duty_cycle: The LoRa duty cycle limit.
+    :param downlink: Function returning the downlink answering an uplink.
+    :param battery_voltage: The battery voltage at boot.
+    :param ack_loss: Probability that a confirmed uplink is not acknowledged.
+    :param flash: The directory of the flash file system, a temporary one
+        (removed at exit) if None.
+    """
+    def __init__(self, duration=None, seed=0, env=None, nmea=None,
+                 am2320_error_rate=0.0, join_delay=6.0, airtime=None,
+                 duty_cycle=0.01, downlink=None, battery_voltage=3.95, ack_loss=0.0,
+                 flash=None):
+        if flash is None:
+            flash = tempfile.mkdtemp(prefix='sim_flash_')
+            atexit.register(shutil.rmtree, flash, True)
+        self.flash = flash
+        self.clock = Clock(duration)
+        self.env = env if env is not None else sim_devices.Environment(seed)
+        self.pins = {}
+        self.nvs = {}
+        self.heartbeat = True
+        self.led = 0
+        self.i2c = I2CBus(self)
+        self.am2320 = sim_devices.AM2320(self.env, am2320_error_rate)
+        self.sgp30 = sim_devices.SGP30(self.env)
+        self.ssd1306 = sim_devices.SSD1306()
+        for device in (self.am2320, self.sgp30, self.ssd1306):
+            self.i2c.attach(device)
+        self.gps = sim_devices.GPS(self.env, nmea)
+        self.sds011 = sim_devices.SDS011(self.env, power_pin='P8')
+        self.uarts = {1: UARTPort(self, self.gps), 2: UARTPort(self, self.sds011)}
+        self.battery = sim_devices.Battery(battery_voltage, env=self.env)
+        self.lora = LoRaRadio(self, join_delay, airtime, duty_cycle, downlink, ack_loss)
+        self.modules = {}
+
+    def uart_port(self, bus):
+        if bus not in self.uarts:
+            self.uarts[bus] = UARTPort(self, None)
+        return self.uarts[bus]
+
+    def report(self):
+        """Return a dictionary of the traffic and activity counters."""
+        i2c = self.i2c
+        return {
+            'time_s': self.clock.us / 1000000,
+            'i2c': {'inits': i2c.inits, 'transactions': i2c.transactions,
+                    'errors': i2c.errors, 'bytes': i2c.bytes_written + i2c.bytes_read,
+                    'busy_ms': i2c.busy_us // 1000,
+                    'per_address': {'0x%02x' % a: {'transactions': s[0], 'bytes': s[1]}
+                                    for a, s in sorted(i2c.per_address.items())}},
+            'uart': {bus: {'inits': p.inits, 'read_calls': p.read_calls,
+                           'write_calls': p.write_calls, 'rx_bytes': p.rx_bytes,
+                           'tx_bytes': p.tx_bytes, 'overruns': p.overruns}
+                     for bus, p in sorted(self.uarts.items())},
+            'display': {'on': self.ssd1306.on, 'cmd_bytes': self.ssd1306.cmd_bytes,
+                        'data_bytes': self.ssd1306.data_bytes},
+            'lora': {'uplinks': len(self.lora.uplinks),
+                     'payload_bytes': sum(len(u[2]) for u in self.lora.uplinks),
+                     'airtime_s': self.lora.airtime_us / 1000000,
+                     'rejected': self.lora.rejected, 'acks': self.lora.acks},
+            'sds011_measurements': self.sds011.measurements,
+            'gps_epochs': self.gps.epochs,
+            'adc_conversions': self.battery.conversions,
+            'flash_files': sorted(os.listdir(self.flash)),
+        }
+
+
+def install(board=None, **kwargs):
+    """Register the simulated modules of board in sys.modules.
+
+    Must be called before the station modules are imported. The working
+    directory becomes the board flash.
+
+    :param board: The `Board`, a new one built with kwargs if None.
+    :return: the board.
+    """
+    if board is None:
+        board = Board(**kwargs)
+    builtins.const = lambda x: x
+    if not hasattr(sys, 'print_exception'):
+        sys.print_exception = _print_exception
+    sim_time = _make_time(board)
+    sim_socket = _make_socket(board)
+    board.modules = {
+        'machine': _make_machine(board),
+        'network': _make_network(board),
+        'pycom': _make_pycom(board),
+        'micropython': _make_micropython(),
+        'framebuf': sim_framebuf,
+        'time': sim_time,
+        'utime': sim_time,
+        'socket': sim_socket,
+        'usocket': sim_socket,
+        '_thread': _make_thread(board),
+        'ustruct': struct,
+        'ure': re,
+        'uio': io,
+        'ubinascii': binascii,
+    }
+    sys.modules.update(board.modules)
+    os.chdir(board.flash)
+    return board
@@ -0,0 +1,589 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Simulated peripherals of the station: the I2C sensors and display, the UART
+sensors and the battery, answering the register traffic of their datasheets.
+"""
+
+import errno
+import math
+import random
+import struct
+import time
+
+_EPOCH = 1561939200  # UTC date of the simulated boot, 2019-07-01
+
+
+def crc16_modbus(data):
+    """CRC-16/MODBUS (AM2320 replies)."""
+    crc = 0xffff
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def crc8_sensirion(data):
+    """CRC-8, polynomial 0x31, init 0xFF (SGP30 words)."""
+    crc = 0xff
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31 if crc & 0x80 else crc << 1) & 0xff
+    return crc
+
+
+def nmea_checksum(body):
+    """XOR of the characters of body (between '$' and '*')."""
+    c = 0
+    for ch in body:
+        c ^= ord(ch)
+    return c
+
+
+def nmea_sentence(body):
+    """Return the bytes of the sentence '$body*CS\\r\\n'."""
+    return ('$%s*%02X\r\n' % (body, nmea_checksum(body))).encode()
+
+
+class Environment:
+    """What the sensors measure, as functions of the time t (in seconds).
+
+    Daily and hourly cycles plus a little seeded noise.
+
+    :param seed: The seed of the noise.
+    :param lat: The latitude of the station, in degrees.
+    :param lon: The longitude of the station, in degrees.
+    :param alt: The altitude of the station, in meters.
+    """
+    def __init__(self, seed=0, lat=48.3585, lon=-4.5702, alt=52.0):
+        self.random = random.Random(seed)
+        self.lat = lat
+        self.lon = lon
+        self.alt = alt
+
+    def _noise(self, scale):
+        return self.random.uniform(-scale, scale)
+
+    def temperature(self, t):
+        return 18.0 + 4.0 * math.sin(2 * math.pi * t / 86400) + self._noise(0.1)
+
+    def humidity(self, t):
+        return 60.0 - 10.0 * math.sin(2 * math.pi * t / 86400) + self._noise(0.5)
+
+    def co2(self, t):
+        return 450 + 150 * (1 + math.sin(2 * math.pi * t / 3600)) / 2 + self._noise(5)
+
+    def tvoc(self, t):
+        return 30 + 40 * (1 + math.sin(2 * math.pi * t / 5400)) / 2 + self._noise(3)
+
+    def pm25(self, t):
+        return 8.0 + 4.0 * (1 + math.sin(2 * math.pi * t / 7200)) / 2 + self._noise(0.3)
+
+    def pm10(self, t):
+        return 1.6 * self.pm25(t)
+
+    def position(self, t):
+        """Return the latitude, longitude and altitude, wandering a few meters."""
+        a = 2 * math.pi * t / 600
+        return (self.lat + 0.00003 * math.sin(a), self.lon + 0.00004 * math.cos(a),
+                self.alt + 1.5 * math.sin(a / 3))
+
+
+class I2CDevice:
+    """A peripheral of the I2C bus; write() and read() raise OSError for a NACK."""
+    address = None
+
+    def attach(self, board):
+        self.board = board
+
+    def now(self):
+        """Return the board time, in seconds."""
+        return self.board.clock.us / 1000000
+
+    def write(self, data):
+        pass
+
+    def read(self, n):
+        raise OSError(errno.EIO, 'I2C NACK')
+
+
+class AM2320(I2CDevice):
+    """Temperature and humidity sensor, modbus-like registers over I2C.
+
+    The sensor sleeps between measurements: the wake-up write is not
+    acknowledged, it then stays awake for 3 s.
+
+    :param env: The `Environment`.
+    :param error_rate: Probability of a corrupted reply.
+    """
+    address = 0x5C
+
+    def __init__(self, env, error_rate=0.0):
+        self.env = env
+        self.error_rate = error_rate
+        self._awake_until = -1
+        self._reply = None
+
+    def write(self, data):
+        t = self.now()
+        if t > self._awake_until:
+            self._awake_until = t + 3
+            raise OSError(errno.EIO, 'I2C NACK')
+        self._reply = None
+        if len(data) >= 3 and data[0] == 0x03:
+            start, n = data[1], data[2]
+            hum = int(round(self.env.humidity(t) * 10))
+            temp = int(round(self.env.temperature(t) * 10))
+            if temp < 0:
+                temp = 0x8000 | -temp
+            regs = struct.pack('>HH', hum, temp) + bytes(28)
+            reply = bytes((0x03, n)) + regs[start:start + n]
+            self._reply = reply + struct.pack('<H', crc16_modbus(reply))
+
+    def read(self, n):
+        if self._reply is None:
+            raise OSError(errno.EIO, 'I2C NACK')
+        reply = bytearray(self._reply[:n])
+        if self.error_rate and self.env.random.random() < self.error_rate:
+            reply[-1] ^= 0x5a
+        return bytes(reply) + bytes(n - len(reply))
+
+
+class SGP30(I2CDevice):
+    """Gas sensor; replies are 16-bit words, each followed by its CRC-8.
+
+    During the 15 s after iaq_init the readings are 400 ppm and 0 ppb.
+
+    :param env: The `Environment`.
+    """
+    address = 0x58
+
+    def __init__(self, env, serial=(0x0000, 0x0123, 0x4567)):
+        self.env = env
+        self.serial = serial
+        self.baseline = (0x8a3e, 0x8f20)  # co2eq, tvoc
+        self._init_time = None
+        self._reply = b''
+
+    def write(self, data):
+        if len(data) < 2:
+            raise OSError(errno.EIO, 'I2C NACK')
+        cmd = (data[0] << 8) | data[1]
+        t = self.now()
+        words = ()
+        if cmd == 0x3682:    # get serial id
+            words = self.serial
+        elif cmd == 0x202f:  # get feature set
+            words = (0x0020,)
+        elif cmd == 0x2003:  # iaq init
+            self._init_time = t
+        elif cmd == 0x2008:  # iaq measure
+            if self._init_time is None or t - self._init_time < 15:
+                words = (400, 0)
+            else:
+                words = (int(self.env.co2(t)), int(self.env.tvoc(t)))
+        elif cmd == 0x2015:  # get iaq baseline
+            words = self.baseline
+        elif cmd == 0x201e:  # set iaq baseline: tvoc then co2eq
+            args = data[2:8]
+            for i in (0, 3):
+                if crc8_sensirion(args[i:i + 2]) != args[i + 2]:
+                    raise OSError(errno.EIO, 'I2C NACK')
+            self.baseline = ((args[3] << 8) | args[4], (args[0] << 8) | args[1])
+        else:
+            raise OSError(errno.EIO, 'I2C NACK')
+        reply = b''
+        for w in words:
+            word = struct.pack('>H', w & 0xffff)
+            reply += word + bytes((crc8_sensirion(word),))
+        self._reply = reply
+
+    def read(self, n):
+        return self._reply[:n] + b'\xff' * (n - len(self._reply))
+
+
+class SSD1306(I2CDevice):
+    """OLED controller: a 128x64 graphic RAM written in horizontal addressing mode.
+
+    Counts the command and data bytes received.
+    """
+    address = 0x3C
+
+    # number of arguments of the commands which take any
+    _ARGS = {0x20: 1, 0x21: 2, 0x22: 2, 0x81: 1, 0x8d: 1, 0xa8: 1, 0xd3: 1,
+             0xd5: 1, 0xd9: 1, 0xda: 1, 0xdb: 1}
+
+    def __init__(self):
+        self.gram = bytearray(128 * 8)
+        self.on = False
+        self.cmd_bytes = 0
+        self.data_bytes = 0
+        self._cmd = []
+        self._col_start, self._col_end = 0, 127
+        self._page_start, self._page_end = 0, 7
+        self._col, self._page = 0, 0
+
+    def write(self, data):
+        if not data:
+            return
+        control = data[0]
+        payload = data[1:]
+        if control & 0x40:
+            self.data_bytes += len(payload)
+            for b in payload:
+                self.gram[self._page * 128 + self._col] = b
+                if self._col < self._col_end:
+                    self._col += 1
+                else:
+                    self._col = self._col_start
+                    self._page = self._page + 1 if self._page < self._page_end \
+                        else self._page_start
+        else:
+            self.cmd_bytes += len(payload)
+            for b in payload:
+                self._command(b)
+
+    def _command(self, b):
+        if self._cmd:
+            self._cmd.append(b)
+        elif b in self._ARGS:
+            self._cmd = [b]
+        elif b & 0xfe == 0xae:
+            self.on = bool(b & 1)
+            return
+        else:
+            return
+        op = self._cmd[0]
+        if len(self._cmd) <= self._ARGS[op]:
+            return
+        if op == 0x21:
+            self._col_start, self._col_end = self._cmd[1] & 0x7f, self._cmd[2] & 0x7f
+            self._col = self._col_start
+        elif op == 0x22:
+            self._page_start, self._page_end = self._cmd[1] & 7, self._cmd[2] & 7
+            self._page = self._page_start
+        self._cmd = []
+
+    def render(self, x0=32, width=64, height=48):
+        """Return the visible pixels, as a list of strings ('#' when lit)."""
+        return [''.join('#' if self.gram[(y >> 3) * 128 + x] & (1 << (y & 7)) else '.'
+                        for x in range(x0, x0 + width))
+                for y in range(height)]
+
+
+class UARTDevice:
+    """A peripheral on a UART, whose output is timed at the baud rate."""
+    baudrate = 9600
+
+    def __init__(self):
+        self.board = None
+        self._out = []     # [start time (us), bytes, bytes delivered]
+        self._end_us = 0   # end of the last queued transmission
+
+    def attach(self, board):
+        self.board = board
+
+    @property
+    def char_us(self):
+        """Time to transmit one character (8N1), in microseconds."""
+        return 10000000 // self.baudrate
+
+    def transmit(self, data, at_us=None):
+        """Queue data for transmission, after the bytes already queued."""
+        if at_us is None:
+            at_us = self.board.clock.us
+        start = max(at_us, self._end_us)
+        self._out.append([start, bytes(data), 0])
+        self._end_us = start + len(data) * self.char_us
+
+    def produce(self, now_us):
+        """Queue the periodic output due by now_us."""
+        pass
+
+    def next_event_us(self):
+        """Return the time of the next periodic output, None if there is none."""
+        return None
+
+    def poll(self, now_us):
+        """Return the bytes received by the MCU up to now_us."""
+        self.produce(now_us)
+        out = b''
+        char_us = self.char_us
+        while self._out:
+            item = self._out[0]
+            start, data, sent = item
+            done = min(len(data), max(0, (now_us - start) // char_us))
+            if done > sent:
+                out += data[sent:done]
+                item[2] = done
+            if done < len(data):
+                break
+            self._out.pop(0)
+        return out
+
+    def next_byte_us(self):
+        """Return when the next byte will have been received."""
+        if self._out:
+            start, data, sent = self._out[0]
+            return start + (sent + 1) * self.char_us
+        t = self.next_event_us()
+        return None if t is None else t + self.char_us
+
+    def receive(self, data):
+        """Process the bytes written by the MCU."""
+        pass
+
+
+class GPS(UARTDevice):
+    """MTK3339 like GNSS receiver, emitting one NMEA epoch per update period.
+
+    Understands the PMTK314 (sentence output mask) and PMTK220 (update period)
+    commands. Either synthesizes the sentences from the environment, or
+    replays recorded NMEA sentences, one epoch (time stamp) per update.
+
+    :param env: The `Environment`.
+    :param nmea: Recorded sentences (str or bytes lines) to replay instead.
+    :param fix_after: The time, in seconds, of the first fix.
+    :param talker: The talker id of the synthesized sentences ('GP' or 'GN').
+    """
+    # PMTK314 field order
+    MASK_FIELDS = ('GLL', 'RMC', 'VTG', 'GGA', 'GSA', 'GSV')
+
+    def __init__(self, env, nmea=None, fix_after=30.0, talker='GP'):
+        super().__init__()
+        self.env = env
+        self.fix_after = fix_after
+        self.talker = talker
+        self.enabled = True
+        self.period_ms = 1000
+        self.output = {'RMC', 'VTG', 'GGA', 'GSA', 'GSV'}  # power-on default
+        self.epochs = 0
+        self._next_us = 1000000
+        self._line = b''
+        self._replay = self._split_epochs(nmea) if nmea is not None else None
+
+    @staticmethod
+    def _split_epochs(lines):
+        epochs, current, stamp = [], [], None
+        for line in lines:
+            if isinstance(line, str):
+                line = line.encode()
+            line = line.strip()
+            if not line.startswith(b'$'):
+                continue
+            fields = line.split(b',')
+            kind = fields[0][3:]
+            if kind in (b'GGA', b'RMC') and len(fields) > 1 and fields[1] != stamp:
+                if current and stamp is not None:
+                    epochs.append(current)
+                    current = []
+                stamp = fields[1]
+            current.append(line + b'\r\n')
+        if current:
+            epochs.append(current)
+        return epochs
+
+    def receive(self, data):
+        self._line += data
+        while b'\n' in self._line:
+            line, self._line = self._line.split(b'\n', 1)
+            line = line.strip()
+            if not line.startswith(b'$PMTK'):
+                continue
+            body = line[1:].split(b'*')[0].decode()
+            fields = body.split(',')
+            cmd = fields[0][4:]
+            if cmd == '314' and len(fields) > 6:
+                self.output = {name for name, on in zip(self.MASK_FIELDS, fields[1:])
+                               if on.strip() not in ('', '0')}
+            elif cmd == '220' and len(fields) > 1:
+                self.period_ms = max(100, int(fields[1]))
+            self.transmit(nmea_sentence('PMTK001,%s,3' % cmd))
+
+    def next_event_us(self):
+        return self._next_us if self.enabled else None
+
+    def produce(self, now_us):
+        while self.enabled and self._next_us <= now_us:
+            self.transmit(self._epoch(self._next_us / 1000000), self._next_us)
+            self._next_us += self.period_ms * 1000
+
+    def _epoch(self, t):
+        self.epochs += 1
+        if self._replay is not None:
+            lines = self._replay[(self.epochs - 1) % len(self._replay)]
+            return b''.join(line for line in lines if line[3:6].decode() in self.output)
+        return b''.join(nmea_sentence(body) for kind, body in self._sentences(t)
+                        if kind in self.output)
+
+    def _sentences(self, t):
+        tm = time.gmtime(_EPOCH + int(t))
+        hms = '%02d%02d%02d.%03d' % (tm[3], tm[4], tm[5], int(t * 1000) % 1000)
+        date = '%02d%02d%02d' % (tm[2], tm[1], tm[0] % 100)
+        tk = self.talker
+        if t < self.fix_after:
+            yield 'GGA', tk + 'GGA,%s,,,,,0,00,,,M,,M,,' % hms
+            yield 'GSA', tk + 'GSA,A,1,,,,,,,,,,,,,,,'
+            yield 'GSV', tk + 'GSV,1,1,00'
+            yield 'RMC', tk + 'RMC,%s,V,,,,,0.00,0.00,%s,,,N' % (hms, date)
+            yield 'VTG', tk + 'VTG,0.00,T,,M,0.00,N,0.00,K,N'
+            yield 'GLL', tk + 'GLL,,,,,%s,V,N' % hms
+            return
+        lat, lon, alt = self.env.position(t)
+        lat_s = '%02d%07.4f,%s' % (int(abs(lat)), (abs(lat) % 1) * 60, 'N' if lat >= 0 else 'S')
+        lon_s = '%03d%07.4f,%s' % (int(abs(lon)), (abs(lon) % 1) * 60, 'E' if lon >= 0 else 'W')
+        yield 'GGA', tk + 'GGA,%s,%s,%s,1,08,0.94,%.1f,M,50.1,M,,' % (hms, lat_s, lon_s, alt)
+        yield 'GSA', tk + 'GSA,A,3,04,05,09,12,17,20,24,25,,,,,1.72,0.94,1.44'
+        yield 'GSV', tk + 'GSV,2,1,08,04,62,120,44,05,30,250,38,09,15,45,31,12,70,300,40'
+        yield 'GSV', tk + 'GSV,2,2,08,17,22,80,29,20,48,190,42,24,10,30,25,25,55,210,39'
+        yield 'RMC', tk + 'RMC,%s,A,%s,%s,0.12,87.34,%s,,,A' % (hms, lat_s, lon_s, date)
+        yield 'VTG', tk + 'VTG,87.34,T,,M,0.12,N,0.22,K,A'
+        yield 'GLL', tk + 'GLL,%s,%s,%s,A,A' % (lat_s, lon_s, hms)
+
+
+class SDS011(UARTDevice):
+    """Nova SDS011 particulate matter sensor, control protocol V1.3.
+
+    Answers the 19-byte commands (reporting mode, query, sleep/work, working
+    period, firmware version) and reports a measurement every second in active
+    mode, or once per working period. The reporting mode and working period
+    survive power cycles; the sensor works after power-up.
+
+    :param env: The `Environment`.
+    :param device_id: The two bytes device id.
+    :param power_pin: The name of the pin switching the sensor supply (None if always on).
+    """
+    def __init__(self, env, device_id=0xa1b2, power_pin=None):
+        super().__init__()
+        self.env = env
+        self.device_id = device_id
+        self.power_pin = power_pin
+        self.query_mode = False
+        self.working = True
+        self.period = 0        # minutes, 0 for continuous
+        self.measurements = 0
+        self._powered = None
+        self._rx = b''
+        self._next_us = 1000000
+
+    def _is_powered(self):
+        if self.power_pin is None:
+            return True
+        powered = bool(self.board.pins.get(self.power_pin, 0))
+        if powered and not self._powered:
+            # power-up: the fan runs, the reporting mode is kept
+            self.working = True
+            self._next_us = self.board.clock.us + 1000000
+            self._rx = b''
+        self._powered = powered
+        return powered
+
+    def _reply(self, cmd, d1=0, d2=0, d3=0):
+        body = bytes((cmd, d1, d2, d3, self.device_id >> 8, self.device_id & 0xff))
+        self.transmit(b'\xaa\xc5' + body + bytes((sum(body) & 0xff,)) + b'\xab')
+
+    def measurement(self, t):
+        """Return the 10 bytes data frame of a measurement at time t."""
+        self.measurements += 1
+        pm25 = min(int(round(self.env.pm25(t) * 10)), 9999)
+        pm10 = min(int(round(self.env.pm10(t) * 10)), 9999)
+        body = struct.pack('<HH', pm25, pm10) + \
+            bytes((self.device_id >> 8, self.device_id & 0xff))
+        return b'\xaa\xc0' + body + bytes((sum(body) & 0xff,)) + b'\xab'
+
+    def receive(self, data):
+        if not self._is_powered():
+            return
+        self._rx += data
+        while len(self._rx) >= 19:
+            start = self._rx.find(b'\xaa\xb4')
+            if start < 0:
+                self._rx = self._rx[-1:]
+                return
+            frame = self._rx[start:start + 19]
+            if len(frame) < 19:
+                self._rx = self._rx[start:]
+                return
+            self._rx = self._rx[start + 19:]
+            if frame[18] != 0xab or sum(frame[2:17]) & 0xff != frame[17]:
+                continue  # ignored by the sensor
+            target = (frame[15] << 8) | frame[16]
+            if target not in (0xffff, self.device_id):
+                continue
+            self._command(frame[2], frame[3], frame[4])
+
+    def _command(self, cmd, write, value):
+        if cmd == 0x02:
+            if write:
+                if self.query_mode and not value:
+                    # the active reporting starts from the mode change
+                    self._next_us = self.board.clock.us + (self.period * 60 or 1) * 1000000
+                self.query_mode = bool(value)
+            self._reply(0x02, write, int(self.query_mode))
+        elif cmd == 0x04:
+            if self.working:
+                self.transmit(self.measurement(self.board.clock.us / 1000000))
+        elif cmd == 0x06:
+            if write:
+                self.working = bool(value)
+                self._next_us = self.board.clock.us + 1000000
+            self._reply(0x06, write, int(self.working))
+        elif cmd == 0x07:
+            self._reply(0x07, 18, 11, 16)
+        elif cmd == 0x08:
+            if write:
+                self.period = value
+                self._next_us = self.board.clock.us + (value * 60 or 1) * 1000000
+            self._reply(0x08, write, self.period)
+
+    def next_event_us(self):
+        if self.query_mode or not self.working or not self._powered:
+            return None
+        return self._next_us
+
+    def produce(self, now_us):
+        if not self._is_powered() or self.query_mode or not self.working:
+            return
+        while self._next_us <= now_us:
+            self.transmit(self.measurement(self._next_us / 1000000), self._next_us)
+            self._next_us += (self.period * 60 or 1) * 1000000
+
+
+class Battery:
+    """A Li-Po battery sensed by the ADC through the 115k/56k voltage divider.
+
+    :param voltage: The battery voltage at boot.
+    :param drain: The voltage drop per hour.
+    :param env: The `Environment`, for the ADC noise.
+    """
+    def __init__(self, voltage=3.95, drain=0.002, env=None):
+        self.voltage = voltage
+        self.drain = drain
+        self.env = env
+        self.conversions = 0
+
+    def adc_value(self, t):
+        """Return the 12-bit ADC reading at time t (seconds)."""
+        self.conversions += 1
+        v = (self.voltage - self.drain * t / 3600) * 56.0 / 171.0
+        if self.env is not None:
+            v += self.env.random.gauss(0, 0.002)
+        # inverse of the calibration of battery.Battery.bat_pin_voltage
+        return max(0, min(4095, int(round(v * 3273 - 303))))
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Simulated MicroPython `framebuf` module (MONO_VLSB only, as the SSD1306).
+
+The 8x8 text cell of MicroPython is honoured, but the glyph shapes are
+placeholders derived from the character code, not the MicroPython font.
+"""
+
+MONO_VLSB = 0
+RGB565 = 1
+GS4_HMSB = 2
+MONO_HLSB = 3
+MONO_HMSB = 4
+
+
+def _glyph(ch):
+    """Return the 8 columns (bit 0 at the top) of the placeholder glyph of ch."""
+    c = ord(ch)
+    if c == 32:
+        return bytes(8)
+    h = (c * 2654435761) & 0xffffffff
+    cols = bytearray(8)
+    for j in range(6):
+        cols[j] = ((h >> (5 * j)) & 0x3e) | 0x40
+    return bytes(cols)
+
+
+class FrameBuffer:
+    """A monochrome frame buffer over buf, one byte per 8 vertical pixels."""
+    def __init__(self, buf, width, height, format=MONO_VLSB, stride=None):
+        if format != MONO_VLSB:
+            raise ValueError('only MONO_VLSB is simulated')
+        self.buf = buf
+        self.width = width
+        self.height = height
+        self.stride = width if stride is None else stride
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        i = (y >> 3) * self.stride + x
+        bit = 1 << (y & 7)
+        if c is None:
+            return 1 if self.buf[i] & bit else 0
+        if c:
+            self.buf[i] |= bit
+        else:
+            self.buf[i] &= ~bit & 0xff
+
+    def fill(self, c):
+        n = ((self.height + 7) >> 3) * self.stride
+        self.buf[:n] = (b'\xff' if c else b'\x00') * n
+
+    def fill_rect(self, x, y, w, h, c):
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + w, self.width)
+        y1 = min(y + h, self.height)
+        for yy in range(y0, y1):
+            for xx in range(x0, x1):
+                self.pixel(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx = abs(x2 - x1)
+        dy = -abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        err = dx + dy
+        while True:
+            self.pixel(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                return
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x1 += sx
+            if e2 <= dx:
+                err += dx
+                y1 += sy
+
+    def text(self, s, x, y, c=1):
+        for ch in s:
+            cols = _glyph(ch)
+            for j in range(8):
+                col = cols[j]
+                for i in range(8):
+                    if col & (1 << i):
+                        self.pixel(x + j, y + i, c)
+            x += 8
+
+    def scroll(self, dx, dy):
+        pixels = [[self.pixel(x, y) for x in range(self.width)]
+                  for y in range(self.height)]
+        for y in range(self.height):
+            for x in range(self.width):
+                sx = x - dx
+                sy = y - dy
+                if 0 <= sx < self.width and 0 <= sy < self.height:
+                    self.pixel(x, y, pixels[sy][sx])
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        if palette is None and key in (0, 1):
+            self._blit_columns(fbuf, x, y, key)
+            return
+        for yy in range(fbuf.height):
+            for xx in range(fbuf.width):
+                c = fbuf.pixel(xx, yy)
+                if c != key:
+                    self.pixel(x + xx, y + yy, c)
+
+    def _blit_columns(self, fbuf, x, y, key):
+        # Monochrome blit a column at a time, as the C one is not pixel by
+        # pixel: the key 0 copies the set pixels, the key 1 the clear ones.
+        height = min(fbuf.height, self.height - y)
+        skip = max(-y, 0)
+        if height <= skip:
+            return
+        mask = (1 << height) - (1 << skip)
+        first, last = max(y, 0) >> 3, (y + height - 1) >> 3
+        for xx in range(max(-x, 0), min(fbuf.width, self.width - x)):
+            col = 0
+            for page in range((fbuf.height + 7) >> 3):
+                col |= fbuf.buf[page * fbuf.stride + xx] << (8 * page)
+            col = (col if key == 0 else ~col) & mask
+            col = col << y if y >= 0 else col >> -y
+            for page in range(first, last + 1):
+                i = page * self.stride + x + xx
+                bits = (col >> (8 * page)) & 0xff
+                if key == 0:
+                    self.buf[i] |= bits
+                else:
+                    self.buf[i] &= ~bits & 0xff
+
+
+def FrameBuffer1(buf, width, height, stride=None):
+    """The legacy constructor of a MONO_VLSB frame buffer."""
+    return FrameBuffer(buf, width, height, MONO_VLSB, stride)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Fixed-point quantization of the telemetry readings.
+
+Every label is described by a scale (the sensor resolution), an offset and a
+bit width. Readings are turned into the integer (value - offset) / scale,
+clamped to the bit width, which CBOR encodes in 1 to 5 bytes instead of the
+9 bytes of a float64. The backend restores the physical units with the same
+field table.
+"""
+
+
+class Field:
+    """Quantization parameters of one label.
+
+    :param scale: The resolution, value of one integer step.
+    :param offset: The physical value of the integer 0.
+    :param bits: The bit width of the integer.
+    :param signed: True if the integer may be negative.
+    """
+    def __init__(self, scale, offset=0, bits=16, signed=False):
+        self.scale = scale
+        self.offset = offset
+        self.bits = bits
+        self.signed = signed
+        # dividing by the inverse of the scale keeps decimal resolutions exact
+        self._inv = 1 / scale
+        if signed:
+            self._min = -(1 << (bits - 1))
+            self._max = (1 << (bits - 1)) - 1
+        else:
+            self._min = 0
+            self._max = (1 << bits) - 1
+
+    def quantize(self, value):
+        """Return the integer representing value."""
+        q = int(round((value - self.offset) * self._inv))
+        if q < self._min:
+            return self._min
+        if q > self._max:
+            return self._max
+        return q
+
+    def dequantize(self, q):
+        """Return the physical value represented by the integer q."""
+        if isinstance(self.scale, int):
+            return q * self.scale + self.offset
+        return q / self._inv + self.offset
+
+
+# Telemetry labels (see main.py), with the resolution of their sensor
+TELEMETRY = {
+    "tm": Field(0.1, bits=12, signed=True),      # AM2320, -40..80 degC by 0.1
+    "hu": Field(0.1, bits=10),                   # AM2320, 0..100 %RH by 0.1
+    "c": Field(1, offset=400, bits=16),          # SGP30, 400..60000 ppm
+    "tv": Field(1, bits=16),                     # SGP30, 0..60000 ppb
+    "x": Field(0.00001, bits=26, signed=True),   # GPS longitude, ~1 m
+    "y": Field(0.00001, bits=25, signed=True),   # GPS latitude, ~1 m
+    "z": Field(0.1, bits=18, signed=True),       # GPS altitude, by 0.1 m
+    "pm10": Field(0.1, bits=14),                 # SDS011, 0..999.9 ug/m3
+    "pm25": Field(0.1, bits=14),                 # SDS011, 0..999.9 ug/m3
+    "bt": Field(0.01, offset=2.5, bits=8),       # battery, 2.50..5.05 V by 0.01
+}
+
+
+class Quantizer:
+    """Quantize and dequantize dictionaries of readings.
+
+    Labels without a field, and None readings, are passed through unchanged.
+
+    :param fields: A dictionary of `Field` per label.
+    """
+    def __init__(self, fields=TELEMETRY):
+        self.fields = fields
+
+    def quantize(self, d, out=None):
+        """Return a dictionary of the integers representing the readings of d.
+
+        :param out: A dictionary to fill (after clearing it) instead of a new one.
+        """
+        if out is None:
+            out = {}
+        else:
+            out.clear()
+        fields = self.fields
+        for k in d:
+            v = d[k]
+            if v is not None and k in fields:
+                v = fields[k].quantize(v)
+            out[k] = v
+        return out
+
+    def dequantize(self, d):
+        """Return a dictionary of the readings represented by the integers of d."""
+        fields = self.fields
+        out = {}
+        for k in d:
+            v = d[k]
+            if v is not None and k in fields:
+                v = fields[k].dequantize(v)
+            out[k] = v
+        return out
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Deadline-based periodic task scheduler.
+
+Tasks are kept in a min-heap ordered by their next deadline, in milliseconds
+of a monotonic clock. Deadlines advance by whole periods from the phase, so a
+slow task delays the others but never makes the schedule drift; the caller
+sleeps until the next deadline instead of polling every tick. A task raising
+an exception is counted in its statistics and keeps its schedule.
+"""
+
+import time
+
+try:
+    import uheapq as heapq
+except ImportError:
+    import heapq
+
+
+class MonotonicClock:
+    """Milliseconds elapsed since the clock creation, never wrapping."""
+    def __init__(self):
+        if hasattr(time, 'ticks_ms'):
+            self._last = time.ticks_ms()
+        else:
+            self._last = int(time.monotonic() * 1000)
+        self._now = 0
+
+    def now(self):
+        """Return the current time, in milliseconds."""
+        if hasattr(time, 'ticks_ms'):
+            t = time.ticks_ms()
+            # abs(): the argument order of ticks_diff differs across firmwares,
+            # the elapsed time between two calls is positive anyway
+            self._now += abs(time.ticks_diff(t, self._last))
+        else:
+            t = int(time.monotonic() * 1000)
+            self._now += t - self._last
+        self._last = t
+        return self._now
+
+    def sleep(self, ms):
+        """Sleep for ms milliseconds."""
+        if hasattr(time, 'sleep_ms'):
+            time.sleep_ms(ms)
+        else:
+            time.sleep(ms / 1000)
+
+
+class VirtualClock:
+    """A clock which only advances when slept on (or advanced), for
+    deterministic runs on a computer."""
+    def __init__(self, start=0):
+        self._now = start
+
+    def now(self):
+        """Return the current time, in milliseconds."""
+        return self._now
+
+    def sleep(self, ms):
+        """Advance the clock by ms milliseconds."""
+        self._now += ms
+
+    advance = sleep
+
+
+class Task:
+    """A periodic task and its timing statistics.
+
+    :param name: The task name, used in the statistics.
+    :param func: The function to call, without arguments.
+    :param period: The period, in milliseconds.
+    :param phase: The first deadline, in milliseconds from the registration.
+    :param jitter: The allowed lateness, in milliseconds, before a run counts as late.
+    :param max_runtime: The runtime budget, in milliseconds (None for no budget).
+    """
+    def __init__(self, name, func, period, phase=0, jitter=0, max_runtime=None):
+        if period <= 0:
+            raise ValueError('The period must be positive')
+        self.name = name
+        self.func = func
+        self.period = period
+        self.phase = phase
+        self.jitter = jitter
+        self.max_runtime = max_runtime
+        self.due = phase
+        # Statistics
+        self.runs = 0
+        self.late = 0
+        self.skipped = 0
+        self.overruns = 0
+        self.errors = 0
+        self.last_error = None
+        self.max_lateness = 0
+        self.total_lateness = 0
+        self.max_runtime_seen = 0
+
+    def stats(self):
+        """Return a dictionary of the task statistics."""
+        return {'runs': self.runs, 'late': self.late, 'skipped': self.skipped,
+                'overruns': self.overruns, 'errors': self.errors,
+                'max_lateness': self.max_lateness,
+                'mean_lateness': self.total_lateness // self.runs if self.runs else 0,
+                'max_runtime': self.max_runtime_seen}
+
+
+class Scheduler:
+    """Run periodic tasks at their deadlines.
+
+    Tasks due at the same time run in registration order.
+
+    :param clock: A clock providing now() and sleep(ms) in milliseconds,
+                  `MonotonicClock` by default.
+    """
+    def __init__(self, clock=None):
+        self.clock = clock if clock is not None else MonotonicClock()
+        self.tasks = []
+        self._heap = []
+        self._seq = 0
+        # deadline of the first task run by the last run_pending(), on the
+        # period grid whatever the runtime and lateness of the round
+        self.round_due = None
+
+    def add(self, name, func, period, phase=0, jitter=0, max_runtime=None):
+        """Register a periodic task, see `Task` for the parameters.
+
+        The phase is relative to the current clock time.
+        Return the `Task`.
+        """
+        task = Task(name, func, period, phase, jitter, max_runtime)
+        task.due = self.clock.now() + phase
+        # registration order, which breaks the deadline ties
+        task.seq = self._seq
+        self._seq += 1
+        self.tasks.append(task)
+        self._push(task)
+        return task
+
+    def _push(self, task):
+        # the sequence number breaks deadline ties (and never compares tasks)
+        heapq.heappush(self._heap, (task.due, task.seq, task))
+
+    def next_deadline(self):
+        """Return the time of the next deadline, None if there is no task."""
+        if not self._heap:
+            return None
+        return self._heap[0][0]
+
+    def run_pending(self):
+        """Run the tasks whose deadline has passed, return how many ran.
+
+        The deadline of the first one is kept in `round_due`.
+        """
+        n = 0
+        clock = self.clock
+        heap = self._heap
+        while heap and heap[0][0] <= clock.now():
+            due, _, task = heapq.heappop(heap)
+            if n == 0:
+                self.round_due = due
+            start = clock.now()
+            lateness = start - due
+            try:
+                task.func()
+            except Exception as e:
+                # the task runs again at its next deadline
+                task.errors += 1
+                task.last_error = e
+            runtime = clock.now() - start
+            task.runs += 1
+            task.total_lateness += lateness
+            if lateness > task.max_lateness:
+                task.max_lateness = lateness
+            if lateness > task.jitter:
+                task.late += 1
+            if runtime > task.max_runtime_seen:
+                task.max_runtime_seen = runtime
+            if task.max_runtime is not None and runtime > task.max_runtime:
+                task.overruns += 1
+            # next deadline on the period grid, the deadlines missed by more
+            # than one period are skipped instead of run in a burst
+            task.due = due + task.period
+            now = clock.now()
+            if task.due + task.period <= now:
+                missed = (now - task.due) // task.period
+                task.skipped += missed
+                task.due += missed * task.period
+            self._push(task)
+            n += 1
+        return n
+
+    def idle(self):
+        """Sleep until the next deadline."""
+        deadline = self.next_deadline()
+        if deadline is None:
+            return
+        delay = deadline - self.clock.now()
+        if delay > 0:
+            self.clock.sleep(delay)
+
+    def run(self, duration=None):
+        """Run the tasks forever, or for duration milliseconds."""
+        end = None if duration is None else self.clock.now() + duration
+        while True:
+            self.run_pending()
+            deadline = self.next_deadline()
+            if end is not None and (deadline is None or deadline > end):
+                delay = end - self.clock.now()
+                if delay > 0:
+                    self.clock.sleep(delay)
+                return
+            self.idle()
+
+    def stats(self):
+        """Return a dictionary of the statistics of every task, by name."""
+        return {task.name: task.stats() for task in self.tasks}
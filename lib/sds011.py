@@ -38,26 +38,72 @@ Reading format. See http://cl.ly/ekot
 """
 
 import ustruct as struct
-import sys
+import utime as time
 
-_SDS011_CMDS = {'SET': b'\x01',
-        'GET': b'\x00',
-        'QUERY': b'\x04',
-        'REPORTING_MODE': b'\x02',
-        'DUTYCYCLE': b'\x08',
-        'SLEEPWAKE': b'\x06'}
+_SDS011_CMDS = {'SET': 0x01,
+        'GET': 0x00,
+        'QUERY': 0x04,
+        'REPORTING_MODE': 0x02,
+        'DUTYCYCLE': 0x08,
+        'SLEEPWAKE': 0x06}
+
+_SDS011_CMD_LEN = 19
+_SDS011_DATA_LEN = 10
+_SDS011_BUFFER_LEN = 64
+
+def _fill_command(frame, cmd, mode, param):
+    """Write the command frame (to all sensors) of cmd, mode and param into frame."""
+    frame[0] = 0xaa
+    frame[1] = 0xb4
+    frame[2] = cmd
+    frame[3] = mode
+    frame[4] = param
+    for i in range(5, 15):
+        frame[i] = 0
+    frame[15] = 0xff
+    frame[16] = 0xff
+    # low byte of the sum of bytes 2 to 16
+    frame[17] = (cmd + mode + param + 0xff + 0xff) & 0xff
+    frame[18] = 0xab
+    return frame
+
+def _command(cmd, mode, param):
+    return bytes(_fill_command(bytearray(_SDS011_CMD_LEN), cmd, mode, param))
+
+#Frames of the constant commands, built once
+_SDS011_FRAMES = {
+        'QUERY': _command(_SDS011_CMDS['QUERY'], 0, 0),
+        'SLEEP': _command(_SDS011_CMDS['SLEEPWAKE'], _SDS011_CMDS['SET'], 0),
+        'WAKE': _command(_SDS011_CMDS['SLEEPWAKE'], _SDS011_CMDS['SET'], 1),
+        'REPORTING_MODE': _command(_SDS011_CMDS['REPORTING_MODE'], _SDS011_CMDS['SET'], 1),
+        'DUTYCYCLE': _command(_SDS011_CMDS['DUTYCYCLE'], _SDS011_CMDS['SET'], 0)}
+
+def _find_header(buf, start, end):
+    """Return the index of the data frame header AA C0 in buf[start:end], -1 if none."""
+    # MicroPython's bytearray has no find()
+    for i in range(start, end - 1):
+        if buf[i] == 0xaa and buf[i+1] == 0xc0:
+            return i
+    return -1
 
 class SDS011:
     """A driver for the SDS011 particulate matter sensor.
 
     :param uart: The `UART` object to use.
+    :param int timeout: (optional) How long `read` waits for the answer to a query, in ms.
     """
-    def __init__(self, uart):
+    def __init__(self, uart, timeout=1000):
         self._uart = uart
+        self.timeout = timeout
         self._pm25 = 0.0
         self._pm10 = 0.0
         self._packet_status = False
         self._packet = ()
+        self._command = bytearray(_SDS011_CMD_LEN)
+        # received characters not decoded yet
+        self._buffer = bytearray(_SDS011_BUFFER_LEN)
+        self._view = memoryview(self._buffer)
+        self._buffered = 0
 
         self.set_reporting_mode_query()
 
@@ -82,74 +128,140 @@ class SDS011:
         return self._packet
 
     def make_command(self, cmd, mode, param):
-        header = b'\xaa\xb4'
-        padding = b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\xff\xff'
-        checksum = chr(( ord(cmd) + ord(mode) + ord(param) + 255 + 255) % 256)
-        checksum = bytes(checksum, 'utf8')
-        tail = b'\xab'
-
-        return header + cmd + mode + param + padding + checksum + tail
+        """
+        Build a command frame, as integers cmd, mode and param, into a buffer
+        reused by the next call.
+        """
+        return _fill_command(self._command, cmd, mode, param)
 
     def wake(self):
         """Sends wake command to sds011 (starts its fan)."""
-        cmd = self.make_command(_SDS011_CMDS['SLEEPWAKE'],
-                _SDS011_CMDS['SET'], chr(1))
-        self._uart.write(cmd)
+        self._uart.write(_SDS011_FRAMES['WAKE'])
 
     def sleep(self):
         """Sends sleep command to sds011 (stops its fan)."""
-        cmd = self.make_command(_SDS011_CMDS['SLEEPWAKE'],
-                _SDS011_CMDS['SET'], chr(0))
-        self._uart.write(cmd)
+        self._uart.write(_SDS011_FRAMES['SLEEP'])
 
     def set_reporting_mode_query(self):
-        cmd = self.make_command(_SDS011_CMDS['REPORTING_MODE'],
-                _SDS011_CMDS['SET'], chr(1))
-        self._uart.write(cmd)
+        self._uart.write(_SDS011_FRAMES['REPORTING_MODE'])
+
+    def set_working_period(self, minutes):
+        """
+        Let the sensor sleep and wake on its own: every minutes (1 to 30) it
+        runs its fan for 30 s and reports one measurement, 0 for continuous.
+        Combined with the active reporting mode, see `poll`.
+        """
+        if minutes:
+            self._uart.write(self.make_command(_SDS011_CMDS['DUTYCYCLE'],
+                    _SDS011_CMDS['SET'], minutes))
+        else:
+            self._uart.write(_SDS011_FRAMES['DUTYCYCLE'])
+
+    def set_reporting_mode_active(self):
+        """The sensor sends its measurements without being queried, see `poll`."""
+        self._uart.write(self.make_command(_SDS011_CMDS['REPORTING_MODE'],
+                _SDS011_CMDS['SET'], 0))
 
     def query(self):
         """Query new measurement data"""
-        cmd = self.make_command(_SDS011_CMDS['QUERY'], chr(0), chr(0))
-        self._uart.write(cmd)
+        self._uart.write(_SDS011_FRAMES['QUERY'])
 
     def process_measurement(self, packet):
-        try:
-            *data, checksum, tail = struct.unpack('<HHBBBs', packet)
-            self._pm25 = data[0]/10.0
-            self._pm10 = data[1]/10.0
-            checksum_OK = (checksum == (sum(data) % 256))
-            tail_OK = tail == b'\xab'
-            self._packet_status = True if (checksum_OK and tail_OK) else False
-        except Exception as e:
-            print('Problem decoding packet:', e)
-            sys.print_exception(e)
+        """
+        Decode the 8 bytes following the AA C0 header of a data frame.
+
+        Return True if the checksum and the tail are correct.
+        """
+        return self._decode(packet, 0)
+
+    def _decode(self, buf, offset):
+        checksum = 0
+        for i in range(offset, offset + 6):
+            checksum += buf[i]
+        self._packet_status = ((checksum & 0xff) == buf[offset+6] and
+                buf[offset+7] == 0xab)
+        if self._packet_status:
+            pm25, pm10 = struct.unpack_from('<HH', buf, offset)
+            self._pm25 = pm25/10.0
+            self._pm10 = pm10/10.0
+        return self._packet_status
+
+    def _fill(self):
+        """Move the characters received by the UART into the buffer, return their number."""
+        n = min(self._uart.any(), _SDS011_BUFFER_LEN - self._buffered)
+        if n <= 0:
+            return 0
+        n = self._uart.readinto(self._view[self._buffered:], n) or 0
+        self._buffered += n
+        return n
+
+    def _decode_frames(self, callback):
+        """Decode the complete data frames of the buffer, then move the rest to its start."""
+        buf = self._buffer
+        end = self._buffered
+        start = 0
+        frames = 0
+        while True:
+            i = _find_header(buf, start, end)
+            if i < 0:
+                # keep a last AA, it may start a header
+                start = end - 1 if end and buf[end-1] == 0xaa else end
+                break
+            if end - i < _SDS011_DATA_LEN:
+                start = i
+                break
+            if self._decode(buf, i + 2):
+                frames += 1
+                start = i + _SDS011_DATA_LEN
+                if callback is not None:
+                    callback(self._pm25, self._pm10)
+            else:
+                # corrupted or misaligned, look for the next header
+                start = i + 1
+        if start:
+            self._view[0:end-start] = self._view[start:end]
+            self._buffered = end - start
+        return frames
+
+    def poll(self, callback=None):
+        """
+        Decode the data frames received since the last call, without waiting.
+
+        In active reporting mode, calling it periodically delivers the stream
+        of measurements with a latency bounded by the calling period.
+
+        :param callback: (optional) Called with pm25, pm10 for every frame.
+        :return: the number of valid frames, pm25 and pm10 are the last one.
+        """
+        frames = 0
+        while True:
+            n = self._fill()
+            frames += self._decode_frames(callback)
+            if not n:
+                return frames
+
+    def flush(self):
+        """Drop the received characters."""
+        while True:
+            self._buffered = 0
+            if not self._fill():
+                break
+        self._buffered = 0
 
     def read(self):
         """
         Query a new measurement, wait for response and process it.
-        Waits for a response during 512 characters (0.4s at 9600bauds).
+        Waits for a response during `timeout` ms.
 
-        Return True if a response has been received, False overwise.
+        Return True if a valid measurement has been received, False overwise.
         """
-        #Query measurement
+        #Drop what was received before the query
+        self.flush()
         self.query()
 
-        #Read measurement
-        #Drops up to 512 characters before giving up finding a measurement pkt...
-        for i in range(512):
-            try:
-                header = self._uart.read(1)
-                if header == b'\xaa':
-                    command = self._uart.read(1)
-
-                    if command == b'\xc0':
-                        packet = self._uart.read(8)
-                        if packet != None:
-                            self.process_measurement(packet)
-                            return True
-            except Exception as e:
-                print('Problem attempting to read:', e)
-                sys.print_exception(e)
-
-        #If we gave up finding a measurement pkt
-        return False
+        start = time.ticks_ms()
+        while not self.poll():
+            if abs(time.ticks_diff(time.ticks_ms(), start)) >= self.timeout:
+                return False
+            time.sleep_ms(10)
+        return True
@@ -46,6 +46,107 @@ SET_VCOM_DESEL      = const(0xdb)
 SET_CHARGE_PUMP     = const(0x8d)
 
 
+def _draw_triangle(fb, num_bar):
+    #Draw contour of the gauge
+    for i in range(0, 16):
+        #Horizontal line
+        fb.pixel(i, 7, 1)
+    for i in range(0, 8):
+        #Vertical line
+        fb.pixel(15, i, 1)
+        #Diagonal
+        fb.pixel(2*i, 7-i, 1)
+        fb.pixel(2*i+1, 7-i, 1)
+
+    #Fill gauge depending on value
+    for i in range(0,num_bar+1):
+        x_bar = i + 4
+        ymin = 7 - int(i/2.0) - 1
+        for y_bar in range(ymin, 7):
+            fb.pixel(x_bar, y_bar, 1)
+
+
+def _draw_battery(fb, num_bar):
+    #Draw contour of the gauge
+    for i in range(0, 14):
+        #Upper and lower horizontal line
+        fb.pixel(i, 0, 1)
+        fb.pixel(i, 7, 1)
+    for i in range(0, 8):
+        #Left Vertical line
+        fb.pixel(0, i, 1)
+    for i in range(1, 7):
+        #Right Vertical line
+        fb.pixel(15, i, 1)
+    #Finishig touches
+    fb.pixel(13, 1, 1)
+    fb.pixel(14, 1, 1)
+    fb.pixel(14, 6, 1)
+    fb.pixel(13, 6, 1)
+
+    #Fill gauge depending on value
+    for i in range(0,num_bar+1):
+        ymin = 1
+        ymax = 6
+        if(i == 13 or i == 14):
+            ymin = 2
+            ymax = 5
+        fb.vline(i + 1, ymin, ymax - ymin + 1, 1)
+
+
+def _draw_signal(fb, num_bar):
+    if(num_bar > 0):
+        fb.pixel(0, 7, 1)
+
+    if(num_bar > 1):
+        fb.pixel(0, 5, 1)
+        fb.pixel(1, 5, 1)
+        fb.pixel(2, 6, 1)
+        fb.pixel(2, 7, 1)
+
+    if(num_bar > 2):
+        fb.pixel(0, 3, 1)
+        fb.pixel(1, 3, 1)
+        fb.pixel(2, 3, 1)
+        fb.pixel(3, 4, 1)
+        fb.pixel(4, 5, 1)
+        fb.pixel(4, 6, 1)
+        fb.pixel(4, 7, 1)
+
+    if(num_bar > 3):
+        fb.pixel(0, 1, 1)
+        fb.pixel(1, 1, 1)
+        fb.pixel(2, 1, 1)
+        fb.pixel(3, 1, 1)
+        fb.pixel(4, 2, 1)
+        fb.pixel(5, 2, 1)
+        fb.pixel(5, 3, 1)
+        fb.pixel(6, 4, 1)
+        fb.pixel(6, 5, 1)
+        fb.pixel(6, 6, 1)
+        fb.pixel(6, 7, 1)
+
+
+# Gauges: drawing function, width and sprite of each level, drawn on first
+# use. At most 11 triangle and 14 battery sprites of 16 bytes, and 5 signal
+# sprites of 8 bytes.
+_TRIANGLE = (_draw_triangle, 16, [None] * 11)
+_BATTERY = (_draw_battery, 16, [None] * 14)
+_SIGNAL = (_draw_signal, 8, [None] * 5)
+
+
+def _sprite(gauge, level):
+    # The frame buffer of the gauge at level, to blit with the key 0.
+    draw, width, sprites = gauge
+    sprite = sprites[level]
+    if sprite is None:
+        sprite = framebuf.FrameBuffer(bytearray(width), width, 8, framebuf.MONO_VLSB)
+        draw(sprite, level)
+        sprites[level] = sprite
+    return sprite
+
+
+
 class SSD1306:
     """A base class for drivers targetting SSD1306 based display.
 
@@ -58,6 +159,14 @@ class SSD1306:
         self.height = height
         self.external_vcc = external_vcc
         self.pages = self.height // 8
+        # Changed columns of each page since the last show(), none when
+        # the first one is greater than the last one
+        self._dirty_x0 = [0] * self.pages
+        self._dirty_x1 = [self.width - 1] * self.pages
+        # Column and page window commands of show()
+        self._window = bytearray((SET_COL_ADDR, 0, 0, SET_PAGE_ADDR, 0, 0))
+        # Bytes sent to the display, commands and data
+        self.tx_bytes = 0
         # Note the subclass must initialize self.framebuf to a framebuffer.
         # This is necessary because the underlying data buffer is different
         # between I2C and SPI implementations (I2C needs an extra byte).
@@ -95,6 +204,11 @@ class SSD1306:
         """Turn off the display."""
         self.write_cmd(SET_DISP | 0x00)
 
+    def wake(self):
+        """Turn the display on again after poweroff(), its RAM and settings
+        are kept."""
+        self.write_cmd(SET_DISP | 0x01)
+
     def contrast(self, contrast):
         """Set contrast.
 
@@ -107,20 +221,57 @@ class SSD1306:
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
     def show(self):
-        """Sends the framebuffer to the screen."""
-        x0 = 0
-        x1 = self.width - 1
-        if self.width == 64:
-            # displays with width of 64 pixels are shifted by 32
-            x0 += 32
-            x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_framebuf()
+        """Sends the changed parts of the framebuffer to the screen: the
+        changed columns of each page, the consecutive whole pages at once."""
+        width = self.width
+        dirty_x0 = self._dirty_x0
+        dirty_x1 = self._dirty_x1
+        # displays with width of 64 pixels are shifted by 32
+        shift = 32 if width == 64 else 0
+        page = 0
+        while page < self.pages:
+            x0 = dirty_x0[page]
+            x1 = dirty_x1[page]
+            if x0 > x1:
+                page += 1
+                continue
+            last = page
+            if x0 == 0 and x1 == width - 1:
+                # whole pages follow each other in the buffer
+                while last + 1 < self.pages and dirty_x0[last+1] == 0 and \
+                      dirty_x1[last+1] == width - 1:
+                    last += 1
+            window = self._window
+            window[1] = x0 + shift
+            window[2] = x1 + shift
+            window[4] = page
+            window[5] = last
+            self.write_cmds(window)
+            self.write_data(page * width + x0, last * width + x1 + 1)
+            while page <= last:
+                dirty_x0[page] = width
+                dirty_x1[page] = -1
+                page += 1
+
+    def invalidate(self, x=0, y=0, w=None, h=None):
+        """Mark an area as changed, to be sent by the next show(). The whole
+        screen by default, after the display RAM was lost.
+
+        :param x: Horizontal coordinate.
+        :param y: Vertical coordinate.
+        :param w: Width in pixels (optional).
+        :param h: Height in pixels (optional).
+        """
+        x1 = self.width - 1 if w is None else min(x + w - 1, self.width - 1)
+        y1 = self.height - 1 if h is None else min(y + h - 1, self.height - 1)
+        x0 = max(x, 0)
+        if x0 > x1 or y1 < 0:
+            return
+        for page in range(max(y, 0) >> 3, (y1 >> 3) + 1):
+            if x0 < self._dirty_x0[page]:
+                self._dirty_x0[page] = x0
+            if x1 > self._dirty_x1[page]:
+                self._dirty_x1[page] = x1
 
     def fill(self, col):
         """Fill the entire screen with a particular color.
@@ -128,6 +279,19 @@ class SSD1306:
         :param col: Color between 0x000000 and 0xFFFFFF.
         """
         self.framebuf.fill(col)
+        self.invalidate()
+
+    def fill_rect(self, x, y, w, h, col):
+        """Fill a rectangle with a particular color.
+
+        :param x: Horizontal coordinate.
+        :param y: Vertical coordinate.
+        :param w: Width in pixels.
+        :param h: Height in pixels.
+        :param col: Color between 0x000000 and 0xFFFFFF.
+        """
+        self.framebuf.fill_rect(x, y, w, h, col)
+        self.invalidate(x, y, w, h)
 
     def pixel(self, x, y, col):
         """Set the color of a particular pixel.
@@ -137,6 +301,7 @@ class SSD1306:
         :param col: Color between 0x000000 and 0xFFFFFF.
         """
         self.framebuf.pixel(x, y, col)
+        self.invalidate(x, y, 1, 1)
 
     def scroll(self, dx, dy):
         """Translates the screen content.
@@ -145,6 +310,7 @@ class SSD1306:
         :param dy: Vertical shifting value in pixels.
         """
         self.framebuf.scroll(dx, dy)
+        self.invalidate()
 
     def text(self, string, x, y, col=1):
         """Display a text.
@@ -154,6 +320,7 @@ class SSD1306:
         :param col: Color between 0x000000 and 0xFFFFFF (optional).
         """
         self.framebuf.text(string, x, y, col)
+        self.invalidate(x, y, 8 * len(string), 8)
 
     def triangle_gauge(self, x, y, value):
         """A 16x8 triangle gauge.
@@ -167,28 +334,8 @@ class SSD1306:
             value = 1.0
         elif(value < 0.0):
             value = 0.0
-
-        #Draw contour of the gauge
-        for i in range(0, 16):
-            #Horizontal line
-            self.framebuf.pixel(x+i, y+7, 0xFFFFFF)
-        for i in range(0, 8):
-            #Vertical line
-            self.framebuf.pixel(x+15, y+i, 0xFFFFFF)
-            #Diagonal
-            self.framebuf.pixel(x+2*i, y+7-i, 0xFFFFFF)
-            self.framebuf.pixel(x+2*i+1, y+7-i, 0xFFFFFF)
-
-        #Fill gauge depending on value
-        num_bar = round(value*10.0)
-        for i in range(0,num_bar+1):
-            x_bar = x + i + 4
-            ymin = y + 7 - int(i/2.0) - 1
-            ymax = y + 7
-
-            for y_bar in range(ymin, ymax):
-                self.framebuf.pixel(x_bar, y_bar, 0xFFFFFF)
-
+        self.invalidate(x, y, 16, 8)
+        self.framebuf.blit(_sprite(_TRIANGLE, round(value*10.0)), x, y, 0)
 
     def battery_gauge(self, x, y, value):
         """A 16x8 battery gauge.
@@ -202,37 +349,8 @@ class SSD1306:
             value = 1.0
         elif(value < 0.0):
             value = 0.0
-
-        #Draw contour of the gauge
-        for i in range(0, 14):
-            #Upper and lower horizontal line
-            self.framebuf.pixel(x+i, y, 0xFFFFFF)
-            self.framebuf.pixel(x+i, y+7, 0xFFFFFF)
-        for i in range(0, 8):
-            #Left Vertical line
-            self.framebuf.pixel(x, y+i, 0xFFFFFF)
-        for i in range(1, 7):
-            #Right Vertical line
-            self.framebuf.pixel(x+15, y+i, 0xFFFFFF)
-        #Finishig touches
-        self.framebuf.pixel(x+13, y+1, 0xFFFFFF)
-        self.framebuf.pixel(x+14, y+1, 0xFFFFFF)
-        self.framebuf.pixel(x+14, y+6, 0xFFFFFF)
-        self.framebuf.pixel(x+13, y+6, 0xFFFFFF)
-
-        #Fill gauge depending on value
-        num_bar = round(value*13.0)
-        for i in range(0,num_bar+1):
-            x_bar = x + i + 1
-            ymin = 1
-            ymax = 6
-            if(i == 13 or i == 14):
-                ymin = 2
-                ymax = 5
-
-            for i in range(ymin, ymax+1):
-                self.framebuf.pixel(x_bar, y+i, 0xFFFFFF)
-
+        self.invalidate(x, y, 16, 8)
+        self.framebuf.blit(_sprite(_BATTERY, round(value*13.0)), x, y, 0)
 
     def signal_gauge(self, x, y, value):
         """A 8x8 4 level signal gauge.
@@ -246,40 +364,8 @@ class SSD1306:
             value = 1.0
         elif(value < 0.0):
             value = 0.0
-
-        #Fill gauge depending on value
-        num_bar = round(value*4.0)
-
-        if(num_bar > 0):
-            self.framebuf.pixel(x, y+7, 0xFFFFFF)
-
-        if(num_bar > 1):
-            self.framebuf.pixel(x, y+5, 0xFFFFFF)
-            self.framebuf.pixel(x+1, y+5, 0xFFFFFF)
-            self.framebuf.pixel(x+2, y+6, 0xFFFFFF)
-            self.framebuf.pixel(x+2, y+7, 0xFFFFFF)
-
-        if(num_bar > 2):
-            self.framebuf.pixel(x, y+3, 0xFFFFFF)
-            self.framebuf.pixel(x+1, y+3, 0xFFFFFF)
-            self.framebuf.pixel(x+2, y+3, 0xFFFFFF)
-            self.framebuf.pixel(x+3, y+4, 0xFFFFFF)
-            self.framebuf.pixel(x+4, y+5, 0xFFFFFF)
-            self.framebuf.pixel(x+4, y+6, 0xFFFFFF)
-            self.framebuf.pixel(x+4, y+7, 0xFFFFFF)
-
-        if(num_bar > 3):
-            self.framebuf.pixel(x, y+1, 0xFFFFFF)
-            self.framebuf.pixel(x+1, y+1, 0xFFFFFF)
-            self.framebuf.pixel(x+2, y+1, 0xFFFFFF)
-            self.framebuf.pixel(x+3, y+1, 0xFFFFFF)
-            self.framebuf.pixel(x+4, y+2, 0xFFFFFF)
-            self.framebuf.pixel(x+5, y+2, 0xFFFFFF)
-            self.framebuf.pixel(x+5, y+3, 0xFFFFFF)
-            self.framebuf.pixel(x+6, y+4, 0xFFFFFF)
-            self.framebuf.pixel(x+6, y+5, 0xFFFFFF)
-            self.framebuf.pixel(x+6, y+6, 0xFFFFFF)
-            self.framebuf.pixel(x+6, y+7, 0xFFFFFF)
+        self.invalidate(x, y, 8, 8)
+        self.framebuf.blit(_sprite(_SIGNAL, round(value*4.0)), x, y, 0)
 
 class SSD1306_I2C(SSD1306):
     """A I2C driver for SSD1306 based display.
@@ -295,6 +381,8 @@ class SSD1306_I2C(SSD1306):
         self.i2c = i2c
         self.addr = addr
         self.temp = bytearray(2)
+        self.cmds = bytearray(8)  # Co=0, D/C#=0 then up to 7 commands
+        self.cmds_view = memoryview(self.cmds)
         self.res = res
         # Add an extra byte to the data buffer to hold an I2C data/command byte
         # to use hardware-compatible I2C transactions.  A memoryview of the
@@ -303,18 +391,44 @@ class SSD1306_I2C(SSD1306):
         # buffer).
         self.buffer = bytearray(((height // 8) * width) + 1)
         self.buffer[0] = 0x40  # Set first byte of data buffer to Co=0, D/C=1
-        self.framebuf = framebuf.FrameBuffer1(memoryview(self.buffer)[1:], width, height)
+        self.buffer_view = memoryview(self.buffer)
+        self.framebuf = framebuf.FrameBuffer1(self.buffer_view[1:], width, height)
         super().__init__(width, height, external_vcc)
 
     def write_cmd(self, cmd):
         self.temp[0] = 0x80 # Co=1, D/C#=0
         self.temp[1] = cmd
         self.i2c.writeto(self.addr, self.temp)
+        self.tx_bytes += 2
+
+    def write_cmds(self, cmds):
+        # A command stream in one I2C transaction: Co=0, D/C#=0 then the
+        # command bytes.
+        n = len(cmds)
+        self.cmds[1:n+1] = cmds
+        self.i2c.writeto(self.addr, self.cmds_view[:n+1])
+        self.tx_bytes += n + 1
 
     def write_framebuf(self):
         # Blast out the frame buffer using a single I2C transaction to support
         # hardware I2C interfaces.
         self.i2c.writeto(self.addr, self.buffer)
+        self.tx_bytes += len(self.buffer)
+
+    def write_data(self, start, end):
+        # The framebuffer bytes start:end, preceded by the data control byte
+        # in the same transaction: the byte before them is saved and replaced
+        # by 0x40 while they are sent, nothing is copied.
+        buffer = self.buffer
+        saved = buffer[start]
+        buffer[start] = 0x40  # Co=0, D/C=1
+        try:
+            self.i2c.writeto(self.addr, self.buffer_view[start:end+1])
+        finally:
+            # restored even on a NACK, the byte may be outside the next
+            # dirty range
+            buffer[start] = saved
+        self.tx_bytes += end - start + 1
 
     def poweron(self):
         if(self.res != None):
@@ -356,6 +470,11 @@ class SSD1306_SPI(SSD1306):
         self.cs.low()
         self.spi.write(bytearray([cmd]))
         self.cs.high()
+        self.tx_bytes += 1
+
+    def write_cmds(self, cmds):
+        for cmd in cmds:
+            self.write_cmd(cmd)
 
     def write_framebuf(self):
         self.spi.init(baudrate=self.rate, polarity=0, phase=0)
@@ -364,6 +483,16 @@ class SSD1306_SPI(SSD1306):
         self.cs.low()
         self.spi.write(self.buffer)
         self.cs.high()
+        self.tx_bytes += len(self.buffer)
+
+    def write_data(self, start, end):
+        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cs.high()
+        self.dc.high()
+        self.cs.low()
+        self.spi.write(memoryview(self.buffer)[start:end])
+        self.cs.high()
+        self.tx_bytes += end - start
 
     def poweron(self):
         self.res.value(1)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Retained-mode status screen on an SSD1306 display.
+
+The screen keeps its widgets and the value each of them shows. Setting a value
+marks the widget for redraw only if what it shows changes; refresh() redraws
+those widgets (a text field only the 8x8 cells whose character changed) then
+sends the changed part of the framebuffer, see SSD1306.show().
+"""
+
+
+class Text:
+    """A text field of chars 8x8 cells, blank when its value is None.
+
+    :param x: Horizontal coordinate.
+    :param y: Vertical coordinate.
+    :param chars: Width in characters, longer texts are cut.
+    """
+    def __init__(self, x, y, chars):
+        self.x = x
+        self.y = y
+        self.chars = chars
+
+    def view(self, value):
+        """What the widget shows for value: its text padded with spaces."""
+        text = '' if value is None else str(value)
+        return (text + ' ' * self.chars)[:self.chars]
+
+    def draw(self, d, view, drawn):
+        """Draw view over drawn, the view on the screen (None if unknown)."""
+        for i in range(self.chars):
+            char = view[i]
+            if drawn is not None and drawn[i] == char:
+                continue
+            x = self.x + 8 * i
+            d.fill_rect(x, self.y, 8, 8, 0)
+            if char != ' ':
+                d.text(char, x, self.y)
+
+
+class Gauge:
+    """One of the SSD1306 gauges, blank when its value is None.
+
+    :param x: Horizontal coordinate.
+    :param y: Vertical coordinate.
+    :param kind: 'triangle' (16x8), 'battery' (16x8) or 'signal' (8x8).
+    """
+    # levels the gauge can show, the value between 0.0 and 1.0 is rounded to
+    _LEVELS = {'triangle': 10, 'battery': 13, 'signal': 4}
+
+    def __init__(self, x, y, kind):
+        self.x = x
+        self.y = y
+        self.kind = kind
+        self.width = 8 if kind == 'signal' else 16
+        self.levels = self._LEVELS[kind]
+
+    def view(self, value):
+        if value is None:
+            return None
+        return round(min(max(value, 0.0), 1.0) * self.levels)
+
+    def draw(self, d, view, drawn):
+        d.fill_rect(self.x, self.y, self.width, 8, 0)
+        if view is not None:
+            getattr(d, self.kind + '_gauge')(self.x, self.y, view / self.levels)
+
+
+class StatusScreen:
+    """Named widgets on a display, redrawn when what they show changes.
+
+    The display is expected blank, as after its initialization.
+
+    :param display: The `SSD1306` object to draw on.
+    """
+    def __init__(self, display):
+        self.display = display
+        self._widgets = {}
+        self._drawn = {}
+        self._views = {}
+        self._changed = []
+        self.renders = 0
+
+    def add(self, name, widget):
+        """Add the widget name, blank until its value is set."""
+        self._widgets[name] = widget
+        self._drawn[name] = self._views[name] = widget.view(None)
+
+    def set(self, name, value):
+        """Bind value to the widget name."""
+        view = self._widgets[name].view(value)
+        if view != self._views[name]:
+            if self._views[name] == self._drawn[name]:
+                self._changed.append(name)
+            self._views[name] = view
+
+    def update(self, values):
+        """Bind the values of a {name: value} dictionary."""
+        for name in values:
+            self.set(name, values[name])
+
+    def invalidate(self):
+        """Draw every widget again, after the display was cleared."""
+        self.display.fill(0)
+        for name in self._widgets:
+            self._drawn[name] = None
+        self._changed = list(self._widgets)
+
+    def refresh(self):
+        """Redraw the changed widgets and send the changed part of the
+        framebuffer to the display, including what a failed refresh left.
+
+        :return: The number of widgets redrawn.
+        """
+        d = self.display
+        n = 0
+        for name in self._changed:
+            view = self._views[name]
+            if view != self._drawn[name]:
+                self._widgets[name].draw(d, view, self._drawn[name])
+                self._drawn[name] = view
+                n += 1
+        self._changed = []
+        self.renders += n
+        d.show()
+        return n
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Non-blocking LoRa uplink queue.
+
+The sampling loop pushes encoded frames into a bounded ring buffer and
+returns at once; a sender worker (a `_thread`) pops them and performs the
+blocking socket calls, so radio latency never delays the sampling.
+"""
+
+import time
+
+try:
+    import _thread
+except ImportError:
+    _thread = None
+
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+
+
+class _NoLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class UplinkQueue:
+    """A bounded queue of pending uplinks and its sender.
+
+    When the queue is full, the 'drop_oldest' policy discards the oldest
+    pending frame, the 'coalesce' policy merges the new frame into the newest
+    pending one with merge(older, newer) (and drops the oldest when merge
+    returns None).
+
+    With confirmed uplinks, the acknowledgement of every frame sent is read
+    from the `LoRa` events (TX_PACKET_EVENT: acknowledged, TX_FAILED_EVENT:
+    not acknowledged after the retransmissions).
+
+    :param sock: The LoRa socket.
+    :param size: The maximum number of pending frames.
+    :param policy: What to do when the queue is full, DROP_OLDEST or COALESCE.
+    :param merge: The function merging two frames for the COALESCE policy.
+    :param send_timeout: Socket timeout of one send, in seconds.
+    :param retries: How many times a failed frame is sent again.
+    :param lora: The `LoRa` object, to wait for the network join (optional).
+    :param confirmed: True if the socket sends confirmed uplinks, whose
+        acknowledgements are then counted (needs lora).
+    """
+    def __init__(self, sock, size=8, policy=DROP_OLDEST, merge=None,
+                 send_timeout=10, retries=1, lora=None, confirmed=False):
+        if policy not in (DROP_OLDEST, COALESCE):
+            raise ValueError('Unknown uplink queue policy')
+        self._sock = sock
+        self._lora = lora
+        self.policy = policy
+        self._merge = merge
+        self.send_timeout = send_timeout
+        self.retries = retries
+        self.confirmed = confirmed and lora is not None
+        self._frames = [None] * size
+        self._tries = bytearray(size)
+        self._head = 0
+        self._count = 0
+        self._lock = _thread.allocate_lock() if _thread is not None else _NoLock()
+        self._running = False
+        # Statistics
+        self.queued = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped_overflow = 0  # queue full
+        self.dropped_retries = 0   # every try failed
+        self.coalesced = 0
+        self.acked = 0
+        self.unacked = 0
+        self.downlinks = 0
+        self.last_rx = None
+
+    def __len__(self):
+        return self._count
+
+    def stats(self):
+        """Return a dictionary of the queue statistics."""
+        return {'pending': self._count, 'queued': self.queued, 'sent': self.sent,
+                'failed': self.failed, 'dropped_overflow': self.dropped_overflow,
+                'dropped_retries': self.dropped_retries, 'coalesced': self.coalesced,
+                'acked': self.acked, 'unacked': self.unacked, 'downlinks': self.downlinks}
+
+    def push(self, frame):
+        """Queue frame for sending, never blocks."""
+        size = len(self._frames)
+        if self.policy == COALESCE and self._merge is not None:
+            newest = None
+            with self._lock:
+                if self._count == size:
+                    newest = self._frames[(self._head + size - 1) % size]
+            # merged without holding the lock the sender needs: the newest
+            # frame stays in place unless the sender pops it meanwhile
+            merged = None if newest is None else self._merge(newest, frame)
+            if merged is not None:
+                with self._lock:
+                    tail = (self._head + self._count - 1) % size
+                    if self._count and self._frames[tail] is newest:
+                        self.queued += 1
+                        self._frames[tail] = merged
+                        self.coalesced += 1
+                        return
+        with self._lock:
+            self.queued += 1
+            if self._count == size:
+                self._frames[self._head] = None
+                self._head = (self._head + 1) % size
+                self._count -= 1
+                self.dropped_overflow += 1
+            tail = (self._head + self._count) % size
+            self._frames[tail] = frame
+            self._tries[tail] = 0
+            self._count += 1
+
+    def _pop(self):
+        with self._lock:
+            if self._count == 0:
+                return None, 0
+            frame = self._frames[self._head]
+            tries = self._tries[self._head]
+            self._frames[self._head] = None
+            self._head = (self._head + 1) % len(self._frames)
+            self._count -= 1
+            return frame, tries
+
+    def _push_front(self, frame, tries):
+        size = len(self._frames)
+        with self._lock:
+            if self._count == size:
+                # newer frames take precedence over a retry
+                self.dropped_overflow += 1
+                return
+            self._head = (self._head - 1) % size
+            self._frames[self._head] = frame
+            self._tries[self._head] = tries
+            self._count += 1
+
+    def process_one(self):
+        """Send the oldest pending frame (this blocks up to send_timeout),
+        return True if a frame has been processed.
+        """
+        if self._lora is not None and not self._lora.has_joined():
+            return False
+        frame, tries = self._pop()
+        if frame is None:
+            return False
+        s = self._sock
+        try:
+            s.setblocking(True)
+            s.settimeout(self.send_timeout)
+            s.send(frame)
+        except Exception:
+            self.failed += 1
+            if tries < self.retries:
+                self._push_front(frame, tries + 1)
+            else:
+                with self._lock:
+                    self.dropped_retries += 1
+            return True
+        self.sent += 1
+        if self.confirmed:
+            events = self._lora.events()
+            if events & self._lora.TX_FAILED_EVENT:
+                self.unacked += 1
+            elif events & self._lora.TX_PACKET_EVENT:
+                self.acked += 1
+        # Fetch the downlink if any, without waiting for it
+        try:
+            s.setblocking(False)
+            rx = s.recv(64)
+            if rx:
+                self.downlinks += 1
+                self.last_rx = rx
+        except Exception:
+            pass
+        return True
+
+    def _run(self, idle):
+        while self._running:
+            if not self.process_one():
+                time.sleep(idle)
+
+    def start(self, idle=0.1):
+        """Start the sender worker thread.
+
+        :param idle: Time to sleep when there is nothing to send, in seconds.
+        """
+        if _thread is None:
+            raise RuntimeError('Threads are not available')
+        self._running = True
+        _thread.start_new_thread(self._run, (idle,))
+
+    def stop(self):
+        """Stop the sender worker thread (after its current send)."""
+        self._running = False
@@ -17,12 +17,15 @@
 
 import binascii
 import socket
-import time
 
+import batch
 import cbor
 from network import LoRa
 
 import pycom_monitor
+import quantize
+import scheduler
+import uplink
 
 # Hyper Parameters
 debug = True
@@ -30,13 +33,24 @@ debug = True
 # delay times -- different for every sensors group
 delay_am2320_sgp30 = 10  # temp and gas take more frequent measures
 delay_gps = 20
-delay_sds011 = 60  # fan sensor delay should be multiple of 30
-delay_ssd1306 = 120  # just for log purpose on the monitor
+delay_sds011 = 60  # working period of the dust sensor, whole minutes (it wakes on its own)
+delay_ssd1306 = 120  # just for log purpose on the monitor, wakes the display up
+display_frame = 1  # minimum time between two display refreshes, the updates in between are merged
+display_idle = 30  # the display is turned off this long after being woken up
+delay_gps_update = 1  # drain the GPS UART before it overflows
+delay_battery = 60
 
 # LoRa specific parameters
 message_type = True  # LoRA confirmable message True or False
 data_rate = 5  # Data rate of the lora connection
 data_send_timeout = 10
+uplink_queue_size = 8  # frames waiting for the radio before dropping or coalescing
+uplink_policy = uplink.COALESCE  # uplink.DROP_OLDEST or uplink.COALESCE
+quantized = False  # fixed-point integers, the backend must decode them with quantize.Quantizer.dequantize
+float_mode = None  # CBOR floats: None (float64), 'shortest', 'f32' or 'f16'
+batch_size = 0  # samples per sensor packed in one frame (see lib/batch.py), 0 to send every tick
+# (the batched samples are always quantized: their deltas are small integers)
+log_file = None  # e.g. 'telemetry.cbor' to append every frame sent to the flash
 lora_mode = LoRa.TX_ONLY  # Power mode LoRa.ALWAYS_ON, LoRa.TX_ONLY or LoRa.SLEEP
 
 # Credentials for IMT Server
@@ -44,7 +58,18 @@ app_eui = b'\x48\x62\x66\x27\x56\x63\x68\x53'
 app_key = binascii.unhexlify(
     '11 22 33 44 55 66 77 88 11 22 33 44 55 66 77 88'.replace(' ', ''))
 
+tasks = scheduler.Scheduler()
+readings = {}  # sensor results of the current scheduler round
+sds011_last = 0  # time of the last dust report, ms
+battery_soc = None  # last battery state of charge, %, for the display gauge
 
+quantizer = quantize.Quantizer(quantize.TELEMETRY)
+quantized_data = {}
+batcher = batch.Batcher(batch_size, data_rate, float_mode) if batch_size else None
+
+# Telemetry map keys, in emission order (see the labels given to build_data_dict)
+telemetry_schema = cbor.compile_map(
+    ("ts", "tm", "hu", "c", "tv", "x", "y", "z", "pm10", "pm25", "bt"), float_mode=float_mode)
 
 
 def join_lora_gw(l_conn):
@@ -66,12 +91,13 @@ def join_lora_gw(l_conn):
     return s
 
 
-def send_lora_gw(l_conn, s, d, t):
+def send_lora_gw(q, d, t):
     """
-    Procedure to send any well-formed dictionary to the LoRA gateway
-    :param l_conn: the lora connection object
-    :param s: the socket object
-    :param d: the dictionary to be converted into CBOR data format
+    Procedure to queue any well-formed dictionary for the LoRA gateway,
+    the uplink queue sender does the actual (blocking) transmission
+    :param q: the uplink queue
+    :param d: the dictionary to be converted into CBOR data format, or an
+              already encoded frame (bytes)
     :param t: the time offset since starting
     :return:
     """
@@ -79,19 +105,29 @@ def send_lora_gw(l_conn, s, d, t):
     if d == {}:
         return None
 
-    # Check the connection status before to send
-    if debug:
-        print('Waiting for a LoRa connection...')
-        while not l_conn.has_joined():
-            time.sleep(1)
-            print('Connected.')
+    if isinstance(d, dict):
+        if quantized:
+            d = quantizer.quantize(d, quantized_data)
+
+        # Convert the dictionary message into CBOR, straight into the schema buffer
+        try:
+            n = telemetry_schema.dump_into(d)
+        except KeyError:
+            n = cbor.dump_into(d, telemetry_schema.buf, float_mode=float_mode)
+        msg = memoryview(telemetry_schema.buf)[:n]
+    else:
+        msg = d
+
+    if log_file is not None:
+        with open(log_file, 'ab') as f:
+            f.write(msg)
 
-    # Convert the dictionary message into CBOR
-    msg = cbor.dumps(d)
     if debug:
-        print('Message content: ' + str(msg) +
+        print('Message content: ' + str(bytes(msg)) +
               ' (length is ' + str(len(msg)) + ' bytes).')
         ltemp, lco2, lgps, ldust = False, False, False, False
+        if not isinstance(d, dict):
+            d = {}
         if "tm" in d:
             ltemp = True
         if "c" in d:
@@ -102,34 +138,30 @@ def send_lora_gw(l_conn, s, d, t):
             ldust = True
         pycom_monitor.print_lcd(t, len(msg), ltemp, lco2, lgps, ldust)
 
-    # Wait until data is sent (max. 10s)
-    s.setblocking(True)
-    s.settimeout(data_send_timeout)
-
+    # The schema buffer is reused by the next frame, queue a copy
+    q.push(bytes(msg))
     if debug:
-        print('Sending message...')
-    try:
-        s.send(msg)
-        s.setblocking(False)
-        if debug:
-            print('Message sent!')
-    except Exception:
-        if debug:
-            print('Failed to send message!')
+        print('Message queued, uplink ' + str(q.stats()))
 
-    rec = None
-    try:
-        rec = s.recv(64)
-    except TimeoutError:
-        if debug:
-            print(d)
-            print("ack has not been received")
 
-    return rec
+def merge_frames(older, newer):
+    """
+    Merge two encoded telemetry frames, the newer readings win
+    (used by the coalescing uplink queue when it is full)
+    :param older: the pending frame
+    :param newer: the frame being queued
+    :return: the merged frame, or None if they can not be merged (batches)
+    """
+    a = cbor.loads_buffer(older)[0]
+    b = cbor.loads_buffer(newer)[0]
+    if not isinstance(a, dict) or not isinstance(b, dict) or "ts" in a or "ts" in b:
+        return None
+    a.update(b)
+    return cbor.dumps(a, float_mode=float_mode)
 
 
 def build_data_dict(labels, am2320_res = None, sgp30_res = None, gps_res = None,
-                    sds011_res = None):
+                    sds011_res = None, battery_res = None):
     """
     Produce a dictionary of measurements from the board sensors
     :param labels:
@@ -137,6 +169,7 @@ def build_data_dict(labels, am2320_res = None, sgp30_res = None, gps_res = None,
     :param sgp30_res:
     :param gps_res:
     :param sds011_res:
+    :param battery_res:
     :return:
     """
     data = {}
@@ -165,53 +198,121 @@ def build_data_dict(labels, am2320_res = None, sgp30_res = None, gps_res = None,
     else:
         if debug:
             print("No dust")
+    if battery_res is not None:
+        data[labels["battery_voltage"]] = battery_res[0]
 
     return data
 
 
+def sample_am2320_sgp30():
+    readings["am2320"] = pycom_monitor.temperature_humidity(n_try_max=10)
+    readings["sgp30"] = pycom_monitor.co2_tvoc()
+
+
+def sample_gps():
+    readings["gps"] = pycom_monitor.latitude_longitude_altitude(update_rate=1000)
+
+
+def update_gps():
+    pycom_monitor.update_gps()
+
+
+def sds011_period():
+    """
+    The working period of the dust sensor, delay_sds011 in whole minutes
+    between 1 and 30 (0 would be its continuous mode, the fan never stopping)
+    :return: the period in minutes
+    """
+    return min(30, max(1, delay_sds011 // 60))
+
+
+def start_sds011():
+    global sds011_last
+    pycom_monitor.start_pm10_pm25(sds011_period())
+    sds011_last = tasks.clock.now()
+
+
+def sample_sds011():
+    global sds011_last
+    res = pycom_monitor.poll_pm10_pm25()
+    if res is not None:
+        readings["sds011"] = res
+        sds011_last = tasks.clock.now()
+    elif tasks.clock.now() - sds011_last > 2 * sds011_period() * 60000:
+        # no report for two working periods: power loss or driver reset
+        start_sds011()
+
+
+def sample_battery():
+    global battery_soc
+    res = pycom_monitor.battery_voltage_soc()
+    if res is not None:
+        readings["battery"] = res
+        battery_soc = res[1]
+
+
+def refresh_lcd():
+    pycom_monitor.print_lcd(tasks.clock.now() // 1000,
+                            battery=None if battery_soc is None else battery_soc / 100,
+                            queue=len(uplink_queue) / uplink_queue_size, wake=True)
+    if debug:
+        print('Scheduler ' + str(tasks.stats()))
+        print('Devices ' + str(pycom_monitor.health()))
+        print('Display ' + str(pycom_monitor.display.stats()))
+
+
+def register_tasks(s):
+    """
+    Register the sensor tasks, periods and phases in milliseconds
+    :param s: the scheduler
+    :return:
+    """
+    s.add("am2320_sgp30", sample_am2320_sgp30, delay_am2320_sgp30 * 1000,
+          jitter=500, max_runtime=500)
+    s.add("gps", sample_gps, delay_gps * 1000, jitter=500, max_runtime=200)
+    s.add("gps_update", update_gps, delay_gps_update * 1000,
+          phase=delay_gps_update * 1000, jitter=500, max_runtime=200)
+    # the dust sensor pushes a report every working period, collected with the
+    # other readings
+    s.add("sds011", sample_sds011, delay_am2320_sgp30 * 1000,
+          jitter=500, max_runtime=50)
+    s.add("battery", sample_battery, delay_battery * 1000, jitter=500, max_runtime=50)
+    s.add("ssd1306", refresh_lcd, delay_ssd1306 * 1000, jitter=5000)
+
+
 if __name__ == '__main__':
     # Initialize LoRa
     lora_connection = LoRa(mode=LoRa.LORAWAN)
     lora_connection.power_mode(lora_mode)
     soc = join_lora_gw(lora_connection)
+    uplink_queue = uplink.UplinkQueue(soc, uplink_queue_size, uplink_policy,
+                                      merge=merge_frames,
+                                      send_timeout=data_send_timeout,
+                                      lora=lora_connection, confirmed=message_type)
+    uplink_queue.start()
+    last_rx = None
 
-    # Launch the collect and send data loop
-    t = -1
-
-    lcd_connection, sds011_ok = None, False
     #my_i2c = pycom_monitor.init_i2c()
     # lcd_connection = pycom_monitor.init_lcd()#my_i2c)
     # lcd_connection.poweron()
 
+    pycom_monitor.display.frame_ms = display_frame * 1000
+    pycom_monitor.display.idle_ms = display_idle * 1000
     pycom_monitor.gps_init()
-    pycom_monitor.init_co2_tvoc()
+    pycom_monitor.init_co2_tvoc(idle=pycom_monitor.update_gps)  # the GPS is drained meanwhile
+    start_sds011()
 
+    # Launch the collect and send data loop
+    register_tasks(tasks)
     while True:
-        am2320, sgp30, gps, sds011 = None, None, None, None
-        pycom_monitor.gps.update()
-        time.sleep(1)
-        t += 1
-        if debug:
-            print("Current relative time " + str(t))
-        if t % delay_am2320_sgp30 == 0:
-            am2320 = pycom_monitor.temperature_humidity(n_try_max=10)
-            sgp30 = pycom_monitor.co2_tvoc() #my_i2c)
-        if t % delay_gps == 0:
-            gps = pycom_monitor.latitude_longitude_altitude(update_rate=1000)
-        if (t+30) % delay_sds011 == 0:
-            # print("call bootstrap")
-            sds011_ok = pycom_monitor.bootstrap_pm10_pm25()
-        if t % delay_sds011 == 0 and sds011_ok:
-            sds011 = pycom_monitor.read_pm10_pm25()
-        if t % delay_ssd1306 == 0:
-            pycom_monitor.print_lcd(t)
-        # if (t-2) % delay_ssd1306 == 0:
-        #     pycom_monitor.turn_off_lcd(lcd_connection)
-
-        ack = send_lora_gw(
-            lora_connection,
-            soc,
-            build_data_dict({
+        if tasks.run_pending() and readings:
+            # the deadline of the round, on the period grid (the batched
+            # series expect whole periods between two samples)
+            t = tasks.round_due // 1000
+            if debug:
+                print("Current relative time " + str(t))
+
+            data = build_data_dict({
                 "timestamp": "ts",
                 "temperature": "tm",
                 "humidity": "hu",
@@ -221,13 +322,30 @@ if __name__ == '__main__':
                 "gps_latitude": "y",
                 "gps_altitude": "z",
                 "dust_pm10": "pm10",
-                "dust_pm25": "pm25"
+                "dust_pm25": "pm25",
+                "battery_voltage": "bt"
             },
-                am2320,
-                sgp30,
-                gps,
-                sds011),
-            t)
-
-        if debug and ack is not None and message_type:
-            print('Received:' + str(ack) + '\n')
+                readings.get("am2320"),
+                readings.get("sgp30"),
+                readings.get("gps"),
+                readings.get("sds011"),
+                readings.get("battery"))
+            readings.clear()
+
+            if batcher is None:
+                frames = (data,)
+            else:
+                frames = batcher.add(t, quantizer.quantize(data))
+
+            for frame in frames:
+                send_lora_gw(uplink_queue, frame, t)
+
+        if debug and uplink_queue.last_rx is not last_rx and message_type:
+            last_rx = uplink_queue.last_rx
+            print('Received:' + str(last_rx) + '\n')
+
+        # Send the display updates of this round at once
+        pycom_monitor.refresh_lcd()
+
+        # Sleep until the next sensor deadline
+        tasks.idle()
@@ -19,11 +19,11 @@
 import time
 from machine import I2C, Pin, UART
 
-from lib import adafruit_am2320, adafruit_gps, sds011, adafruit_sgp30, ssd1306
+from lib import adafruit_am2320, adafruit_gps, battery, devices, sds011, adafruit_sgp30, ssd1306
+from lib import display_manager, status_screen
 
 baseline_time = 0
 sgp30 = None
-gps = None
 
 def init_i2c(baudrate = 100000):
     """
@@ -36,55 +36,170 @@ def init_i2c(baudrate = 100000):
     return i2c
 
 
+def init_lcd(i2c):
+    # Initialize the reset pin
+    res_pin = Pin('P11', mode=Pin.OUT)
+
+    # Initialize the SSD1306 display
+    return ssd1306.SSD1306_I2C(64, 48, i2c, res=res_pin)
+
+
+def init_status_screen(d):
+    """
+    Layout of print_lcd on the 64x48 display, one 8 pixels page per row
+    :param d: the display
+    :return: the status screen
+    """
+    screen = status_screen.StatusScreen(d)
+    screen.add("msg", status_screen.Text(0, 0, 8))
+    screen.add("t", status_screen.Text(0, 8, 8))
+    screen.add("temp", status_screen.Text(0, 16, 4))
+    screen.add("co2", status_screen.Text(32, 16, 4))
+    screen.add("gps", status_screen.Text(0, 24, 4))
+    screen.add("dust", status_screen.Text(32, 24, 4))
+    screen.add("battery", status_screen.Gauge(0, 40, "battery"))
+    screen.add("signal", status_screen.Gauge(24, 40, "signal"))
+    screen.add("queue", status_screen.Gauge(48, 40, "triangle"))
+    return screen
+
+
+def init_sgp30(i2c):
+    """
+    Create the SGP30 driver and restore the IAQ baseline saved by
+    save_co2_tvoc_baseline, so that a driver created again (or after a reboot)
+    does not restart the learning phase of its compensation algorithm
+    :param i2c: the I2C bus
+    :return: the SGP30 driver
+    """
+    sgp = adafruit_sgp30.Adafruit_SGP30(i2c)
+    try:
+        f_co2 = open('co2eq_baseline.txt', 'r')
+        f_tvoc = open('tvoc_baseline.txt', 'r')
+        co2_baseline = int(f_co2.read())
+        tvoc_baseline = int(f_tvoc.read())
+        f_co2.close()
+        f_tvoc.close()
+    except (OSError, ValueError):
+        print('Impossible to read SGP30 baselines!')
+        return sgp
+    if co2_baseline or tvoc_baseline:
+        sgp.set_iaq_baseline(co2_baseline, tvoc_baseline)
+    return sgp
+
+
+def init_battery():
+    # 16 ADC measurements per sample: their median rejects the spikes of the
+    # radio and the sensors, the moving average over the samples the noise
+    return battery.Battery(samples=16, median=True, alpha=0.25)
+
+
+# GPS attributes decoded, the other ones stay None
+GPS_FIELDS = ("latitude", "longitude", "altitude_m", "fix_quality")
+
+
+def init_gps(uart, update_rate = 1000):
+    # Instanciate a Pin object linked to the enable pin of the GPS
+    en_pin = Pin('P23', mode=Pin.OUT)
+
+    # Instantiaite a GPS object, decoding what latitude_longitude_altitude needs
+    g = adafruit_gps.GPS(uart, en_pin, fields=GPS_FIELDS)
+
+    # Turns ON GPS (turn off using gps.disable())
+    g.enable()
+
+    # Turn on only the sentences giving GPS_FIELDS (GGA), the others would
+    # be received then discarded
+    g.send_command(g.pmtk314_command())
+
+    # Set update rate
+    g.send_command('PMTK220,' + str(update_rate))
+
+    return g
+
+
+# Buses and drivers, opened once and re-initialized after repeated errors
+registry = devices.DeviceRegistry()
+registry.register("i2c", init_i2c)
+registry.register("am2320", adafruit_am2320.AM2320, deps=("i2c",))
+registry.register("sgp30", init_sgp30, deps=("i2c",))
+registry.register("ssd1306", init_lcd, deps=("i2c",))
+registry.register("status_screen", init_status_screen, deps=("ssd1306",))
+
+# Refreshes of the status screen, coalesced, and idle poweroff of the display
+display = display_manager.DisplayManager(lambda: registry.get("status_screen"))
+registry.register("gps_uart",
+                  lambda: UART(1, baudrate=9600, timeout_chars=3000, pins=('P4', 'P3')))
+registry.register("gps", init_gps, deps=("gps_uart",))
+registry.register("sds011_uart", lambda: UART(2, baudrate=9600, pins=('P21', 'P22')))
+registry.register("sds011", sds011.SDS011, deps=("sds011_uart",))
+registry.register("battery", init_battery)
+# enable pin of the boost converter (that supplies 5V to the SDS011)
+registry.register("boost_en", lambda: Pin('P8', mode=Pin.OUT))
+
+
+def health():
+    """
+    State of the board devices
+    :return: a dictionary of the device states, by name
+    """
+    return registry.health()
+
+
+def _read_temperature_humidity(am):
+    t, h = am.read()
+    return t, h
+
+
 def temperature_humidity(n_try_max = 10):
     """
     Retrieve temperature (Celsius) and relative humidity form a pycom board,
     these sensors are a bit flakey, its ok if the readings fail
     :return: the temperature and the humidity
     """
-    # init board params
-    i2c = init_i2c()
-    am = adafruit_am2320.AM2320(i2c)
-
-    success = False
-    n_try = 0
-
-    t,h = None, None
-    while not success and n_try < n_try_max:
+    for n_try in range(n_try_max):
         try:
-            t = am.temperature 
-            h = am.relative_humidity
-            success = True
+            return registry.call("am2320", _read_temperature_humidity)
         except Exception:
-            n_try += 1
+            pass
 
-    return t, h 
+    return None, None
 
-def init_co2_tvoc():
+def init_co2_tvoc(idle=None):
     """
     Retrieve CO2 and TVOC from a pycom board
+    :param idle: a function called every second of the 30 s warm-up, before
+        waiting for the next measure (e.g. update_gps, whose UART would
+        overflow meanwhile)
     :return: the co2 and tvoc
     """
     global baseline_time
     global sgp30
 
-    i2c = init_i2c()
-
-    # Create library object on our I2C port
-    sgp30 = adafruit_sgp30.Adafruit_SGP30(i2c)
-
-    # Initialize SGP-30 internal drift compensation algorithm.
-    sgp30.iaq_init()
+    # Create library object on our I2C port, this also initializes the
+    # SGP-30 internal drift compensation algorithm, from the saved baseline.
+    sgp30 = registry.get("sgp30")
 
     for idx in range(30):
-        print('co2eq = ' + str(sgp30.co2eq) + ' ppm \t tvoc = ' + str(sgp30.tvoc) + ' ppb')
+        co2eq, tvoc = sgp30.measure(0)
+        print('co2eq = ' + str(co2eq) + ' ppm \t tvoc = ' + str(tvoc) + ' ppb')
+        if idle is not None:
+            idle()
         time.sleep(1)
 
+    save_co2_tvoc_baseline(sgp30)
+
+
+def save_co2_tvoc_baseline(sgp30):
+    """
+    Save the SGP30 baselines, read at once, to co2eq_baseline.txt and tvoc_baseline.txt
+    """
+    co2eq_baseline, tvoc_baseline = sgp30.get_iaq_baseline()
+
     f_co2 = open('co2eq_baseline.txt', 'w')
     f_tvoc = open('tvoc_baseline.txt', 'w')
 
-    f_co2.write(str(sgp30.baseline_co2eq))
-    f_tvoc.write(str(sgp30.baseline_tvoc))
+    f_co2.write(str(co2eq_baseline))
+    f_tvoc.write(str(tvoc_baseline))
 
     f_co2.close()
     f_tvoc.close()
@@ -93,7 +208,7 @@ def init_co2_tvoc():
 def co2_tvoc(): #i2c):
     """
     Retrieve CO2 and TVOC from a pycom board
-    :return: the co2 and tvoc
+    :return: the co2 and tvoc, None if the sensor failed
     """
     global baseline_time
     global sgp30
@@ -120,48 +235,71 @@ def co2_tvoc(): #i2c):
     # except:
     #     print('Impossible to read SGP30 baselines!')
 
+    try:
+        sgp30 = registry.get("sgp30")
+    except Exception:
+        return None
+
     if(time.time() - baseline_time >= 3600):
         # print('Saving baseline!')
         baseline_time = time.time()
+        save_co2_tvoc_baseline(sgp30)
+    # print('co2eq = ' + str(sgp30.co2eq) + ' ppm \t tvoc = ' + str(sgp30.tvoc) + ' ppb')
 
-        f_co2 = open('co2eq_baseline.txt', 'w')
-        f_tvoc = open('tvoc_baseline.txt', 'w')
+    try:
+        return registry.call("sgp30", _read_co2_tvoc)
+    except Exception:
+        return None
 
-        f_co2.write(str(sgp30.baseline_co2eq))
-        f_tvoc.write(str(sgp30.baseline_tvoc))
 
-        f_co2.close()
-        f_tvoc.close()
-    # print('co2eq = ' + str(sgp30.co2eq) + ' ppm \t tvoc = ' + str(sgp30.tvoc) + ' ppb')
+def _read_co2_tvoc(sgp):
+    co2eq, tvoc = sgp.measure()
+    return co2eq, tvoc
 
-    return sgp30.co2eq, sgp30.tvoc
 
-def gps_init(update_rate = 1000):
-    global gps
-    # Initialize UART
-    uart = UART(1, baudrate=9600, timeout_chars=3000, pins=('P4', 'P3'))
+def battery_voltage_soc():
+    """
+    Sample the battery voltage, once for both readings
+    :return: the battery voltage (V) and state of charge (%), None if the
+        reading failed
+    """
+    try:
+        return registry.call("battery", _read_battery)
+    except Exception:
+        return None
 
-    # Instanciate a Pin object linked to the enable pin of the GPS
-    en_pin = Pin('P23', mode=Pin.OUT)
 
-    # Instantiaite a GPS object
-    gps = adafruit_gps.GPS(uart, en_pin)
+def _read_battery(bat):
+    voltage = bat.sample()
+    if not voltage:
+        # below the ADC window, the sensing failed: not a plausible voltage
+        raise OSError("battery voltage out of the ADC range")
+    return voltage, bat.soc(voltage)
 
-    # Turns ON GPS (turn off using gps.disable())
-    gps.enable()
 
-    # Turn on the basic GGA and RMC info (what you typically want)
-    gps.send_command('PMTK314,0,1,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0')
+def gps_init(update_rate = 1000):
+    registry.register("gps", lambda uart: init_gps(uart, update_rate),
+                      deps=("gps_uart",))
+    registry.get("gps")
+
 
-    # Set update rate
-    gps.send_command('PMTK220,' + str(update_rate))
+def update_gps():
+    """
+    Read the GPS sentences received since the last call, before the UART
+    buffer overflows
+    :return: the number of sentences consumed and dropped unparsed, None if
+        the reading failed
+    """
+    try:
+        return registry.call("gps", adafruit_gps.GPS.update_all)
+    except Exception:
+        return None
 
 def latitude_longitude_altitude(update_rate = 1000):
     """
     Retrieve location data from a pycom board
     :return: x, y and z absolute coordinates
     """
-    global gps
     # # Initialize UART
     # uart = UART(1, baudrate=9600, timeout_chars=3000, pins=('P4', 'P3'))
 # 
@@ -180,16 +318,11 @@ def latitude_longitude_altitude(update_rate = 1000):
     # # Set update rate
     # gps.send_command('PMTK220,' + str(update_rate))
 
-    # Make sure to call gps.update() as often as possible to prevent loss
-    # of data.
-    # This returns a bool that's true if it parsed new data.
-    print("got here !!!!!!!!!!!!!!!! {}".format(gps.has_fix))
-    gps.update()
-    # if gps.update() and gps.has_fix:
-    print('long {}, lat {}, alt {}'.format(gps.longitude, gps.latitude, gps.altitude_m))
-    if gps.longitude and gps.latitude and gps.altitude_m:
-        return gps.longitude, gps.latitude, gps.altitude_m
-    else:
+    # Read everything received since the last update, the newest GGA
+    # sentence gives the position (the only one enabled by init_gps).
+    try:
+        return registry.call("gps", _read_position)
+    except Exception:
         return None
     #if gps.has_fix:
     #    return gps.longitude, gps.latitude, gps.altitude_m
@@ -197,29 +330,28 @@ def latitude_longitude_altitude(update_rate = 1000):
     #    return None
 
 
+def _read_position(gps):
+    gps.update_all()
+    # if gps.update() and gps.has_fix:
+    if gps.longitude and gps.latitude and gps.altitude_m:
+        return gps.longitude, gps.latitude, gps.altitude_m
+    else:
+        return None
+
+
 def bootstrap_pm10_pm25():
     """
     Bootstrap dust on a pycom board
     :return: True or False weather the fan strated
     """
-    # Initialize UART pins(TX,RX)
-    uart = UART(2, baudrate=9600, pins=('P21', 'P22'))
-
-    # Instantiate a SDS011 object
-    dust_sensor = sds011.SDS011(uart)
-
-    # Instanciate a Pin object linked to the enable pin of the boost converter
-    # (that supplies 5V to the SDS011)
-    boost_en = Pin('P8', mode=Pin.OUT)
-
     # Stop fan
     # dust_sensor.sleep()
 
     # Turns ON boost converter
-    boost_en.value(1)
+    registry.get("boost_en").value(1)
     # Turns on fan
     try:
-        dust_sensor.wake()
+        registry.call("sds011", sds011.SDS011.wake)
         # print("dust sensor ")
         return True
     except Exception:
@@ -230,17 +362,12 @@ def bootstrap_pm10_pm25():
 def read_pm10_pm25():
     """
     Retrieve dust measurements from a pycom board
-    :return: the pm10 and pm25 measures
+    :return: the pm10 and pm25 measures, None if the reading failed
     """
-    # Initialize UART pins(TX,RX)
-    uart = UART(2, baudrate=9600, pins=('P21', 'P22'))
-
-    # Instantiate a SDS011 object
-    dust_sensor = sds011.SDS011(uart)
-
-    # Instanciate a Pin object linked to the enable pin of the boost converter
-    # (that supplies 5V to the SDS011)
-    boost_en = Pin('P8', mode=Pin.OUT)
+    try:
+        dust_sensor = registry.get("sds011")
+    except Exception:
+        return None
 
     # Get the measure
     status = dust_sensor.read()
@@ -248,69 +375,96 @@ def read_pm10_pm25():
 
     # Stop fan
     dust_sensor.sleep()
-    boost_en.value(0)  # Turns OFF boost converter
+    registry.get("boost_en").value(0)  # Turns OFF boost converter
 
-    if status == 'NOK':
-        return None
-    elif pkt_status == 'NOK':
+    if not status or not pkt_status:
+        registry.fail("sds011")
         return None
     else:
+        registry.ok("sds011")
         return dust_sensor.pm10, dust_sensor.pm25
 
-# def init_lcd(i2c):
-#     # # Initialize the reset pin
-#     res_pin = Pin('P11', mode=Pin.OUT)
-# # 
-#     # # Initialize the SSD1306 display
-#     d = ssd1306.SSD1306_I2C(64, 48, i2c, res=res_pin)
-# 
-#     return d
+def start_pm10_pm25(period=1):
+    """
+    Let the dust sensor measure on its own and push its reports, see poll_pm10_pm25
+    :param period: the working period of the sensor, in minutes
+    :return: True or False weather the sensor was configured
+    """
+    # Turns ON boost converter, the sensor stops its fan between measures
+    registry.get("boost_en").value(1)
+    try:
+        registry.call("sds011", lambda dust_sensor: _start_sds011(dust_sensor, period))
+        return True
+    except Exception:
+        return False
 
-def print_lcd(msg, t=None, ltemp=False, lco2=False, lgps=False, ldust=False):
+
+def _start_sds011(dust_sensor, period):
+    dust_sensor.wake()
+    dust_sensor.set_reporting_mode_active()
+    dust_sensor.set_working_period(period)
+
+
+def poll_pm10_pm25():
+    """
+    Collect the dust measurements pushed since the last call, without waiting
+    :return: the last pm10 and pm25 measures, None if none was received
     """
+    try:
+        dust_sensor = registry.get("sds011")
+        received = dust_sensor.poll()
+    except Exception:
+        return None
+
+    if not received:
+        return None
+    registry.ok("sds011")
+    return dust_sensor.pm10, dust_sensor.pm25
 
-    :param msg:
+def print_lcd(msg, t=None, ltemp=False, lco2=False, lgps=False, ldust=False,
+              battery=None, signal=None, queue=None, wake=False):
+    """
+    Show the status on the display, only what changed since the last call
+    is drawn and sent, by the next refresh_lcd
+    :param msg: the first line
+    :param t: the second line (optional)
+    :param ltemp, lco2, lgps, ldust: show the labels of the readings sent
+    :param battery, signal, queue: the gauge levels, between 0.0 and 1.0,
+        None keeps the current one
+    :param wake: turn the display on if it is off, otherwise the update
+        waits for the next wake up
     :return:
     """
-    i2c = init_i2c()
-# 
-    # # Initialize the reset pin
-    res_pin = Pin('P11', mode=Pin.OUT)
-# 
-    # # Initialize the SSD1306 display
-    d = ssd1306.SSD1306_I2C(64, 48, i2c, res=res_pin)
-    # l1_pos = 0  #1st line
-    # l2_pos = 10 #2nd line
-    # l3_pos = 20 #3rd line
-    # l4_pos = 30 #4th line
-
-    # Power on and clear screen
-    #d.poweron()
-    d.fill(0)
-
-    # Add text
-    # d.text(string=str(msg), x=0, y=0)
-    d.text(str(msg), 0, 0)
-    if t:
-        d.text(str(t), 0, 10)
-    if ltemp:
-        d.text("temp", 0, 20)
-    if lco2:
-        d.text("co2", 32, 20)
-    if lgps:
-        d.text("gps", 0, 30)
-    if ldust:
-        d.text("dust", 32, 30)
-
-    # d.text('Welcome', 0, l1_pos)
-    # d.text('to IIoT', 0, l2_pos)
-    # d.text('Summer', 0, l3_pos)
-    # d.text('school!', 0, l4_pos)
-    # Update the screen and power it Off
-    d.show()
-    # print("printing on LCD")
-
-    # return d
+    try:
+        screen = registry.get("status_screen")
+    except Exception:
+        return
+    screen.set("msg", msg)
+    screen.set("t", t if t else None)
+    screen.set("temp", "temp" if ltemp else None)
+    screen.set("co2", "co2" if lco2 else None)
+    screen.set("gps", "gps" if lgps else None)
+    screen.set("dust", "dust" if ldust else None)
+    if battery is not None:
+        screen.set("battery", battery)
+    if signal is not None:
+        screen.set("signal", signal)
+    if queue is not None:
+        screen.set("queue", queue)
+    display.request(wake)
+
+
+def refresh_lcd():
+    """
+    Send the pending update of the display (once per frame interval),
+    turn it off when idle
+    :return:
+    """
+    try:
+        if display.poll():
+            registry.ok("ssd1306")
+    except Exception as e:
+        registry.fail("ssd1306", e)
 
 def turn_off_lcd(d):
     try:
@@ -0,0 +1,64 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# AM2320 temperature and humidity in one modbus request (read()) against the
+# temperature and relative_humidity properties, one request each, on the
+# simulated board (lib/hal/sim.py), run on a computer (CPython) with:
+#   python3 tests/am2320_read_simpletest.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+import hal
+
+board = hal.install('sim')
+
+import adafruit_am2320
+from machine import I2C
+
+
+def with_retries(read, n_try_max=10):
+    """read(), retried as the sensor is a bit flakey (and NACKs its wake-up)."""
+    for n_try in range(n_try_max):
+        try:
+            return read()
+        except (OSError, RuntimeError):
+            pass
+    raise RuntimeError('AM2320 not responding')
+
+
+def transactions(read):
+    """I2C transactions of one call of read, and its result."""
+    before = board.i2c.transactions
+    value = with_retries(read)
+    return board.i2c.transactions - before, value
+
+
+if __name__ == '__main__':
+    i2c = I2C(0, I2C.MASTER, baudrate=100000)
+    am = adafruit_am2320.AM2320(i2c)
+    with_retries(am.read)  # awake for the comparison below
+
+    n_props, props = transactions(lambda: (am.temperature, am.relative_humidity))
+    n_read, measurements = transactions(am.read)
+    print('properties: %d I2C transactions, %.1f C %.1f %%' % ((n_props,) + props))
+    print('read():     %d I2C transactions, %.1f C %.1f %%' % ((n_read,) + tuple(measurements)))
+    # a few ms apart, the environment barely changed
+    assert all(abs(a - b) < 0.5 for a, b in zip(measurements, props))
+    assert n_read * 2 == n_props
@@ -0,0 +1,148 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# ADC conversions of the battery readings, one cached sample against
+# the former 100 conversions per voltage() call, the SOC lookup table against
+# the former comparison chain, and the mean, median and moving average of the
+# samples on a noisy ADC, on the simulated board (lib/hal/sim.py), run on a
+# computer (CPython) with:
+#   python3 tests/battery_benchmark.py
+
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+import hal
+
+board = hal.install('sim')
+
+import battery
+import time
+
+
+class FormerBattery(battery.Battery):
+    """battery.Battery before the cached sample: 100 conversions per voltage()."""
+
+    def voltage(self):
+        return self.a * self.bat_pin_voltage()
+
+    def soc(self):
+        a = 0.0
+        b= 0.0
+
+        if(self.voltage() <= 3.27):
+            a = 0.0
+            b= 0.0
+        elif(self.voltage() <= 3.6):
+            a = 50.0
+            b = -175.0
+        elif(self.voltage() <= 3.87):
+            a = 294.12
+            b = -1078.24
+        elif(self.voltage() <= 4.2):
+            a = 121.21
+            b = -409.09
+        else:
+            a = 0.0
+            b = 100.0
+
+        return a*self.voltage() + b
+
+    def energy(self):
+        E_mWh = self.bat_capacity * self.soc() * self.voltage()
+        return 3.6*E_mWh
+
+
+def former_soc(voltage):
+    """The comparison chain of FormerBattery.soc on a given voltage."""
+    if voltage <= 3.27:
+        return 0.0
+    if voltage <= 3.6:
+        return 50.0 * voltage - 175.0
+    if voltage <= 3.87:
+        return 294.12 * voltage - 1078.24
+    if voltage <= 4.2:
+        return 121.21 * voltage - 409.09
+    return 100.0
+
+
+def conversions(read):
+    """ADC conversions of one call of read, and its result."""
+    before = board.battery.conversions
+    value = read()
+    return board.battery.conversions - before, value
+
+
+if __name__ == '__main__':
+    # the piecewise table against the former chain, on and around every breakpoint
+    voltages = [2.5 + i * 0.0005 for i in range(4000)] + list(battery._SOC_VOLTAGES)
+    for v in voltages:
+        assert battery.Battery.soc(None, v) == former_soc(v), v
+    print('SOC table matches the former comparison chain on %d voltages' % len(voltages))
+
+    # one telemetry reading: voltage, SOC and energy
+    former, new = FormerBattery(), battery.Battery()
+    print('\n%-20s %12s %12s' % ('', 'former', 'one sample'))
+    totals = [0, 0]
+    for label, name in (('voltage()', 'voltage'), ('soc()', 'soc'), ('energy()', 'energy')):
+        time.sleep(2)  # older than max_age
+        n_ref, v_ref = conversions(getattr(former, name))
+        n_new, v_new = conversions(getattr(new, name))
+        totals[0] += n_ref
+        totals[1] += n_new
+        print('%-20s %5d conv. %5d conv.   %.3f / %.3f' % (label, n_ref, n_new, v_ref, v_new))
+        assert n_new == 100
+    print('%-20s %5d conv. %5d conv.' % ('total', totals[0], totals[1]))
+    n_new, _ = conversions(lambda: (new.voltage(), new.soc(), new.energy()))
+    print('%-20s %5s       %5d conv.' % ('cached sample', '', n_new))
+    assert n_new == 0 and totals[0] == 100 * (1 + 5 + 6)
+
+    # noise: ADC spikes (radio transmitting) on top of the gaussian noise
+    rng = random.Random(0)
+    channel = board.battery
+    adc_value = channel.adc_value
+
+    def spiky(t):
+        value = adc_value(t)
+        return value - 400 if rng.random() < 0.05 else value
+
+    channel.adc_value = spiky
+    print('\n%-34s %6s %10s %8s' % ('16 conversions per sample', 'conv.', 'stdev mV', 'bias mV'))
+    for label, kwargs in (('mean', {}), ('median', {'median': True}),
+                          ('median, moving average 0.25', {'median': True, 'alpha': 0.25})):
+        bat = battery.Battery(samples=16, max_age=0, **kwargs)
+        readings = []
+        for _ in range(200):
+            time.sleep(1)
+            readings.append(bat.voltage())
+        truth = channel.voltage - channel.drain * time.time() / 3600
+        print('%-34s %6d %10.1f %8.1f' % (label, 16, statistics.pstdev(readings[20:]) * 1000,
+                                          (statistics.mean(readings[20:]) - truth) * 1000))
+    channel.adc_value = adc_value
+
+    # a failed sensing (ADC below its window) is not averaged into the voltage
+    bat = battery.Battery(samples=16, median=True, alpha=0.25)
+    before = bat.sample()
+    connected, channel.voltage = channel.voltage, 0.0
+    assert bat.sample() == 0.0 and bat.voltage() == before
+    channel.voltage = connected
+    after = bat.sample()
+    print('\nfailed sensing: 0.0 V, then %.3f V (%.3f V before)' % (after, before))
+    assert abs(after - before) < 0.02
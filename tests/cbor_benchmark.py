@@ -0,0 +1,94 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# CBOR micro-benchmarks, run on a computer (CPython) with:
+#   python3 tests/cbor_benchmark.py
+
+import io
+import timeit
+import tracemalloc
+
+import micropython_shims
+
+micropython_shims.install()
+
+import cbor
+
+#A full telemetry frame, as built by main.build_data_dict
+frame = {"tm": 21.4, "hu": 48.7, "c": 412, "tv": 17,
+         "x": 7.7521, "y": 48.5734, "z": 142.3,
+         "pm10": 12.6, "pm25": 8.1}
+
+schema = cbor.compile_map(("ts", "tm", "hu", "c", "tv", "x", "y", "z", "pm10", "pm25"))
+assert schema.dumps(frame) == cbor.dumps(frame)
+
+
+def bench(label, stmt, number=20000):
+    t = min(timeit.repeat(stmt, number=number, repeat=10))
+    print('{:<28} {:8.2f} us/frame'.format(label, t / number * 1e6))
+    return t
+
+
+print('Frame length:', len(cbor.dumps(frame)), 'bytes')
+t_ref = bench('cbor.dumps', lambda: cbor.dumps(frame))
+t_schema = bench('Schema.dump_into', lambda: schema.dump_into(frame))
+bench('Schema.dumps', lambda: schema.dumps(frame))
+print('Speedup (Schema.dump_into): {:.2f}x'.format(t_ref / t_schema))
+
+#Streaming encoders, on a nested batch of frames
+batch = [frame] * 8
+buf = bytearray(1024)
+sink = io.BytesIO()
+def stream():
+    sink.seek(0)
+    cbor.dump(batch, sink)
+def blob():
+    sink.seek(0)
+    sink.write(cbor.dumps(batch))
+print()
+print('Batch length:', len(cbor.dumps(batch)), 'bytes')
+bench('write(cbor.dumps)', blob, 2000)
+bench('cbor.dump', stream, 2000)
+bench('cbor.dump_into', lambda: cbor.dump_into(batch, buf), 2000)
+
+#The point of streaming is the heap: compare peak allocations
+for label, stmt in (('write(cbor.dumps)', blob), ('cbor.dump', stream),
+                    ('cbor.dump_into', lambda: cbor.dump_into(batch, buf))):
+    tracemalloc.start()
+    stmt()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('{:<28} {:8d} bytes peak heap'.format(label, peak))
+
+#Decoding realistic uplinks (30-60 bytes), as the backend does
+uplinks = [cbor.dumps(d) for d in (
+    {"tm": 21.4, "hu": 48.7, "c": 412, "tv": 17},
+    {"tm": 21.4, "hu": 48.7, "c": 412, "tv": 17, "pm10": 12.6, "pm25": 8.1},
+    {"x": 7.7521, "y": 48.5734, "z": 142.3, "c": 1020, "tv": 250})]
+stream_data = b''.join(uplinks)
+print()
+print('Uplink lengths:', [len(u) for u in uplinks], 'bytes')
+def decode_loads():
+    for u in uplinks:
+        cbor.loads(u)
+def decode_buffer():
+    for u in uplinks:
+        cbor.loads_buffer(u)
+t_ref = bench('cbor.loads', decode_loads, 5000)
+t_buf = bench('cbor.loads_buffer', decode_buffer, 5000)
+t_stream = bench('cbor.iter_loads (stream)', lambda: list(cbor.iter_loads(stream_data)), 5000)
+print('Speedup (loads_buffer): {:.2f}x'.format(t_ref / t_buf))
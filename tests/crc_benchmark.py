@@ -0,0 +1,137 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Table-driven sensor CRCs against the former bit-by-bit loops, checked for
+# equality on random data then timed, run on a computer (CPython) with:
+#   python3 tests/crc_benchmark.py
+
+import random
+import struct
+import timeit
+
+import micropython_shims
+
+micropython_shims.install()
+
+import adafruit_am2320
+import adafruit_sgp30
+
+
+# adafruit_sgp30 before the lookup table
+
+def former_generate_crc(data):
+    crc = 0xFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 0x80:
+                crc = (crc << 1) ^ 0x31
+            else:
+                crc <<= 1
+    return crc & 0xFF
+
+
+def former_check_words(crc_result):
+    for i in range(len(crc_result) // 3):
+        word = [crc_result[3*i], crc_result[3*i+1]]
+        if former_generate_crc(word) != crc_result[3*i+2]:
+            return False
+    return True
+
+
+# adafruit_am2320 before the lookup tables
+
+def former_crc16(data):
+    crc = 0xffff
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 0x0001:
+                crc >>= 1
+                crc ^= 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+
+def former_crc16_check(result):
+    return former_crc16(result[0:-2]), struct.unpack("<H", bytes(result[-2:]))[0]
+
+
+def bench(label, stmt, number=20000):
+    t = min(timeit.repeat(stmt, number=number, repeat=5))
+    print('{:<28} {:8.2f} us/call'.format(label, t / number * 1e6))
+    return t
+
+
+rng = random.Random(0)
+# the driver methods do not touch the bus, no device is needed
+sgp30 = adafruit_sgp30.Adafruit_SGP30.__new__(adafruit_sgp30.Adafruit_SGP30)
+
+# Sensirion datasheet example: CRC(0xBEEF) = 0x92
+assert sgp30._generate_crc([0xBE, 0xEF]) == 0x92
+for _ in range(2000):
+    data = bytes(rng.getrandbits(8) for _ in range(rng.randrange(0, 8)))
+    assert sgp30._generate_crc(data) == former_generate_crc(data)
+for _ in range(2000):
+    reply = bytearray()
+    for _ in range(rng.randrange(1, 4)):
+        word = bytes((rng.getrandbits(8), rng.getrandbits(8)))
+        reply += word + bytes((former_generate_crc(word),))
+    assert sgp30._check_words(reply) and former_check_words(reply)
+    reply[rng.randrange(len(reply))] ^= 1 << rng.randrange(8)
+    assert not sgp30._check_words(reply) and not former_check_words(reply)
+print('SGP30 CRC8: table matches the former loop')
+
+# an iaq_measure reply: CO2eq and TVOC words with their CRCs
+reply = bytearray()
+for value in (412, 17):
+    word = bytes((value >> 8, value & 0xFF))
+    reply += word + bytes((former_generate_crc(word),))
+word = [0x01, 0x9c]
+t_ref = bench('former _generate_crc', lambda: former_generate_crc(word))
+t_new = bench('_generate_crc', lambda: sgp30._generate_crc(word))
+print('Speedup (_generate_crc): {:.2f}x'.format(t_ref / t_new))
+t_ref = bench('former reply check', lambda: former_check_words(reply))
+t_new = bench('_check_words', lambda: sgp30._check_words(reply))
+print('Speedup (_check_words): {:.2f}x'.format(t_ref / t_new))
+
+# AM2320 CRC16/Modbus
+print()
+# Modbus reference: CRC of 01 03 00 00 00 01 is 0x0A84 (sent as 84 0A)
+assert adafruit_am2320._crc16(b'\x01\x03\x00\x00\x00\x01') == 0x0A84
+for _ in range(2000):
+    data = bytearray(rng.getrandbits(8) for _ in range(rng.randrange(0, 12)))
+    assert adafruit_am2320._crc16(data) == former_crc16(data)
+    assert adafruit_am2320._crc16(memoryview(data)) == former_crc16(data)
+    reply = data + struct.pack("<H", former_crc16(data))
+    crc, received = adafruit_am2320._crc16_check(reply)
+    assert crc == received and former_crc16_check(reply) == (crc, received)
+    reply[rng.randrange(len(reply))] ^= 1 << rng.randrange(8)
+    crc, received = adafruit_am2320._crc16_check(reply)
+    assert crc != received and former_crc16_check(reply) == (crc, received)
+print('AM2320 CRC16: table matches the former loop')
+
+# a reply to the read of the humidity and temperature registers
+data = bytearray(b'\x03\x04\x02\x5c\x00\xd6')
+reply = data + struct.pack("<H", former_crc16(data))
+t_ref = bench('former _crc16', lambda: former_crc16(data))
+t_new = bench('_crc16', lambda: adafruit_am2320._crc16(data))
+print('Speedup (_crc16): {:.2f}x'.format(t_ref / t_new))
+t_ref = bench('former reply check', lambda: former_crc16_check(reply))
+t_new = bench('_crc16_check', lambda: adafruit_am2320._crc16_check(reply))
+print('Speedup (_crc16_check): {:.2f}x'.format(t_ref / t_new))
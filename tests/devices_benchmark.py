@@ -0,0 +1,156 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Bus transactions per sensor cycle of pycom_monitor, with the device registry
+# and with the former per-read bus and driver creation, on the simulated board
+# (lib/hal/sim.py), run on a computer (CPython) with:
+#   python3 tests/devices_benchmark.py
+
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+sys.path.insert(0, ROOT)
+
+import hal
+
+board = hal.install('sim')
+
+import time
+import pycom_monitor
+from lib import adafruit_am2320, sds011, ssd1306
+from machine import I2C, Pin, UART
+
+
+# pycom_monitor before the device registry (bus and driver created per read)
+
+def former_temperature_humidity(n_try_max=10):
+    i2c = pycom_monitor.init_i2c()
+    am = adafruit_am2320.AM2320(i2c)
+    t, h = None, None
+    for n_try in range(n_try_max):
+        try:
+            t = am.temperature
+            h = am.relative_humidity
+            break
+        except Exception:
+            pass
+    return t, h
+
+
+def former_co2_tvoc():
+    sgp30 = pycom_monitor.sgp30
+    return sgp30.iaq_measure()[0], sgp30.iaq_measure()[1]
+
+
+def former_bootstrap_pm10_pm25():
+    uart = UART(2, baudrate=9600, pins=('P21', 'P22'))
+    dust_sensor = sds011.SDS011(uart)
+    boost_en = Pin('P8', mode=Pin.OUT)
+    boost_en.value(1)
+    dust_sensor.wake()
+    return True
+
+
+def former_read_pm10_pm25():
+    uart = UART(2, baudrate=9600, pins=('P21', 'P22'))
+    dust_sensor = sds011.SDS011(uart)
+    boost_en = Pin('P8', mode=Pin.OUT)
+    dust_sensor.read()
+    dust_sensor.sleep()
+    boost_en.value(0)
+    return dust_sensor.pm10, dust_sensor.pm25
+
+
+def former_print_lcd(msg, t=None):
+    i2c = pycom_monitor.init_i2c()
+    res_pin = Pin('P11', mode=Pin.OUT)
+    d = ssd1306.SSD1306_I2C(64, 48, i2c, res=res_pin)
+    d.fill(0)
+    d.text(str(msg), 0, 0)
+    d.show()
+
+
+def counters():
+    uarts = board.uarts.values()
+    return (board.i2c.inits + sum(p.inits for p in uarts),
+            board.i2c.transactions + sum(p.read_calls + p.write_calls for p in uarts),
+            board.i2c.bytes_written + board.i2c.bytes_read +
+            sum(p.rx_bytes + p.tx_bytes for p in uarts))
+
+
+def cycle(functions):
+    """Return the bus counters of one sensor cycle, a second after the last one."""
+    time.sleep(1)
+    before = counters()
+    for f in functions:
+        f()
+    return tuple(b - a for a, b in zip(before, counters()))
+
+
+if __name__ == '__main__':
+    pycom_monitor.init_co2_tvoc()  # the SGP30 was already persistent
+
+    cases = (("am2320", former_temperature_humidity, pycom_monitor.temperature_humidity),
+             ("sgp30", former_co2_tvoc, pycom_monitor.co2_tvoc),
+             ("sds011", lambda: (former_bootstrap_pm10_pm25(), former_read_pm10_pm25()),
+              lambda: (pycom_monitor.bootstrap_pm10_pm25(), pycom_monitor.read_pm10_pm25())),
+             ("ssd1306", lambda: former_print_lcd(int(time.time())),
+              lambda: (pycom_monitor.print_lcd(int(time.time()), wake=True),
+                       pycom_monitor.refresh_lcd())))
+
+    print('%-8s %22s %22s' % ('', 'former', 'registry'))
+    print('%-8s %6s %7s %7s %6s %7s %7s' % ('device', 'inits', 'xfers', 'bytes',
+                                          'inits', 'xfers', 'bytes'))
+    # warm the registry up, its devices are created on first use
+    for name, former, registry in cases:
+        registry()
+    totals = [0] * 6
+    for name, former, registry in cases:
+        row = cycle((former,)) + cycle((registry,))
+        totals = [a + b for a, b in zip(totals, row)]
+        print('%-8s %6d %7d %7d %6d %7d %7d' % ((name,) + row))
+    print('%-8s %6d %7d %7d %6d %7d %7d' % tuple(['total'] + totals))
+    assert totals[3] == 0 and totals[4] < totals[1]
+
+    # an unplugged AM2320: dropped after 3 consecutive errors, created again
+    am2320 = board.i2c.devices.pop(0x5C)
+    print('\ntemperature_humidity() without the AM2320: ' +
+          str(pycom_monitor.temperature_humidity(n_try_max=4)))
+    board.i2c.attach(am2320)
+    print('temperature_humidity() plugged back: ' +
+          str(pycom_monitor.temperature_humidity()))
+    health = pycom_monitor.health()
+    print('am2320 health: ' + str(health["am2320"]))
+    assert health["am2320"]["inits"] == 2
+
+    # the SGP30 created again restores the baseline saved by init_co2_tvoc
+    saved = board.sgp30.baseline
+    board.sgp30.baseline = (0, 0)  # power cycled, learning again
+    pycom_monitor.registry.reset("sgp30")
+    pycom_monitor.co2_tvoc()
+    print('sgp30 baseline after re-creation: %s (saved %s)' % (board.sgp30.baseline, saved))
+    assert board.sgp30.baseline == saved
+
+    # registered again with another factory: created again by the new one
+    registry = pycom_monitor.registry
+    first = registry.get("battery")
+    registry.register("battery", lambda: pycom_monitor.battery.Battery(samples=4))
+    second = registry.get("battery")
+    assert second is not first and second.samples == 4
+    print('battery registered again: samples %d -> %d' % (first.samples, second.samples))
@@ -0,0 +1,120 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# A simulated day of the print_lcd calls of main.py (at every uplink and every
+# 120 s), through the display manager (coalesced refreshes, idle poweroff)
+# against the former display always on and fully redrawn at every call, on
+# the simulated board (lib/hal/sim.py), run on a computer (CPython) with:
+#   python3 tests/display_benchmark.py
+
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+sys.path.insert(0, ROOT)
+
+import hal
+
+board = hal.install('sim')
+
+import display_manager
+import pycom_monitor
+import scheduler
+
+DAY = 24 * 3600
+
+
+def former_print_lcd(d, msg, t=None, ltemp=False, lco2=False, lgps=False, ldust=False):
+    d.fill(0)
+    d.text(str(msg), 0, 0)
+    if t:
+        d.text(str(t), 0, 10)
+    if ltemp:
+        d.text("temp", 0, 20)
+    if lco2:
+        d.text("co2", 32, 20)
+    if lgps:
+        d.text("gps", 0, 30)
+    if ldust:
+        d.text("dust", 32, 30)
+    for cmd in (0x21, 32, 95, 0x22, 0, 5):  # the whole window, one command at a time
+        d.write_cmd(cmd)
+    d.write_framebuf()
+
+
+def calls(t):
+    """The print_lcd calls of main.py in the second t: an uplink every 10 s,
+    two when a batch of two frames is sent, the clock every 120 s."""
+    out = []
+    if t % 10 == 0:
+        out.append(((t, 30 + t % 7, True, True, t % 20 == 0, t % 60 == 0), False))
+        if t % 600 == 0:
+            out.append(((t, 31, True, False, False, False), False))
+    if t % 120 == 0:
+        out.append(((t,), True))
+    return out
+
+
+if __name__ == '__main__':
+    status = pycom_monitor.registry.get("status_screen")
+    d = status.display
+
+    # former: every call redrawn and sent, the display never turned off
+    n_calls = sum(len(calls(t)) for t in range(1, DAY + 1))
+    before = (d.tx_bytes, board.i2c.busy_us)
+    former_print_lcd(d, *calls(10)[0][0])
+    former_bytes = (d.tx_bytes - before[0]) * n_calls
+    former_bus_us = (board.i2c.busy_us - before[1]) * n_calls
+    status.invalidate()
+    status.refresh()
+
+    # the display manager, polled every second as by the main loop
+    clock = scheduler.VirtualClock()
+    fetches = [0]
+
+    def screen():
+        fetches[0] += 1
+        return status
+
+    manager = display_manager.DisplayManager(screen, frame_ms=1000,
+                                             idle_ms=30000, clock=clock)
+    pycom_monitor.display = manager
+    before = (d.tx_bytes, board.i2c.busy_us)
+    for t in range(1, DAY + 1):
+        clock.sleep(1000)
+        for args, wake in calls(t):
+            pycom_monitor.print_lcd(*args, wake=wake)
+        pycom_monitor.refresh_lcd()
+        assert board.ssd1306.on == manager.on or not manager.flushes
+    stats = manager.stats()
+    managed_bytes = d.tx_bytes - before[0]
+    managed_bus_us = board.i2c.busy_us - before[1]
+
+    print('%d print_lcd calls in a day' % n_calls)
+    print('%-16s %9s %9s %10s' % ('', 'I2C bytes', 'bus time', 'display on'))
+    print('%-16s %9d %7.1f s %8.1f h' % ('former', former_bytes, former_bus_us / 1e6, 24.0))
+    print('%-16s %9d %7.1f s %8.1f h' % ('display manager', managed_bytes,
+                                         managed_bus_us / 1e6, stats['on_ms'] / 3600e3))
+    print('saved: %d I2C bytes (%.1f%%), %.1f h of display time' % (
+        former_bytes - managed_bytes, 100.0 * (former_bytes - managed_bytes) / former_bytes,
+        24.0 - stats['on_ms'] / 3600e3))
+    print('manager ' + str(stats))
+    assert stats['requests'] == n_calls and stats['flushes'] < n_calls
+    assert stats['wakes'] == stats['sleeps'] and managed_bytes < former_bytes / 10
+    # the screen (and a failed display) is only fetched to be flushed
+    assert fetches[0] == stats['flushes']
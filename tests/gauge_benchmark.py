@@ -0,0 +1,184 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# The SSD1306 gauges blitted from their cached sprites against the former
+# pixel by pixel drawing: same pixels at every level and position, then the
+# frame buffer calls and the render time of the gauge row of the status
+# screen, with the simulated framebuf module (lib/hal/sim_framebuf.py), run on
+# a computer (CPython) with:
+#   python3 tests/gauge_benchmark.py
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+import hal
+
+board = hal.install('sim')
+
+import framebuf
+import ssd1306
+
+
+# ssd1306 before the sprites: the gauges drawn pixel by pixel
+
+def former_triangle_gauge(fb, x, y, value):
+    if(value > 1.0):
+        value = 1.0
+    elif(value < 0.0):
+        value = 0.0
+    for i in range(0, 16):
+        fb.pixel(x+i, y+7, 0xFFFFFF)
+    for i in range(0, 8):
+        fb.pixel(x+15, y+i, 0xFFFFFF)
+        fb.pixel(x+2*i, y+7-i, 0xFFFFFF)
+        fb.pixel(x+2*i+1, y+7-i, 0xFFFFFF)
+    num_bar = round(value*10.0)
+    for i in range(0,num_bar+1):
+        x_bar = x + i + 4
+        ymin = y + 7 - int(i/2.0) - 1
+        ymax = y + 7
+        for y_bar in range(ymin, ymax):
+            fb.pixel(x_bar, y_bar, 0xFFFFFF)
+
+
+def former_battery_gauge(fb, x, y, value):
+    if(value > 1.0):
+        value = 1.0
+    elif(value < 0.0):
+        value = 0.0
+    for i in range(0, 14):
+        fb.pixel(x+i, y, 0xFFFFFF)
+        fb.pixel(x+i, y+7, 0xFFFFFF)
+    for i in range(0, 8):
+        fb.pixel(x, y+i, 0xFFFFFF)
+    for i in range(1, 7):
+        fb.pixel(x+15, y+i, 0xFFFFFF)
+    fb.pixel(x+13, y+1, 0xFFFFFF)
+    fb.pixel(x+14, y+1, 0xFFFFFF)
+    fb.pixel(x+14, y+6, 0xFFFFFF)
+    fb.pixel(x+13, y+6, 0xFFFFFF)
+    num_bar = round(value*13.0)
+    for i in range(0,num_bar+1):
+        x_bar = x + i + 1
+        ymin = 1
+        ymax = 6
+        if(i == 13 or i == 14):
+            ymin = 2
+            ymax = 5
+        for i in range(ymin, ymax+1):
+            fb.pixel(x_bar, y+i, 0xFFFFFF)
+
+
+def former_signal_gauge(fb, x, y, value):
+    if(value > 1.0):
+        value = 1.0
+    elif(value < 0.0):
+        value = 0.0
+    num_bar = round(value*4.0)
+    bars = ((), ((0, 7),), ((0, 5), (1, 5), (2, 6), (2, 7)),
+            ((0, 3), (1, 3), (2, 3), (3, 4), (4, 5), (4, 6), (4, 7)),
+            ((0, 1), (1, 1), (2, 1), (3, 1), (4, 2), (5, 2), (5, 3), (6, 4),
+             (6, 5), (6, 6), (6, 7)))
+    for level in range(1, num_bar + 1):
+        for dx, dy in bars[level]:
+            fb.pixel(x+dx, y+dy, 0xFFFFFF)
+
+
+class Counting:
+    """A frame buffer counting the calls to each of its methods."""
+    def __init__(self, fb):
+        self.fb = fb
+        self.calls = {}
+
+    def __getattr__(self, name):
+        method = getattr(self.fb, name)
+        def counted(*args):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return method(*args)
+        return counted
+
+
+class Display(ssd1306.SSD1306):
+    """The drawing part of the driver, on a 64x48 frame buffer and no bus."""
+    def __init__(self):
+        self.width, self.height, self.pages = 64, 48, 6
+        self._dirty_x0 = [0] * 6
+        self._dirty_x1 = [63] * 6
+        self.buffer = bytearray(64 * 6)
+        self.framebuf = framebuf.FrameBuffer(self.buffer, 64, 48, framebuf.MONO_VLSB)
+
+
+GAUGES = (('triangle', former_triangle_gauge, 10, 16),
+          ('battery', former_battery_gauge, 13, 16),
+          ('signal', former_signal_gauge, 4, 8))
+
+
+def gauge_row(d, draw, value):
+    """The gauges of the status screen: battery, signal and queue."""
+    draw[1](d, 0, 40, value)
+    draw[2](d, 24, 40, value)
+    draw[0](d, 48, 40, value)
+
+
+if __name__ == '__main__':
+    # same pixels as the former drawing, every level, clipped or on a
+    # background
+    rng = random.Random(0)
+    d = Display()
+    reference = framebuf.FrameBuffer(bytearray(64 * 6), 64, 48, framebuf.MONO_VLSB)
+    for _ in range(2000):
+        name, former, levels, width = GAUGES[rng.randrange(3)]
+        x, y = rng.randrange(-width, 64), rng.randrange(-8, 48)
+        value = rng.randrange(-1, levels + 2) / levels
+        background = bytes(rng.getrandbits(8) for _ in range(len(d.buffer)))
+        d.buffer[:] = background
+        reference.buf[:] = background
+        getattr(d, name + '_gauge')(x, y, value)
+        former(reference, x, y, value)
+        assert d.buffer == reference.buf, (name, x, y, value)
+    cached = [sum(s is not None for s in gauge[2])
+              for gauge in (ssd1306._TRIANGLE, ssd1306._BATTERY, ssd1306._SIGNAL)]
+    assert cached == [11, 14, 5]
+    print('Gauges blitted from %d sprites (%d bytes) draw the former pixels' % (
+        sum(cached), 16 * 11 + 16 * 14 + 8 * 5))
+
+    # frame buffer calls and time of one gauge row
+    d = Display()
+    fb = d.framebuf
+    old = tuple(lambda d, x, y, value, former=former: former(d.framebuf, x, y, value)
+                for name, former, levels, width in GAUGES)
+    new = tuple(getattr(ssd1306.SSD1306, name + '_gauge')
+                for name, former, levels, width in GAUGES)
+    print('\n%-16s %6s %6s %11s' % ('gauge row', 'pixel', 'blit', 'render'))
+    results = []
+    for label, draw in (('former', old), ('sprites', new)):
+        d.framebuf = Counting(fb)
+        gauge_row(d, draw, 1.0)
+        calls = d.framebuf.calls
+        d.framebuf = fb
+        start = time.perf_counter()
+        for i in range(200):
+            gauge_row(d, draw, i % 14 / 13)
+        elapsed = (time.perf_counter() - start) / 200
+        results.append(elapsed)
+        print('%-16s %6d %6d %8.0f us' % (label, calls.get('pixel', 0), calls.get('blit', 0),
+                                          elapsed * 1e6))
+    print('Speedup (gauge row): {:.2f}x'.format(results[0] / results[1]))
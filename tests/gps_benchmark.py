@@ -0,0 +1,398 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# NMEA reading throughput and position staleness of adafruit_gps, one line per
+# update() against update_all(), the parse rate of the sentences against the
+# former parser and the characters received with the PMTK314 output mask of the
+# decoded fields, on tests/gps_log.nmea (60 epochs recorded from the simulated
+# MTK3339, default sentence output), run on a computer (CPython) with:
+#   python3 tests/gps_benchmark.py
+
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lib'))
+
+import adafruit_gps
+
+with open(os.path.join(HERE, 'gps_log.nmea'), 'rb') as f:
+    LOG = f.read()
+SENTENCES = LOG.splitlines(True)
+
+# adafruit_gps before the dispatch table: every field of GGA and RMC decoded,
+# a Python XOR loop for the checksum
+
+def former_parse_degrees(nmea_data):
+    # Parse a NMEA lat/long data pair 'dddmm.mmmm' into a pure degrees value.
+    # Where ddd is the degrees, mm.mmmm is the minutes.
+    if nmea_data is None or len(nmea_data) < 3:
+        return None
+    raw = float(nmea_data.decode())
+    deg = raw // 100
+    minutes = raw % 100
+    return deg + minutes/60
+
+def former_parse_int(nmea_data):
+    if nmea_data is None or nmea_data == b'':
+        return None
+    return int(nmea_data)
+
+def former_parse_float(nmea_data):
+    if nmea_data is None or nmea_data == b'':
+        return None
+    return float(nmea_data.decode())
+
+
+class FormerParser:
+    def __init__(self):
+        self.timestamp_utc = None
+        self.latitude = None
+        self.longitude = None
+        self.fix_quality = None
+        self.satellites = None
+        self.horizontal_dilution = None
+        self.altitude_m = None
+        self.height_geoid = None
+        self.speed_knots = None
+        self.track_angle_deg = None
+
+    def parse(self, sentence):
+        sentence = self._split_sentence(sentence)
+        if sentence is None:
+            return
+        data_type, args = sentence
+        data_type = data_type.upper()
+        if data_type == b'GPGGA':
+            self._parse_gpgga(args)
+        elif data_type == b'GPRMC':
+            self._parse_gprmc(args)
+
+    def _split_sentence(self, sentence):
+        # Check a sentence and split it in data type and arguments.
+        if sentence is None or sentence == b'' or len(sentence) < 1:
+            return None
+        sentence = sentence.strip()
+        # Look for a checksum and validate it if present.
+        if len(sentence) > 7 and sentence[-3] == ord('*'):
+            # Get included checksum, then calculate it and compare.
+            expected = int(sentence[-2:], 16)
+            actual = 0
+            for i in range(1, len(sentence)-3):
+                actual ^= sentence[i]
+            if actual != expected:
+                return None  # Failed to validate checksum.
+            # Remove checksum once validated.
+            sentence = sentence[:-3]
+        # Parse out the type of sentence (first string after $ up to comma)
+        # and then grab the rest as data within the sentence.
+        delineator = sentence.find(b',')
+        if delineator == -1:
+            return None  # Invalid sentence, no comma after data type.
+        data_type = sentence[1:delineator]
+        return (data_type, sentence[delineator+1:])
+
+    def _parse_gpgga(self, args):
+        # Parse the arguments (everything after data type) for NMEA GPGGA
+        # 3D location fix sentence.
+        data = args.split(b',')
+        if data is None or len(data) != 14:
+            return  # Unexpected number of params.
+        # Parse fix time.
+        time_utc = int(former_parse_float(data[0]))
+        if time_utc is not None:
+            hours = time_utc // 10000
+            mins = (time_utc // 100) % 100
+            secs = time_utc % 100
+            # Set or update time to a friendly python time struct.
+            if self.timestamp_utc is not None:
+                self.timestamp_utc = (
+                    self.timestamp_utc[0], self.timestamp_utc[1],
+                    self.timestamp_utc[2], hours, mins, secs, 0, 0)
+            else:
+                self.timestamp_utc = (0, 0, 0, hours, mins, secs, 0, 0)
+        # Parse latitude and longitude.
+        self.latitude = former_parse_degrees(data[1])
+        if self.latitude is not None and \
+           data[2] is not None and data[2].lower() == b's':
+            self.latitude *= -1.0
+        self.longitude = former_parse_degrees(data[3])
+        if self.longitude is not None and \
+           data[4] is not None and data[4].lower() == b'w':
+            self.longitude *= -1.0
+        # Parse out fix quality and other simple numeric values.
+        self.fix_quality = former_parse_int(data[5])
+        self.satellites = former_parse_int(data[6])
+        self.horizontal_dilution = former_parse_float(data[7])
+        self.altitude_m = former_parse_float(data[8])
+        self.height_geoid = former_parse_float(data[10])
+
+    def _parse_gprmc(self, args):
+        # Parse the arguments (everything after data type) for NMEA GPRMC
+        # minimum location fix sentence.
+        data = args.split(b',')
+        if data is None or len(data) < 11 or data[0] is None:
+            return  # Unexpected number of params.
+        # Parse fix time.
+        time_utc = int(former_parse_float(data[0]))
+        if time_utc is not None:
+            hours = time_utc // 10000
+            mins = (time_utc // 100) % 100
+            secs = time_utc % 100
+            # Set or update time to a friendly python time struct.
+            if self.timestamp_utc is not None:
+                self.timestamp_utc = (
+                    self.timestamp_utc[0], self.timestamp_utc[1],
+                    self.timestamp_utc[2], hours, mins, secs, 0, 0)
+            else:
+                self.timestamp_utc = (0, 0, 0, hours, mins, secs, 0, 0)
+        # Parse status (active/fixed or void).
+        status = data[1]
+        self.fix_quality = 0
+        if status is not None and status.lower() == b'a':
+            self.fix_quality = 1
+        # Parse latitude and longitude.
+        self.latitude = former_parse_degrees(data[2])
+        if self.latitude is not None and \
+           data[3] is not None and data[3].lower() == b's':
+            self.latitude *= -1.0
+        self.longitude = former_parse_degrees(data[4])
+        if self.longitude is not None and \
+           data[5] is not None and data[5].lower() == b'w':
+            self.longitude *= -1.0
+        # Parse out speed and other simple numeric values.
+        self.speed_knots = former_parse_float(data[6])
+        self.track_angle_deg = former_parse_float(data[7])
+        # Parse date.
+        if data[8] is not None and len(data[8]) == 6:
+            day = int(data[8][0:2])
+            month = int(data[8][2:4])
+            year = 2000 + int(data[8][4:6])  # Y2k bug, 2 digit date assumption.
+                                             # This is a problem with the NMEA
+                                             # spec and not this code.
+            if self.timestamp_utc is not None:
+                # Replace the timestamp with an updated one.
+                self.timestamp_utc = (year, month, day,
+                                                       self.timestamp_utc[3],
+                                                       self.timestamp_utc[4],
+                                                       self.timestamp_utc[5],
+                                                       0,
+                                                       0)
+            else:
+                # Time hasn't been set so create it.
+                self.timestamp_utc = (year, month, day, 0, 0, 0, 0, 0)
+
+
+class FakeUART:
+    """A UART receive buffer of rx_buffer_size characters, as the Pycom
+    driver's, that drops what overflows it."""
+    def __init__(self, rx_buffer_size=512):
+        self.rx = bytearray()
+        self.rx_buffer_size = rx_buffer_size
+        self.overruns = 0
+
+    def feed(self, data):
+        room = self.rx_buffer_size - len(self.rx)
+        self.rx += data[:room]
+        self.overruns += max(len(data) - room, 0)
+
+    def any(self):
+        return len(self.rx)
+
+    def readline(self):
+        end = self.rx.find(b'\n')
+        if end < 0:
+            return None
+        line = bytes(self.rx[:end+1])
+        del self.rx[:end+1]
+        return line
+
+    def readinto(self, buf, nbytes):
+        n = min(nbytes, len(self.rx))
+        buf[:n] = self.rx[:n]
+        del self.rx[:n]
+        return n
+
+    def write(self, data):
+        pass
+
+
+def epochs(kinds):
+    """Split the log in 1 s epochs of the given sentence types."""
+    out, current = [], []
+    for line in SENTENCES:
+        if line[3:6] == b'GGA' and current:
+            out.append(b''.join(current))
+            current = []
+        if line[3:6] in kinds:
+            current.append(line)
+    out.append(b''.join(current))
+    return out
+
+
+def throughput(label, read, repeat=20):
+    """Sentences consumed per second when the whole log is waiting."""
+    best = None
+    for _ in range(repeat):
+        uart = FakeUART(len(LOG))
+        gps = adafruit_gps.GPS(uart)
+        uart.feed(LOG)
+        start = time.perf_counter()
+        consumed = read(gps)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print('{:<34} {:8.0f} sentences/s'.format(label, consumed / best))
+    return consumed / best
+
+
+def read_lines(gps):
+    n = 0
+    while gps.update():
+        n += 1
+    return n
+
+
+def read_all(gps):
+    return gps.update_all()[0]
+
+
+ATTRIBUTES = ('timestamp_utc', 'latitude', 'longitude', 'fix_quality', 'satellites',
+              'horizontal_dilution', 'altitude_m', 'height_geoid', 'speed_knots',
+              'track_angle_deg')
+# what main.py transmits
+POSITION = ('latitude', 'longitude', 'altitude_m', 'fix_quality')
+
+
+def parse(gps, sentence):
+    gps._parse(sentence)
+
+
+def parse_rate(label, parser, parse, repeat=20):
+    """Sentences checked and parsed per second."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for sentence in SENTENCES:
+            parse(parser, sentence)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print('{:<34} {:8.0f} sentences/s'.format(label, len(SENTENCES) / best))
+    return len(SENTENCES) / best
+
+
+def staleness(label, update, kinds=(b'GGA', b'RMC')):
+    """Feed one epoch per second, update once per second, report the lag."""
+    uart = FakeUART()
+    gps = adafruit_gps.GPS(uart)
+    lags = []
+    for t, epoch in enumerate(epochs(kinds)):
+        uart.feed(epoch)
+        update(gps)
+        if gps.timestamp_utc is not None:
+            lags.append(25 + t - gps.timestamp_utc[5] - 60 * gps.timestamp_utc[4])
+    print('{:<34} lag {:2d} s at the end, {:5d} bytes overrun'.format(
+        label, lags[-1], uart.overruns))
+    return lags[-1], uart.overruns
+
+
+# PMTK314 field order
+TYPES = ('GLL', 'RMC', 'VTG', 'GGA', 'GSA', 'GSV')
+
+
+def output(command):
+    """The sentence types a PMTK314 command turns on."""
+    mask = command.split(',')[1:7]
+    return tuple(kind for kind, on in zip(TYPES, mask) if on == '1')
+
+
+def retalk(sentence, talker):
+    """The sentence from another talker, with its checksum."""
+    data = talker + sentence[3:sentence.index(b'*')]
+    return b'$%s*%02X\r\n' % (data, adafruit_gps._checksum(data))
+
+
+if __name__ == '__main__':
+    print('%d sentences, %d bytes' % (len(SENTENCES), len(LOG)))
+    lines = throughput('update() until False', read_lines)
+    bulk = throughput('update_all()', read_all)
+    print('Speedup (update_all): {:.2f}x'.format(bulk / lines))
+    print()
+    # same attributes as the former parser after every sentence
+    former, gps = FormerParser(), adafruit_gps.GPS(None)
+    position = adafruit_gps.GPS(None, fields=POSITION)
+    for sentence in SENTENCES:
+        former.parse(sentence)
+        parse(gps, sentence)
+        parse(position, sentence)
+        for name in ATTRIBUTES:
+            assert getattr(gps, name) == getattr(former, name), name
+            if name in POSITION:
+                assert getattr(position, name) == getattr(former, name), name
+            else:
+                assert getattr(position, name) is None, name
+    assert position.latitude is not None and adafruit_gps._checksum(b'') == 0
+    t_ref = parse_rate('former parser', FormerParser(), FormerParser.parse)
+    t_all = parse_rate('dispatch table, all fields', adafruit_gps.GPS(None), parse)
+    t_pos = parse_rate('dispatch table, position fields',
+                       adafruit_gps.GPS(None, fields=POSITION), parse)
+    print('Speedup (all fields): {:.2f}x, (position fields): {:.2f}x'.format(
+        t_all / t_ref, t_pos / t_ref))
+    print()
+    print('One call per second, GGA and RMC at 1 Hz:')
+    lag, overruns = staleness('update()', lambda gps: gps.update())
+    assert lag > 1 and overruns
+    lag, overruns = staleness('update_all()', lambda gps: gps.update_all())
+    assert lag == 0 and not overruns
+    print('One call per second, default output (5 sentence types):')
+    staleness('update()', lambda gps: gps.update(), (b'GGA', b'GSA', b'GSV', b'RMC', b'VTG'))
+    lag, overruns = staleness('update_all()', lambda gps: gps.update_all(),
+                              (b'GGA', b'GSA', b'GSV', b'RMC', b'VTG'))
+    assert lag == 0 and not overruns
+
+    # the newest GGA and RMC only are parsed
+    uart = FakeUART(len(LOG))
+    gps = adafruit_gps.GPS(uart)
+    uart.feed(LOG)
+    consumed, dropped = gps.update_all()
+    assert consumed == len(SENTENCES) and dropped == consumed - 4
+    assert gps.timestamp_utc[3:6] == (0, 1, 24) and gps.has_fix
+
+    # multi-constellation receivers: GN (combined) and GL (GLONASS) talkers
+    gp, gn = adafruit_gps.GPS(None), adafruit_gps.GPS(None)
+    for i, sentence in enumerate(SENTENCES):
+        parse(gp, sentence)
+        parse(gn, retalk(sentence, (b'GN', b'GL')[i % 2]))
+        for name in ATTRIBUTES + ('fix_type', 'pdop', 'vdop'):
+            assert getattr(gn, name) == getattr(gp, name), name
+    assert (gp.fix_type, gp.pdop, gp.horizontal_dilution, gp.vdop) == (3, 1.72, 0.94, 1.44)
+    print('\nGN and GL talkers decoded as GP')
+
+    # the receiver output, by consumer
+    print('Characters received per epoch, default output against PMTK314 mask:')
+    default = sum(len(epoch) for epoch in epochs(tuple(k.encode() for k in TYPES)))
+    for label, fields, expected in (('all fields', None, ('RMC', 'GGA', 'GSA')),
+                                    ('position fields (main.py)', POSITION, ('GGA',)),
+                                    ('time and date', ('timestamp_utc',), ('RMC',))):
+        gps = adafruit_gps.GPS(None, fields=fields)
+        kinds = output(gps.pmtk314_command())
+        assert kinds == expected and len(gps.pmtk314_command().split(',')) == 20
+        masked = sum(len(epoch) for epoch in epochs(tuple(k.encode() for k in kinds)))
+        print('{:<28} {:5.0f} -> {:5.0f} ({})'.format(
+            label, default / 60, masked / 60, ','.join(kinds)))
+    assert adafruit_gps.GPS(None).pmtk314_command() == \
+        'PMTK314,0,1,0,1,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0'
@@ -0,0 +1,49 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# MicroPython shims of the scripts running the board-independent modules of
+# lib/ on a computer (CPython) without the simulated board (lib/hal/sim.py):
+#
+#   import micropython_shims
+#
+#   micropython_shims.install()
+#
+#   import cbor
+
+import binascii
+import builtins
+import io
+import os
+import re
+import struct
+import sys
+import time
+import types
+
+LIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib')
+
+
+def install():
+    """Define const, the micropython module and the u* aliases of the
+    standard modules, and put lib/ on the path."""
+    builtins.const = lambda x: x
+    sys.modules.setdefault('micropython', types.SimpleNamespace(const=builtins.const))
+    for name, module in (('ustruct', struct), ('ure', re), ('utime', time),
+                         ('uio', io), ('ubinascii', binascii)):
+        sys.modules.setdefault(name, module)
+    if LIB not in sys.path:
+        sys.path.insert(0, LIB)
@@ -0,0 +1,117 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Payload size and airtime of the CBOR float modes and of the fixed-point
+# quantization over a corpus of sample frames, run on a computer (CPython) with:
+#   python3 tests/payload_report.py
+#
+# Note: CPython floats are doubles, so 'shortest' rarely beats float64 here.
+# On the LoPy4, floats are single precision and 'shortest' never needs more
+# than float32.
+
+import random
+
+import micropython_shims
+
+micropython_shims.install()
+
+import airtime
+import cbor
+import quantize
+
+
+def sample_frames(n=500, seed=4):
+    """Frames as main.build_data_dict makes them, with the sensors resolutions."""
+    rnd = random.Random(seed)
+    frames = []
+    for i in range(n):
+        d = {"tm": round(rnd.uniform(-5.0, 35.0), 1),
+             "hu": round(rnd.uniform(20.0, 90.0), 1),
+             "c": rnd.randint(400, 2000),
+             "tv": rnd.randint(0, 600)}
+        if i % 2 == 0:
+            d["x"] = rnd.uniform(7.70, 7.80)
+            d["y"] = rnd.uniform(48.55, 48.60)
+            d["z"] = round(rnd.uniform(130.0, 180.0), 1)
+        if i % 6 == 0:
+            d["pm10"] = round(rnd.uniform(0.0, 80.0), 1)
+            d["pm25"] = round(rnd.uniform(0.0, 50.0), 1)
+        frames.append(d)
+    return frames
+
+
+frames = sample_frames()
+print('{:<10} {:>9} {:>12} {:>10} {:>10}   {}'.format(
+    'mode', 'avg bytes', 'DR5 ToA ms', 'DR5 up/h', 'fit DR0', 'max abs error per label'))
+quantizer = quantize.Quantizer(quantize.TELEMETRY)
+for mode in (None, 'shortest', 'f32', 'f16', 'quantized'):
+    sizes = []
+    errors = {}
+    for d in frames:
+        if mode == 'quantized':
+            msg = cbor.dumps(quantizer.quantize(d))
+            decoded = quantizer.dequantize(cbor.loads(msg))
+        else:
+            msg = cbor.dumps(d, float_mode=mode)
+            decoded = cbor.loads(msg)
+        sizes.append(len(msg))
+        for k, v in decoded.items():
+            errors[k] = max(errors.get(k, 0.0), abs(v - d[k]))
+    avg = sum(sizes) / len(sizes)
+    toa5 = sum(airtime.time_on_air(n, 5) for n in sizes) / len(sizes)
+    fit0 = len([n for n in sizes if n <= airtime.max_payload(0)]) / len(sizes)
+    print('{:<10} {:9.1f} {:12.1f} {:10d} {:9.0f}%   {}'.format(
+        str(mode), avg, toa5 * 1000, int(3600 * 0.01 / toa5), fit0 * 100,
+        ' '.join('{}={:.2g}'.format(k, e) for k, e in sorted(errors.items()))))
+
+#One hour at the main.py sampling cadences: one frame per tick vs batches
+import batch
+
+def hour_of_ticks(seed=5):
+    rnd = random.Random(seed)
+    for t in range(3600):
+        d = {}
+        if t % 10 == 0:
+            d.update(tm=round(rnd.uniform(20.0, 21.0), 1), hu=round(rnd.uniform(45.0, 50.0), 1),
+                     c=rnd.randint(400, 450), tv=rnd.randint(0, 30))
+        if t % 20 == 0:
+            d.update(x=7.7521 + rnd.uniform(0, 1e-4), y=48.5734 + rnd.uniform(0, 1e-4),
+                     z=round(rnd.uniform(140.0, 141.0), 1))
+        if t % 60 == 0:
+            d.update(pm10=round(rnd.uniform(0.0, 20.0), 1), pm25=round(rnd.uniform(0.0, 10.0), 1))
+        if d:
+            yield t, quantizer.quantize(d)
+
+print()
+print('{:<16} {:>7} {:>11} {:>14}'.format('one hour', 'frames', 'bytes', 'DR5 ToA s'))
+single = [cbor.dumps(d) for _, d in hour_of_ticks()]
+print('{:<16} {:7d} {:11d} {:14.2f}'.format(
+    'per tick', len(single), sum(len(f) for f in single),
+    sum(airtime.time_on_air(len(f), 5) for f in single)))
+for n in (3, 6, 12):
+    batcher = batch.Batcher(max_samples=n, data_rate=5)
+    frames = []
+    for t, d in hour_of_ticks():
+        frames += batcher.add(t, d)
+    if len(batcher):
+        frames.append(batcher.flush())
+    # the deltas add up to the exact quantized readings
+    points = sorted(p for f in frames for p in batch.expand(cbor.loads(f)))
+    assert points == sorted((t, k, v) for t, d in hour_of_ticks() for k, v in d.items())
+    print('{:<16} {:7d} {:11d} {:14.2f}'.format(
+        'batch of ' + str(n), len(frames), sum(len(f) for f in frames),
+        sum(airtime.time_on_air(len(f), 5) for f in frames)))
@@ -0,0 +1,113 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# The main.py sensor schedule, with slow sensors, on a virtual clock, run on
+# a computer (CPython) with:
+#   python3 tests/scheduler_simpletest.py
+#
+# Compares the former 1 s modulo tick loop, whose deadlines slip behind every
+# slow task, with the deadline scheduler over one simulated hour.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+import scheduler
+
+HOUR = 3600 * 1000
+
+# name: (period s, phase s, runtime ms) as in main.py
+SCHEDULE = (("am2320_sgp30", 10, 0, 420),  # 2 AM2320 + 2 SGP30 transactions, one retry
+            ("gps", 20, 0, 150),
+            ("gps_update", 1, 1, 20),
+            ("sds011", 10, 0, 15),         # poll() of the reports pushed by the sensor
+            ("battery", 60, 0, 5),         # 16 ADC conversions
+            ("ssd1306", 120, 0, 80))
+
+
+def modulo_loop(duration):
+    """The former main.py loop: sleep 1 s, then run what t % period selects."""
+    now, t, wakeups, runs = 0, -1, 0, []
+    while now < duration:
+        now += 1000  # time.sleep(1)
+        wakeups += 1
+        t += 1
+        for name, period, phase, runtime in SCHEDULE:
+            if (t - phase) % period == 0 and t >= phase:
+                runs.append((name, now - (t * 1000)))
+                now += runtime
+    return wakeups, runs
+
+
+def deadline_loop(duration):
+    clock = scheduler.VirtualClock()
+    s = scheduler.Scheduler(clock)
+    wakeups = [0]
+
+    def task(runtime):
+        def run():
+            clock.advance(runtime)
+        return run
+
+    for name, period, phase, runtime in SCHEDULE:
+        s.add(name, task(runtime), period * 1000, phase * 1000, jitter=1000)
+    while clock.now() < duration:
+        if s.run_pending():
+            wakeups[0] += 1
+        s.idle()
+    return wakeups[0], s
+
+
+if __name__ == '__main__':
+    wakeups, runs = modulo_loop(HOUR)
+    print('modulo tick loop: %d wake-ups, final drift %.1f s, %d runs'
+          % (wakeups, runs[-1][1] / 1000, len(runs)))
+    wakeups, s = deadline_loop(HOUR)
+    print('deadline scheduler: %d wake-ups' % wakeups)
+    for name, stats in sorted(s.stats().items()):
+        print('  %-18s %s' % (name, stats))
+    for task in s.tasks:
+        # no drift: the run count is set by the period only
+        assert (HOUR - task.phase) // task.period <= task.runs <= \
+            (HOUR - task.phase) // task.period + 1, task.name
+        assert task.max_lateness < 2000, task.name
+
+    # a task raising keeps its schedule, the error is counted
+    clock = scheduler.VirtualClock()
+    s = scheduler.Scheduler(clock)
+    failures = [OSError('UART')]
+
+    def flaky():
+        if failures:
+            raise failures.pop()
+
+    task = s.add("flaky", flaky, 1000)
+    s.run(10 * 1000)
+    print('raising task: %s' % task.stats())
+    assert task.runs == 11 and task.errors == 1 and isinstance(task.last_error, OSError)
+
+    # tasks due at the same time run in registration order, whatever the
+    # order they were rescheduled in
+    clock = scheduler.VirtualClock()
+    s = scheduler.Scheduler(clock)
+    order = []
+    s.add("a", lambda: order.append("a"), 1000)
+    s.add("b", lambda: order.append("b"), 3000)
+    s.run(3 * 1000)
+    print('ties: ' + ''.join(order))
+    assert order == list("abaaab")
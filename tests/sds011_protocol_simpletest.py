@@ -0,0 +1,147 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# SDS011 command frames against the examples of the Laser Dust Sensor Control
+# Protocol V1.3, and the frame reader against a noisy line and the simulated
+# sensor (lib/hal/sim.py), run on a computer (CPython) with:
+#   python3 tests/sds011_protocol_simpletest.py
+
+import binascii
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+
+import hal
+
+board = hal.install('sim')
+
+import sds011
+import time
+from machine import Pin, UART
+
+
+class FakeUART:
+    """Records the written frames, received gives the characters to read."""
+    def __init__(self, received=b''):
+        self.written = []
+        self.received = bytearray(received)
+        self.readinto_calls = 0
+
+    def write(self, buf):
+        self.written.append(bytes(buf))
+        return len(buf)
+
+    def any(self):
+        return len(self.received)
+
+    def readinto(self, buf, nbytes):
+        self.readinto_calls += 1
+        n = min(nbytes, len(self.received))
+        buf[:n] = self.received[:n]
+        del self.received[:n]
+        return n
+
+
+def data_frame(pm25, pm10, device_id=0xa1b2):
+    body = struct.pack('<HHBB', pm25, pm10, device_id >> 8, device_id & 0xff)
+    return b'\xaa\xc0' + body + bytes((sum(body) & 0xff,)) + b'\xab'
+
+
+def frame(text):
+    return binascii.unhexlify(text.replace(' ', ''))
+
+
+# datasheet examples, sent to all sensors (device id FF FF)
+REFERENCE = {
+    'query mode': frame('AA B4 02 01 01 00 00 00 00 00 00 00 00 00 00 FF FF 02 AB'),
+    'query': frame('AA B4 04 00 00 00 00 00 00 00 00 00 00 00 00 FF FF 02 AB'),
+    'sleep': frame('AA B4 06 01 00 00 00 00 00 00 00 00 00 00 00 FF FF 05 AB'),
+    'work': frame('AA B4 06 01 01 00 00 00 00 00 00 00 00 00 00 FF FF 06 AB'),
+    'period 1 min': frame('AA B4 08 01 01 00 00 00 00 00 00 00 00 00 00 FF FF 08 AB'),
+    'continuous': frame('AA B4 08 01 00 00 00 00 00 00 00 00 00 00 00 FF FF 07 AB'),
+}
+
+uart = FakeUART()
+sensor = sds011.SDS011(uart)
+assert uart.written == [REFERENCE['query mode']]
+
+for method, name in ((sensor.query, 'query'), (sensor.sleep, 'sleep'),
+                     (sensor.wake, 'work'), (sensor.set_reporting_mode_query, 'query mode')):
+    del uart.written[:]
+    method()
+    assert uart.written == [REFERENCE[name]], name
+
+for minutes, name in ((1, 'period 1 min'), (0, 'continuous')):
+    del uart.written[:]
+    sensor.set_working_period(minutes)
+    assert uart.written == [REFERENCE[name]], name
+
+assert sds011._SDS011_FRAMES['DUTYCYCLE'] == REFERENCE['continuous']
+assert sensor.make_command(0x08, 0x01, 1) == REFERENCE['period 1 min']
+assert sensor.make_command(0x08, 0x01, 0) == REFERENCE['continuous']
+
+# parameters >= 0x80 and checksum wrap-around: one byte each, as the sensor expects
+command = sensor.make_command(0x08, 0x01, 0xf0)
+assert len(command) == 19 and command[4] == 0xf0
+assert command[17] == sum(command[2:17]) & 0xff and command[18] == 0xab
+# the parameterised frames reuse one buffer
+assert sensor.make_command(0x06, 0x01, 1) is command
+
+print('SDS011 command frames match the datasheet')
+
+# the reader: noise, a reply to a command, a corrupted frame, a false header,
+# then two good frames, the last one split across two polls
+corrupted = bytearray(data_frame(150, 200))
+corrupted[3] ^= 0x10
+line = (b'\x00\xab\xaa' + b'\xaa\xc5\x06\x01\x01\x00\xa1\xb2\x5b\xab' + bytes(corrupted) +
+        b'\xaa\xc0\x01' + data_frame(123, 456) + data_frame(124, 457))
+uart = FakeUART(line[:-4])
+sensor = sds011.SDS011(uart)
+frames = []
+assert sensor.poll(lambda pm25, pm10: frames.append((pm25, pm10))) == 1
+assert frames == [(12.3, 45.6)] and sensor.packet_status
+uart.received += line[-4:]
+assert sensor.poll() == 1 and (sensor.pm25, sensor.pm10) == (12.4, 45.7)
+assert sensor.poll() == 0 and sensor._buffered == 0
+# more than the buffer at once, in bulk reads
+uart = FakeUART(b''.join(data_frame(i, 2 * i) for i in range(40)))
+sensor = sds011.SDS011(uart)
+assert sensor.poll() == 40 and (sensor.pm25, sensor.pm10) == (3.9, 7.8)
+assert uart.readinto_calls <= 400 // sds011._SDS011_BUFFER_LEN + 2
+print('SDS011 reader resynchronizes on the data frames')
+
+# the simulated sensor, on UART 2 and powered through P8
+Pin('P8', mode=Pin.OUT).value(1)
+uart = UART(2, baudrate=9600, pins=('P21', 'P22'))
+sensor = sds011.SDS011(uart)
+time.sleep(2.5)  # two frames sent before the query mode reply
+assert sensor.read() and sensor.packet_status
+pm = (board.env.pm25(time.time()), board.env.pm10(time.time()))
+print('query: pm25 %.1f, pm10 %.1f (environment %.1f, %.1f)' % ((sensor.pm25, sensor.pm10) + pm))
+assert abs(sensor.pm25 - pm[0]) < 1 and abs(sensor.pm10 - pm[1]) < 1
+sensor.set_reporting_mode_active()
+time.sleep(5.5)
+frames = []
+assert sensor.poll(lambda pm25, pm10: frames.append(pm25)) == 5
+print('active mode: %d frames in 5.5 s' % len(frames))
+sensor.set_working_period(2)
+sensor.poll()
+time.sleep(5 * 60 + 1)
+assert sensor.poll() == 2 and sensor.packet_status
+print('working period of 2 min: 2 frames in 5 min')
@@ -0,0 +1,67 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Run the unmodified main.py on the simulated board (lib/hal/sim.py), in
+# virtual time, and report the bus, UART and LoRa activity, run on a computer
+# (CPython) with:
+#   python3 tests/sim_main.py [--hours 1] [--seed 0] [--verbose]
+
+import argparse
+import contextlib
+import io
+import os
+import pprint
+import runpy
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+sys.path.insert(0, ROOT)
+
+import hal
+from hal import sim
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--hours', type=float, default=1.0, help='simulated duration')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the sensor noise')
+    parser.add_argument('--verbose', action='store_true', help='show the output of main.py')
+    args = parser.parse_args()
+
+    real_start = time.perf_counter()  # before the simulated time module is installed
+    board = hal.install('sim', duration=args.hours * 3600, seed=args.seed)
+
+    out = io.StringIO()
+    redirect = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(out)
+    with redirect:
+        try:
+            runpy.run_path(os.path.join(ROOT, 'main.py'), run_name='__main__')
+        except sim.SimulationEnd:
+            pass
+    board.clock.stop()
+    real = time.perf_counter() - real_start
+
+    report = board.report()
+    print('%.0f s simulated in %.1f s (x%.0f)' % (report['time_s'], real,
+                                                  report['time_s'] / real))
+    pprint.pprint(report, width=100, sort_dicts=False)
+    if not args.verbose:
+        lines = out.getvalue().splitlines()
+        print('main.py printed %d lines, last ones:' % len(lines))
+        for line in lines[-5:]:
+            print('  ' + line)
@@ -0,0 +1,214 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# I2C traffic of SSD1306.show() on the 64x48 panel, sending the changed pages
+# and columns only against the former whole framebuffer, and of the retained
+# status screen of pycom_monitor.print_lcd against the former redraw of every
+# line, checked against the display RAM of the simulated controller
+# (lib/hal/sim.py), run on a computer (CPython) with:
+#   python3 tests/ssd1306_benchmark.py
+
+import os
+import random
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+sys.path.insert(0, ROOT)
+
+import hal
+
+board = hal.install('sim')
+
+import pycom_monitor
+import ssd1306
+from machine import I2C, Pin
+
+
+# ssd1306 before the dirty ranges: six command transactions and the whole
+# framebuffer
+
+def former_show(d):
+    x0 = 0
+    x1 = d.width - 1
+    if d.width == 64:
+        x0 += 32
+        x1 += 32
+    d.write_cmd(ssd1306.SET_COL_ADDR)
+    d.write_cmd(x0)
+    d.write_cmd(x1)
+    d.write_cmd(ssd1306.SET_PAGE_ADDR)
+    d.write_cmd(0)
+    d.write_cmd(d.pages - 1)
+    d.write_framebuf()
+
+
+def former_print_lcd(d, msg, t=None, ltemp=False, lco2=False, lgps=False, ldust=False):
+    d.fill(0)
+    d.text(str(msg), 0, 0)
+    if t:
+        d.text(str(t), 0, 10)
+    if ltemp:
+        d.text("temp", 0, 20)
+    if lco2:
+        d.text("co2", 32, 20)
+    if lgps:
+        d.text("gps", 0, 30)
+    if ldust:
+        d.text("dust", 32, 30)
+    d.show()
+
+
+def screen(d):
+    """The pixels of the framebuffer, as sim_devices.SSD1306.render."""
+    return [''.join('#' if d.framebuf.pixel(x, y) else '.' for x in range(d.width))
+            for y in range(d.height)]
+
+
+def traffic(d, draw, show):
+    """Draw, show, return the bytes counted by the driver and on the bus."""
+    bus = board.i2c
+    before = (d.tx_bytes, bus.transactions, bus.bytes_written, bus.busy_us)
+    draw(d)
+    show(d)
+    after = (d.tx_bytes, bus.transactions, bus.bytes_written, bus.busy_us)
+    assert board.ssd1306.render() == screen(d)
+    return tuple(b - a for a, b in zip(before, after))
+
+
+def print_lcd(t):
+    """pycom_monitor.print_lcd: clear, every line drawn again."""
+    def draw(d):
+        d.fill(0)
+        d.text('1234', 0, 0)
+        d.text(str(t), 0, 10)
+        d.text('temp', 0, 20)
+        d.text('co2', 32, 20)
+    return draw
+
+
+def tick(t):
+    """Only the counter line cleared and drawn again."""
+    def draw(d):
+        d.fill_rect(0, 10, 64, 8, 0)
+        d.text(str(t), 0, 10)
+    return draw
+
+
+def gauges(value):
+    def draw(d):
+        d.fill_rect(40, 40, 24, 8, 0)
+        d.battery_gauge(40, 40, value)
+        d.signal_gauge(56, 40, value)
+    return draw
+
+
+CASES = (('print_lcd, fill and redraw', print_lcd(17)),
+         ('tick counter line', tick(18)),
+         ('unaligned counter line', lambda d: (d.fill_rect(0, 13, 64, 8, 0),
+                                               d.text('19', 0, 13))),
+         ('battery and signal gauges', gauges(0.6)),
+         ('one pixel', lambda d: d.pixel(63, 47, 1)),
+         ('nothing changed', lambda d: None))
+
+
+if __name__ == '__main__':
+    i2c = I2C(0, I2C.MASTER, baudrate=400000)
+    d = ssd1306.SSD1306_I2C(64, 48, i2c, res=Pin('P11', mode=Pin.OUT))
+    assert board.ssd1306.render() == screen(d)
+    print('%-28s %7s %7s %7s %9s' % ('', 'bytes', 'xfers', 'on bus', 'bus time'))
+    for label, draw in CASES:
+        former = traffic(d, draw, former_show)
+        partial = traffic(d, draw, ssd1306.SSD1306_I2C.show)
+        print('%-28s %7d %7d %7d %7d us  former' % ((label,) + former))
+        print('%-28s %7d %7d %7d %7d us  dirty ranges' % (('',) + partial))
+        assert former[0] == former[2] and partial[0] == partial[2]
+        assert partial[0] <= former[0]
+
+    # random drawing against the display RAM
+    rng = random.Random(0)
+    sent = 0
+    for _ in range(200):
+        x, y = rng.randrange(-8, 64), rng.randrange(-8, 48)
+        kind = rng.randrange(4)
+        if kind == 0:
+            draw = lambda d: d.pixel(x, y, rng.randrange(2))
+        elif kind == 1:
+            draw = lambda d: d.text(str(rng.randrange(1000)), x, y, rng.randrange(2))
+        elif kind == 2:
+            draw = lambda d: d.fill_rect(x, y, rng.randrange(1, 30), rng.randrange(1, 20),
+                                         rng.randrange(2))
+        else:
+            draw = lambda d: d.triangle_gauge(x, y, rng.random())
+        sent += traffic(d, draw, ssd1306.SSD1306_I2C.show)[0]
+    print('\n200 random drawings: %d bytes, %d with the former show()' % (
+        sent, 200 * (len(d.buffer) + 12)))
+
+    # main.py: print_lcd at every uplink (every 10 s, with the labels of the
+    # readings sent) and every 120 s (the clock)
+    print('\nOne hour of print_lcd:')
+    pycom_monitor.display.frame_ms = 0  # every call refreshed, see display_benchmark.py
+    status = pycom_monitor.registry.get("status_screen")
+    d = status.display
+    calls = []
+    for t in range(10, 3601, 10):
+        calls.append((t, 30 + t % 7, True, True, t % 30 == 0, t % 60 == 0))
+        if t % 120 == 0:
+            calls.append((t,))
+    former, retained = 0, 0
+    for n, args in enumerate(calls):
+        before = d.tx_bytes
+        former_print_lcd(d, *args)
+        former += d.tx_bytes - before
+        status.invalidate()  # the former print_lcd drew over it
+        status.refresh()
+        before = d.tx_bytes
+        pycom_monitor.print_lcd(*args, queue=n % 5 / 4, wake=True)
+        pycom_monitor.refresh_lcd()
+        retained += d.tx_bytes - before
+        assert board.ssd1306.render() == screen(d)
+    print('%d calls: former %d bytes/call, status screen %.1f bytes/call' % (
+        len(calls), former / len(calls), retained / len(calls)))
+    assert retained < former / 3
+    before = d.tx_bytes
+    pycom_monitor.print_lcd(3601)
+    pycom_monitor.refresh_lcd()
+    print('clock tick alone: %d bytes' % (d.tx_bytes - before))
+
+    # a NACK while sending leaves the framebuffer intact and the pages dirty
+    d.fill_rect(0, 20, 64, 8, 1)
+    before = bytes(d.buffer)
+    sent = d.tx_bytes
+    i2c = d.i2c
+
+    class DataNack:
+        """The bus, NACKing the data transactions."""
+        def writeto(self, addr, buf):
+            if buf[0] == 0x40:
+                raise OSError(5, 'I2C NACK')
+            i2c.writeto(addr, buf)
+
+    d.i2c = DataNack()
+    try:
+        d.show()
+    except OSError:
+        pass
+    d.i2c = i2c
+    assert bytes(d.buffer) == before and d.tx_bytes - sent == 7  # the window commands only
+    d.show()
+    assert board.ssd1306.render() == screen(d)
+    print('NACK during show(): framebuffer kept, sent again by the next show()')
@@ -0,0 +1,130 @@
+#
+#    Copyright (C) 2019 IoT Meets AI Team Challenge 4
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Uplink queue against a fake LoRa socket with slow sends and timeouts,
+# run on a computer (CPython) with:
+#   python3 tests/uplink_simpletest.py
+#
+# The sampling loop ticks every 0.1 s while every send takes 0.25 s (or times
+# out): the tick must not drift, the queue absorbs the difference.
+
+import _thread
+import time
+
+import micropython_shims
+
+micropython_shims.install()
+
+import cbor
+import uplink
+
+
+class FakeSocket:
+    """A LoRa socket whose sends take send_time seconds, one in timeout_every
+    times out, one in ack_every gets a downlink."""
+    def __init__(self, send_time=0.25, timeout_every=4, ack_every=3):
+        self.send_time = send_time
+        self.timeout_every = timeout_every
+        self.ack_every = ack_every
+        self.sends = 0
+        self.delivered = []
+        self._blocking = True
+        self._timeout = None
+        self._rx = None
+
+    def setblocking(self, flag):
+        self._blocking = flag
+
+    def settimeout(self, value):
+        self._timeout = value
+
+    def send(self, data):
+        self.sends += 1
+        if self.sends % self.timeout_every == 0:
+            time.sleep(self._timeout)
+            raise TimeoutError('send timed out')
+        time.sleep(self.send_time)
+        self.delivered.append(bytes(data))
+        if self.sends % self.ack_every == 0:
+            self._rx = b'\x01'
+        return len(data)
+
+    def recv(self, size):
+        rx, self._rx = self._rx, None
+        return rx if rx is not None else b''
+
+
+class FakeLoRa:
+    """The LoRa events of confirmed uplinks: one in nack_every sends is not
+    acknowledged."""
+    TX_PACKET_EVENT = 2
+    TX_FAILED_EVENT = 4
+
+    def __init__(self, nack_every=5):
+        self.nack_every = nack_every
+        self.reads = 0
+
+    def has_joined(self):
+        return True
+
+    def events(self):
+        self.reads += 1
+        if self.reads % self.nack_every == 0:
+            return self.TX_FAILED_EVENT
+        return self.TX_PACKET_EVENT
+
+
+def merge(older, newer):
+    a = cbor.loads_buffer(older)[0]
+    a.update(cbor.loads_buffer(newer)[0])
+    return cbor.dumps(a)
+
+
+def run(policy, ticks=40, tick=0.1):
+    sock = FakeSocket()
+    sock._timeout = None
+    q = uplink.UplinkQueue(sock, size=4, policy=policy, merge=merge,
+                           send_timeout=0.3, retries=1, lora=FakeLoRa(), confirmed=True)
+    q.start(idle=0.01)
+    start = time.time()
+    late = 0.0
+    for t in range(ticks):
+        # the sampling loop: build a reading, queue it, wait for the next tick
+        q.push(cbor.dumps({"t": t, "tm": 21.5}))
+        next_tick = start + (t + 1) * tick
+        late = max(late, time.time() - next_tick + tick)
+        delay = next_tick - time.time()
+        if delay > 0:
+            time.sleep(delay)
+    elapsed = time.time() - start
+    q.stop()
+    time.sleep(1)
+    print(policy)
+    print('  %d ticks in %.2f s (expected %.2f s), worst push latency %.1f ms'
+          % (ticks, elapsed, ticks * tick, late * 1000))
+    print('  ' + str(q.stats()))
+    print('  delivered t: ' + str([cbor.loads(f)["t"] for f in sock.delivered]))
+    assert elapsed < ticks * tick * 1.1
+    # every queued frame is accounted for
+    assert q.queued == q.sent + q.dropped_overflow + q.dropped_retries + q.coalesced + len(q)
+    # every frame sent is acknowledged or not
+    assert q.acked + q.unacked == q.sent and q.unacked == q.sent // 5
+
+
+if __name__ == '__main__':
+    run(uplink.DROP_OLDEST)
+    run(uplink.COALESCE)